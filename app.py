@@ -1,316 +1,924 @@
-import os, traceback, requests, re, json
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Form
-from fastapi.responses import JSONResponse
-from prompt_template import custom_prompt, custom_prompt_solution_chat
-from langchain_community.chat_message_histories import RedisChatMessageHistory
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
-from fastapi.middleware.cors import CORSMiddleware
-from utils.pdf_utils import extract_file_text
-from utils.chroma_utils import (
-    split_text, get_chroma_client, get_or_create_collection, add_chunks_to_chroma
-)
-from utils.retriever import retrieve_documents
-from settings import PORT, REDIS_URL, BITNET_URL, BITNET_MODEL_NAME, GROQ_API_KEY, GROQ_MODEL
-from utils.logger import log
-import warnings
-import json
-
-# Suppress unwanted warnings for cleaner logs (optional)
-warnings.filterwarnings('ignore')
-
-# ------------------------------
-# Initialize FastAPI app
-# ------------------------------
-app = FastAPI(title="PDF Vector Store API", version="1.0")
-
-# ------------------------------
-# Enable CORS for API calls
-# ------------------------------
-# ⚠️ In production, restrict origins to trusted domains
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# ==========================
-# API: Upload PDF or Raw Text
-# ==========================
-@app.post("/upload-pdf")
-async def upload_pdf(
-    file: UploadFile = File(None),
-    file_str: str = Form(None),
-    collection_name: str = Form(...)
-):
-    """
-    Upload a file (PDF, DOCX, TXT, etc.) or raw string,
-    extract text content, split it into chunks, and store in ChromaDB.
-
-    Args:
-        file: Uploaded file.
-        file_str: Optional raw text input.
-        collection_name: Name of ChromaDB collection to store data.
-
-    Returns:
-        JSON with status, number of chunks processed, and total tokens.
-    """
-    try:
-        # ------------------------------
-        # Step 1: Extract text
-        # ------------------------------
-        if file:
-            # Save uploaded file temporarily
-            file_path = f"temp_{file.filename}"
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-            # Extract text using utility function
-            text = extract_file_text(file_path)
-            os.remove(file_path)  # Clean up temp file
-        elif file_str:
-            text = file_str
-        else:
-            log.error("No file or file_str provided in request.")
-            raise HTTPException(status_code=400, detail="No file or file_str provided")
-
-        if not text.strip():
-            log.error("No text extracted from file or string.")
-            raise ValueError("No text content extracted or provided")
-
-        # ------------------------------
-        # Step 2: Split text into chunks
-        # ------------------------------
-        # Helps with embedding and retrieval in ChromaDB
-        chunks = split_text(text)
-
-        # ------------------------------
-        # Step 3: Store chunks in ChromaDB
-        # ------------------------------
-        client = get_chroma_client()
-        collection = get_or_create_collection(client, collection_name)
-        await add_chunks_to_chroma(chunks, collection)
-
-        return JSONResponse({
-            "detail": f"Text processed successfully for collection '{collection_name}'",
-            "chunks_processed": len(chunks),
-            "total_tokens": sum(len(chunk.page_content) for chunk in chunks)
-        }, status_code=200)
-
-    except Exception as e:
-        log.error(f"Error in /upload-pdf: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to process input: {str(e)}")
-
-
-# ==========================
-# Helper: Extract Relevant Data
-# ==========================
-def extract_relevant_data(input_text):
-    """
-    Extract relevant section from input text based on patterns.
-
-    1. Look for text between "---" markers.
-    2. Fallback: Look for text starting with "Main Issue:".
-    """
-    pattern1 = r'---\s*(.*?)\s*---'
-    matches = re.findall(pattern1, input_text, re.DOTALL)
-
-    if not matches:
-        pattern2 = r'Main Issue:.*?---'
-        matches = re.findall(pattern2, input_text, re.DOTALL)
-
-    return matches[0].strip() if matches else None
-
-
-# ==========================
-# API: Query Documents & Generate AI Response
-# ==========================
-@app.post("/query")
-async def query_documents(request: Request):
-    """
-    Accepts user query, retrieves context from ChromaDB, and generates AI response
-    via Hugging Face / Ollama API.
-    """
-    try:
-        body = await request.json()
-        subject = body.get("subject")
-        mailBody = body.get("mailBody")
-        session_id = body.get("session_id")
-        collection_name = body.get("collection_name")
-
-        if not session_id:
-            raise HTTPException(status_code=400, detail="Session ID is required")
-
-        # ------------------------------
-        # Step 1: Combine subject and mail body
-        # ------------------------------
-        query_ask = subject + "\n" + mailBody
-
-        # ------------------------------
-        # Step 2: Retrieve conversation history from Redis
-        # ------------------------------
-        chat_history = RedisChatMessageHistory(session_id=session_id, url=REDIS_URL)
-        past_dialogue = [msg.content for msg in chat_history.messages if isinstance(msg, HumanMessage)][-3:]
-        full_query = " ".join(past_dialogue + [query_ask])
-
-        # ------------------------------
-        # Step 3: Retrieve top-k documents from ChromaDB
-        # ------------------------------
-        client = get_chroma_client()
-        collection = get_or_create_collection(client, collection_name)
-        results = await retrieve_documents(full_query, collection, top_k=3)
-        context_tmp = "\n\n".join(results)
-        context = extract_relevant_data(context_tmp) or context_tmp
-
-        # ------------------------------
-        # Step 4: Prepare system prompt
-        # ------------------------------
-        system_prompt = custom_prompt.format(context=context, question=query_ask)
-
-        # ------------------------------
-        # Step 5: Prepare payload for AI API
-        # ------------------------------
-        payload = {
-            "model": BITNET_MODEL_NAME,
-            "messages": [{"role": "user", "content": system_prompt}],
-            "stream": False,
-            "think": False
-        }
-        headers = {"Content-Type": "application/json"}
-
-        response_api = requests.post(BITNET_URL, headers=headers, data=json.dumps(payload))
-        response_api.raise_for_status()
-        response_data = response_api.json()
-
-        # ------------------------------
-        # Step 6: Clean and format response
-        # ------------------------------
-        response_text_tmp = response_data.get("message", {}).get("content", "").strip()
-        response_text_cleaned = re.sub(r'[\x00-\x1F\x7F]', '', response_text_tmp)
-        response_text = json.loads(response_text_cleaned)
-        response_text['solution'] = response_text['solution'].replace('\n', '\\n')
-
-        # Save conversation back to Redis
-        chat_history.add_user_message(query_ask)
-        chat_history.add_ai_message(response_text_tmp)
-
-        # ------------------------------
-        # Step 7: Build Adaptive Card style response
-        # ------------------------------
-        response = {
-            "type": "adaptiveCard",
-            "body": [
-                {"type": "TextBlock", "text": response_text},
-                {"type": "TextBlock", "text": "Was I helpful?"},
-                {
-                    "type": "Button",
-                    "id": "serviceType",
-                    "style": "expanded",
-                    "choices": [
-                        {"id": "Yes", "title": "Yes", "value": "Yes"},
-                        {"id": "No", "title": "No", "value": "No"}
-                    ]
-                }
-            ],
-            "actions": []
-        }
-
-        return JSONResponse(response, status_code=200)
-
-    except Exception as e:
-        log.error(f"Error in /query: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve documents: {str(e)}")
-
-
-# ==========================
-# API: Solution Chat (Groq LLM)
-# ==========================
-
-@app.post("/solution-chat")
-async def solution_chat(request: Request):
-    """
-    Query ChromaDB and return AI response using Groq LLM.
-    """
-    try:
-        body = await request.json()
-        query_ask = body.get("user_query")
-        session_id = body.get("session_id")
-        collection_name = "auto_ticket_creation"
-
-        if not session_id:
-            raise HTTPException(status_code=400, detail="Session ID is required")
-
-        # Retrieve last 3 user messages from Redis
-        chat_history = RedisChatMessageHistory(session_id=session_id, url=REDIS_URL)
-        past_dialogue = [
-            msg.content for msg in chat_history.messages if isinstance(msg, HumanMessage)
-        ][-3:]
-
-        full_query = " ".join(past_dialogue + [query_ask])
-
-        # Retrieve top 3 documents from Chroma
-        client = get_chroma_client()
-        collection = get_or_create_collection(client, collection_name)
-        results = await retrieve_documents(full_query, collection, top_k=3)
-
-        context_tmp = "\n\n".join(results)
-        context = extract_relevant_data(context_tmp) or context_tmp
-
-        # Prepare prompt
-        system_prompt = custom_prompt_solution_chat.format(
-            context=context, 
-            question=query_ask
-        )
-
-        # Initialize Groq LLM
-        groq_llm = ChatGroq(
-            model=GROQ_MODEL,
-            temperature=0,
-            max_tokens=500,
-            api_key=os.getenv("GROQ_API_KEY", GROQ_API_KEY)
-        )
-
-        # Query Groq
-        response = groq_llm.invoke([
-            {"role": "system", "content": "You are Zeni, a helpful assistant."},
-            {"role": "user", "content": system_prompt}
-        ])
-
-        response_payload = response.content.strip()
-
-        # Save conversation to Redis
-        chat_history.add_user_message(query_ask)
-        chat_history.add_ai_message(response_payload)
-
-        # Convert model response to Python dict (JSON)
-        try:
-            groq_parsed = json.loads(response_payload)
-        except:
-            groq_parsed = response_payload
-
-        # Build final response dictionary
-        final_response = {
-            "source": "rag_knowledge_base",
-            "query": query_ask,
-            "solution": groq_parsed.get("solution", response_payload),
-            "session_id": session_id,
-            "document": collection_name
-        }
-
-        return JSONResponse(final_response, status_code=200)
-
-    except Exception as e:
-        return JSONResponse(
-            {"status": "error", "message": str(e)},
-            status_code=500
-        )
-
-# ==========================
-# Run the App
-# ==========================
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+import os, re, json, time, uuid, asyncio, tempfile
+from contextlib import AsyncExitStack
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+from prompt_template import (
+    custom_prompt, custom_system_prompt, custom_prompt_solution_chat,
+    NO_RELEVANT_INFO_REPLY, GREETING_REPLY, NO_CONTEXT_REPLY
+)
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.messages import HumanMessage
+from fastapi.middleware.cors import CORSMiddleware
+from utils.chroma_utils import split_text, add_chunks_to_chroma
+from utils.collection_manager import collection_manager
+from utils.collection_lock import CollectionLockTimeout
+from utils.admission import admit, get_limiter, get_request_deadline, limiters, remaining_time
+from utils.http_client import get_http_client, close_http_client
+from utils.retriever import (
+    retrieve_documents, retrieve_documents_batch, extract_relevant_data, RetrievalError
+)
+from utils.vector_mirror import ensure_vector_mirror
+from settings import (
+    PORT, REDIS_URL, BITNET_URL, GROQ_API_KEY, GROQ_MODEL,
+    BITNET_TIMEOUT, GROQ_TIMEOUT, BATCH_MAX_ITEMS, BATCH_LLM_CONCURRENCY,
+    WARMUP_COLLECTIONS, WARMUP_PROBE_QUERY, WARMUP_CHAT_MODEL, SNAPSHOT_DIR,
+    ADMISSION_RETRY_AFTER, RETRIEVAL_TOP_K
+)
+from utils.logger import log, new_log_context, set_log_context, log_stage, add_log_counter
+from utils.mail_utils import normalize_mail, normalize_body
+from utils.ollama_chat import build_chat_payload, validate_llm_options
+from utils.relevance import filter_relevant, is_small_talk, record_llm_skipped, short_circuit_metrics
+from utils.structured_output import (
+    TicketTriage, SolutionAnswer, TICKET_TRIAGE_SCHEMA, GROQ_RESPONSE_FORMAT,
+    parse_structured, failed_generation, structured_output_metrics
+)
+import warnings
+
+# Suppress unwanted warnings for cleaner logs (optional)
+warnings.filterwarnings('ignore')
+
+# ------------------------------
+# Initialize FastAPI app
+# ------------------------------
+app = FastAPI(title="PDF Vector Store API", version="1.0")
+
+# ------------------------------
+# Middleware order
+# ------------------------------
+# The middleware added last runs first, so they are added innermost first:
+# admission control, then request logging, then CORS. Requests shed with
+# 429/503 are therefore still logged and get X-Request-ID and CORS headers.
+
+# ------------------------------
+# Admission control
+# ------------------------------
+# - Endpoints listed in ADMISSION_LIMITS get a concurrency limit with a
+#   bounded wait queue; excess requests get a fast 429/503 with Retry-After.
+# - The client's deadline (X-Request-Deadline / X-Request-Timeout header) is
+#   stored on request.state so handlers can shed before calling the LLM.
+# - The slot is held until the response body has been sent: a streaming
+#   response (NDJSON /query-batch) does its work while the body is produced.
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    request.state.deadline = get_request_deadline(request)
+    limiter = get_limiter(request.url.path)
+    if limiter is None:
+        return await call_next(request)
+    slot = AsyncExitStack()
+    try:
+        await slot.enter_async_context(limiter.admit(request.state.deadline))
+    except HTTPException as e:
+        return JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await slot.aclose()
+        raise
+
+    body = response.body_iterator
+
+    async def release_after_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await slot.aclose()
+
+    response.body_iterator = release_after_body()
+    return response
+
+
+# ------------------------------
+# Request logging context
+# ------------------------------
+# - Every request gets a request ID (taken from the X-Request-ID header when
+#   the caller sends one) that is attached to all log lines of that request.
+# - One "request_completed" line is logged per request with the status,
+#   total time and the per-stage timings recorded with log_stage().
+@app.middleware("http")
+async def request_logging(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    context = new_log_context(request_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        log.info("request_completed", extra={
+            "event": "request_completed",
+            "path": request.url.path,
+            "status": status_code,
+            "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            "stages": context["stages"],
+            "counters": context["counters"],
+        })
+
+
+# ------------------------------
+# Enable CORS for API calls
+# ------------------------------
+# ⚠️ In production, restrict origins to trusted domains
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+# ------------------------------
+# Lazily created Groq client
+# ------------------------------
+# langchain_groq is only imported when /solution-chat is first used,
+# and the client is reused by every later request in this worker.
+# JSON mode is bound to the client when structured output is enabled.
+_groq_llm = None
+
+
+def get_groq_llm():
+    """
+    Returns the worker-wide ChatGroq instance, creating it on first use.
+    """
+    global _groq_llm
+    if _groq_llm is None:
+        from langchain_groq import ChatGroq
+
+        _groq_llm = ChatGroq(
+            model=GROQ_MODEL,
+            temperature=0,
+            max_tokens=500,
+            api_key=os.getenv("GROQ_API_KEY", GROQ_API_KEY)
+        )
+        if GROQ_RESPONSE_FORMAT:
+            _groq_llm = _groq_llm.bind(response_format=GROQ_RESPONSE_FORMAT)
+    return _groq_llm
+
+
+# ==========================
+# Startup: Warm-up
+# ==========================
+@app.on_event("startup")
+async def warm_up():
+    """
+    Prepare the worker before it receives traffic so the first real
+    request is not the cold one.
+
+    Steps:
+    1. Open the pooled HTTP client (embedding + chat backends).
+    2. Load the hot collections: WARMUP_COLLECTIONS plus the most used
+       collections from the usage statistics (within the memory budget).
+    3. Optionally embed a probe query and run it against each hot
+       collection, which loads the vector index into memory.
+    4. Open the vector mirror of hot collections that have one.
+    5. Optionally load the chat model and cache the system prompt prefix.
+
+    Failures are logged and never prevent the worker from starting.
+    """
+    try:
+        get_http_client()
+
+        probe_embedding = None
+        if WARMUP_PROBE_QUERY:
+            from utils.chroma_utils import get_embeddings
+
+            probe_embedding = await get_embeddings(WARMUP_PROBE_QUERY)
+
+        hot_collections = collection_manager.preload(always=WARMUP_COLLECTIONS)
+        for name, collection in hot_collections.items():
+            count = collection.count()
+            if probe_embedding and count:
+                collection.query(query_embeddings=[probe_embedding], n_results=1)
+            mirror = await ensure_vector_mirror(collection)
+            if mirror is not None and probe_embedding:
+                mirror.query(probe_embedding, top_k=1)
+            log.info(f"Warm-up loaded collection '{name}' ({count} chunks)")
+    except Exception as e:
+        log.error(f"Warm-up failed: {e}", exc_info=True)
+
+    if WARMUP_CHAT_MODEL:
+        try:
+            payload = build_chat_payload(custom_system_prompt, WARMUP_PROBE_QUERY or "ping",
+                                         {"num_predict": 1})
+            response = await get_http_client().post(BITNET_URL, json=payload, timeout=BITNET_TIMEOUT)
+            response.raise_for_status()
+            log.info("Warm-up loaded chat model", extra={
+                "event": "chat_model_warmed",
+                "load_ms": round(response.json().get("load_duration", 0) / 1e6, 2),
+            })
+        except Exception as e:
+            log.error(f"Chat model warm-up failed: {e}")
+
+
+@app.on_event("shutdown")
+async def shut_down():
+    """
+    Release pooled connections and save collection usage when the worker stops.
+    """
+    await close_http_client()
+    collection_manager.flush()
+
+
+# ==========================
+# API: Collection Cache Metrics
+# ==========================
+@app.get("/metrics/collections")
+async def collection_metrics():
+    """
+    Per-collection hits, loads and evictions for the worker that serves the
+    request (each worker has its own cache).
+    """
+    return JSONResponse(collection_manager.metrics(), status_code=200)
+
+
+# ==========================
+# API: Admission Control Metrics
+# ==========================
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """
+    Queue depth, active requests and shed counts per endpoint/backend limiter
+    for the worker that serves the request.
+    """
+    return JSONResponse(
+        {"pid": os.getpid(), "limiters": {name: l.metrics() for name, l in limiters.items()}},
+        status_code=200
+    )
+
+
+@app.get("/metrics/structured-output")
+async def structured_output_metrics_endpoint():
+    """
+    LLM answers per backend that parsed directly, needed the local repair,
+    or fell back to the raw text, for the worker that serves the request.
+    """
+    return JSONResponse({"pid": os.getpid(), "backends": structured_output_metrics()}, status_code=200)
+
+
+@app.get("/metrics/short-circuit")
+async def short_circuit_metrics_endpoint():
+    """
+    LLM calls answered with a fixed reply instead (nothing relevant retrieved,
+    small talk), per endpoint and reason, for the worker that serves the request.
+    """
+    return JSONResponse({"pid": os.getpid(), "llm_calls_avoided": short_circuit_metrics()}, status_code=200)
+
+
+# ==========================
+# API: Collection Snapshots
+# ==========================
+# Snapshots live in SNAPSHOT_DIR/<snapshot_name>. Copy that directory to a new
+# node and import it there to skip extraction and embedding entirely.
+# Export/import run in a thread so the event loop keeps serving requests.
+_SNAPSHOT_NAME = re.compile(r"^[\w.-]+$")
+
+
+def snapshot_path(snapshot_name):
+    """
+    Resolves a snapshot name inside SNAPSHOT_DIR (rejects path traversal).
+    """
+    if not snapshot_name or not _SNAPSHOT_NAME.match(snapshot_name) or snapshot_name in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid snapshot name")
+    return os.path.join(SNAPSHOT_DIR, snapshot_name)
+
+
+@app.post("/collections/{collection_name}/snapshot")
+async def export_collection_snapshot(collection_name: str, request: Request):
+    """
+    Exports a collection to SNAPSHOT_DIR/<snapshot_name> (default: the
+    collection name) and returns the snapshot manifest.
+    """
+    from utils.chroma_utils import get_chroma_client
+    from utils.snapshot import export_collection
+
+    body = await request.json() if await request.body() else {}
+    snapshot_name = body.get("snapshot_name") or collection_name
+    path = snapshot_path(snapshot_name)
+    try:
+        collection = get_chroma_client().get_collection(name=collection_name)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' not found")
+    try:
+        manifest = await asyncio.to_thread(export_collection, collection, path)
+    except CollectionLockTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    except Exception as e:
+        log.error(f"Snapshot export of '{collection_name}' failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Snapshot export failed: {str(e)}")
+    return JSONResponse({"snapshot": snapshot_name, **manifest}, status_code=200)
+
+
+@app.get("/snapshots")
+async def list_snapshots():
+    """
+    Lists the snapshots in SNAPSHOT_DIR with their collection and size.
+    """
+    from utils.snapshot import read_manifest, SnapshotError
+
+    snapshots = []
+    if os.path.isdir(SNAPSHOT_DIR):
+        for snapshot_name in sorted(os.listdir(SNAPSHOT_DIR)):
+            try:
+                manifest = read_manifest(os.path.join(SNAPSHOT_DIR, snapshot_name), verify=False)
+            except (SnapshotError, OSError, ValueError):
+                continue  # Incomplete export or unrelated file
+            snapshots.append({"snapshot": snapshot_name, "collection": manifest["collection"],
+                              "entries": manifest["entries"], "dim": manifest["dim"],
+                              "embedding_model": manifest["embedding_model"],
+                              "created_at": manifest["created_at"]})
+    return JSONResponse({"snapshots": snapshots}, status_code=200)
+
+
+@app.post("/snapshots/{snapshot_name}/import")
+async def import_collection_snapshot(snapshot_name: str, request: Request):
+    """
+    Imports a snapshot from SNAPSHOT_DIR with bulk upserts (no re-embedding)
+    and loads the collection into this worker's cache.
+
+    Request body (all optional):
+        {"collection_name": "...", "replace": false, "force": false}
+    """
+    from utils.chroma_utils import get_chroma_client
+    from utils.snapshot import import_snapshot, SnapshotError
+
+    body = await request.json() if await request.body() else {}
+    path = snapshot_path(snapshot_name)
+    try:
+        report = await asyncio.to_thread(
+            import_snapshot, get_chroma_client(), path,
+            name=body.get("collection_name"),
+            replace=bool(body.get("replace", False)),
+            force=bool(body.get("force", False))
+        )
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CollectionLockTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    except Exception as e:
+        log.error(f"Snapshot import of '{snapshot_name}' failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Snapshot import failed: {str(e)}")
+
+    # Drop a stale handle (replace) and load the fresh collection
+    collection_manager.evict(report["collection"])
+    collection_manager.get(report["collection"], record_usage=False)
+    return JSONResponse(report, status_code=200)
+
+# ==========================
+# API: Upload PDF or Raw Text
+# ==========================
+@app.post("/upload-pdf")
+async def upload_pdf(
+    file: UploadFile = File(None),
+    file_str: str = Form(None),
+    collection_name: str = Form(...)
+):
+    """
+    Upload a file (PDF, DOCX, TXT, etc.) or raw string,
+    extract text content, split it into chunks, and store in ChromaDB.
+
+    Args:
+        file: Uploaded file.
+        file_str: Optional raw text input.
+        collection_name: Name of ChromaDB collection to store data.
+
+    Returns:
+        JSON with status, number of chunks processed, and total tokens.
+
+    Extraction, splitting and Chroma writes run off the event loop. Uploads
+    to the same collection are applied one at a time (also across workers);
+    if the collection stays busy for COLLECTION_LOCK_TIMEOUT, 503 is returned.
+    """
+    try:
+        # ------------------------------
+        # Step 1: Extract text
+        # ------------------------------
+        if file:
+            # Extractors are heavy, so they are only imported on this path
+            from utils.pdf_utils import extract_file_text
+
+            # Save uploaded file temporarily (unique name: same-named uploads may run at once)
+            fd, file_path = tempfile.mkstemp(prefix="temp_", suffix=os.path.splitext(file.filename or "")[1])
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(await file.read())
+                # Extract text using utility function
+                text = await asyncio.to_thread(extract_file_text, file_path)
+            finally:
+                os.remove(file_path)  # Clean up temp file
+        elif file_str:
+            text = file_str
+        else:
+            log.error("No file or file_str provided in request.")
+            raise HTTPException(status_code=400, detail="No file or file_str provided")
+
+        if not text.strip():
+            log.error("No text extracted from file or string.")
+            raise ValueError("No text content extracted or provided")
+
+        # ------------------------------
+        # Step 2: Split text into chunks
+        # ------------------------------
+        # Helps with embedding and retrieval in ChromaDB
+        chunks = await asyncio.to_thread(split_text, text, collection_name)
+
+        # ------------------------------
+        # Step 3: Store chunks in ChromaDB
+        # ------------------------------
+        collection = collection_manager.get(collection_name)
+        ingest_stats = await add_chunks_to_chroma(chunks, collection)
+
+        return JSONResponse({
+            "detail": f"Text processed successfully for collection '{collection_name}'",
+            "chunks_processed": len(chunks),
+            "duplicates_skipped": ingest_stats["duplicates"],
+            "total_tokens": sum(len(chunk.page_content) for chunk in chunks)
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except CollectionLockTimeout as e:
+        log.warning(f"/upload-pdf gave up waiting: {e}")
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    except Exception as e:
+        log.error(f"Error in /upload-pdf: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to process input: {str(e)}")
+
+
+# ==========================
+# Helpers: Mail Triage Pipeline
+# ==========================
+# Shared by /query and /query-batch.
+def load_past_dialogue(session_id):
+    """
+    Returns the session's Redis chat history and its last 3 user messages.
+    Messages stored before mail normalization existed are normalized here.
+    """
+    chat_history = RedisChatMessageHistory(session_id=session_id, url=REDIS_URL)
+    past_dialogue = [msg.content for msg in chat_history.messages if isinstance(msg, HumanMessage)][-3:]
+    return chat_history, [normalize_body(message) for message in past_dialogue]
+
+
+def build_mail_query(subject, mail_body):
+    """
+    Normalizes a mail (quoted history, signatures, HTML, disclaimers removed)
+    into the query text and records the tokens saved for the request log.
+    """
+    query_ask, stats = normalize_mail(subject, mail_body)
+    add_log_counter("mail_tokens_before", stats["tokens_before"])
+    add_log_counter("mail_tokens_saved", stats["tokens_saved"])
+    return query_ask
+
+
+async def call_chat_backend(user_prompt, deadline=None, llm_options=None):
+    """
+    Sends the prompt to the Ollama chat endpoint and returns the answer text.
+
+    - The static instructions go in the system message (cacheable prefix),
+      the context and question in the user message; keep_alive and num_ctx
+      are set by build_chat_payload() (overridable with 'llm_options').
+    - The answer is constrained to the TicketTriage JSON schema.
+    - Bounded concurrency on the chat backend; requests whose client
+      deadline has passed are rejected before the LLM is called.
+    - The call times out at the remaining deadline (at most BITNET_TIMEOUT).
+    - Ollama's prompt-eval and load timings are added to the request log counters.
+    """
+    payload = build_chat_payload(custom_system_prompt, user_prompt, llm_options, TICKET_TRIAGE_SCHEMA)
+    headers = {"Content-Type": "application/json"}
+
+    async with admit("ollama_chat", deadline):
+        with log_stage("llm"):
+            http_client = get_http_client()
+            response_api = await http_client.post(
+                BITNET_URL, headers=headers, json=payload,
+                timeout=max(remaining_time(deadline, BITNET_TIMEOUT), 0.1)
+            )
+            response_api.raise_for_status()
+            response_data = response_api.json()
+
+    # Ollama reports durations in nanoseconds
+    add_log_counter("llm_prompt_tokens", response_data.get("prompt_eval_count", 0))
+    add_log_counter("llm_prompt_eval_ms", round(response_data.get("prompt_eval_duration", 0) / 1e6, 2))
+    add_log_counter("llm_load_ms", round(response_data.get("load_duration", 0) / 1e6, 2))
+    return response_data.get("message", {}).get("content", "").strip()
+
+
+def relevant_context(results, distances, collection_name, log_distance=True):
+    """
+    Builds the prompt context from the retrieved chunks within the
+    collection's relevance threshold.
+
+    Returns:
+        tuple: (context, irrelevant). 'irrelevant' is True only if chunks
+               were retrieved and the threshold dropped all of them, i.e.
+               the LLM call can be skipped.
+    """
+    if distances and log_distance:
+        set_log_context(retrieval_distance=round(min(distances), 4))
+    kept = filter_relevant(results, distances, collection_name)
+    context_tmp = "\n\n".join(kept)
+    return extract_relevant_data(context_tmp) or context_tmp, bool(results) and not kept
+
+
+def no_relevant_info_response():
+    """
+    The prompt's fixed "couldn't find relevant information" answer, as the
+    raw model-style JSON text and as the parsed dict.
+    """
+    response_text = TicketTriage(solution=NO_RELEVANT_INFO_REPLY).model_dump(by_alias=True)
+    return json.dumps(response_text), response_text
+
+
+def parse_query_response(response_text_tmp):
+    """
+    Validates the model answer against TicketTriage (one local repair if
+    needed, the raw text as solution as a last resort) and returns it as a
+    dict with the prompt's field names.
+    """
+    response_text = parse_structured(response_text_tmp, TicketTriage, "ollama_chat").model_dump(by_alias=True)
+    response_text['solution'] = response_text['solution'].replace('\n', '\\n')
+    return response_text
+
+
+def build_adaptive_card(response_text):
+    """
+    Wraps the parsed answer in the Adaptive Card style response.
+    """
+    return {
+        "type": "adaptiveCard",
+        "body": [
+            {"type": "TextBlock", "text": response_text},
+            {"type": "TextBlock", "text": "Was I helpful?"},
+            {
+                "type": "Button",
+                "id": "serviceType",
+                "style": "expanded",
+                "choices": [
+                    {"id": "Yes", "title": "Yes", "value": "Yes"},
+                    {"id": "No", "title": "No", "value": "No"}
+                ]
+            }
+        ],
+        "actions": []
+    }
+
+
+# ==========================
+# API: Query Documents & Generate AI Response
+# ==========================
+@app.post("/query")
+async def query_documents(request: Request):
+    """
+    Accepts user query, retrieves context from ChromaDB, and generates AI response
+    via Hugging Face / Ollama API.
+    """
+    try:
+        body = await request.json()
+        subject = body.get("subject")
+        mailBody = body.get("mailBody")
+        session_id = body.get("session_id")
+        collection_name = body.get("collection_name")
+
+        if not session_id:
+            raise HTTPException(status_code=400, detail="Session ID is required")
+        set_log_context(session_id=session_id)
+        try:
+            validate_llm_options(body.get("llm_options"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # ------------------------------
+        # Step 1: Combine subject and normalized mail body
+        # ------------------------------
+        with log_stage("normalize"):
+            query_ask = build_mail_query(subject, mailBody)
+
+        # ------------------------------
+        # Step 2: Retrieve conversation history from Redis
+        # ------------------------------
+        with log_stage("history"):
+            chat_history, past_dialogue = load_past_dialogue(session_id)
+        full_query = " ".join(past_dialogue + [query_ask])
+
+        # ------------------------------
+        # Step 3: Retrieve top-k (RETRIEVAL_TOP_K) documents from ChromaDB
+        # ------------------------------
+        with log_stage("retrieve"):
+            collection = collection_manager.get(collection_name)
+            results, distances = await retrieve_documents(full_query, collection, top_k=RETRIEVAL_TOP_K, with_distances=True)
+        context, irrelevant = relevant_context(results, distances, collection_name)
+
+        if irrelevant:
+            # Every retrieved chunk was beyond the threshold: the prompt's fixed answer, no LLM call
+            record_llm_skipped("/query", "no_relevant_context")
+            response_text_tmp, response_text = no_relevant_info_response()
+        else:
+            # ------------------------------
+            # Step 4: Prepare user prompt (instructions are the system message)
+            # ------------------------------
+            user_prompt = custom_prompt.format(context=context, question=query_ask)
+
+            # ------------------------------
+            # Step 5: Call the chat backend
+            # ------------------------------
+            response_text_tmp = await call_chat_backend(
+                user_prompt, request.state.deadline, body.get("llm_options")
+            )
+
+            # ------------------------------
+            # Step 6: Clean and format response
+            # ------------------------------
+            response_text = parse_query_response(response_text_tmp)
+
+        # Save conversation back to Redis
+        with log_stage("save_history"):
+            chat_history.add_user_message(query_ask)
+            chat_history.add_ai_message(response_text_tmp)
+
+        # ------------------------------
+        # Step 7: Build Adaptive Card style response
+        # ------------------------------
+        return JSONResponse(build_adaptive_card(response_text), status_code=200)
+
+    except HTTPException:
+        raise
+    except RetrievalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        log.error(f"Error in /query: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve documents: {str(e)}")
+
+
+# ==========================
+# API: Batch Mail Triage
+# ==========================
+@app.post("/query-batch")
+async def query_documents_batch(request: Request):
+    """
+    Triage many mails for one collection in a single call (backlog clearance).
+
+    Request body:
+        {
+          "collection_name": "...",
+          "stream": false,                  # true -> NDJSON, one line per finished item
+          "llm_options": {"keep_alive": "1h"},  # optional, see build_chat_payload()
+          "items": [{"subject": "...", "mailBody": "...", "session_id": "..."}, ...]
+        }
+
+    Steps:
+    1. Load each item's conversation history and build its query.
+    2. Embed all queries in batches and run the ChromaDB lookups together.
+    3. Fan the LLM calls out, at most BATCH_LLM_CONCURRENCY at a time
+       (and still within the "ollama_chat" admission limit). Items with
+       nothing relevant retrieved get the fixed answer without an LLM call;
+       items whose query could not be embedded get an error entry.
+    4. Return per-item Adaptive Card results or errors, in input order
+       (JSON) or in completion order (NDJSON, each line has its "index").
+    """
+    try:
+        body = await request.json()
+        items = body.get("items") or []
+        collection_name = body.get("collection_name")
+        stream = bool(body.get("stream", False))
+        llm_options = body.get("llm_options")
+        deadline = request.state.deadline
+
+        if not items:
+            raise HTTPException(status_code=400, detail="No items provided")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="'items' must be a list")
+        if len(items) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+        try:
+            validate_llm_options(llm_options)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # ------------------------------
+        # Step 1: Queries and history
+        # ------------------------------
+        prepared = []  # (index, item, query_ask, chat_history, full_query) or error dict
+        with log_stage("history"):
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    prepared.append({"index": index, "session_id": None, "status": "error",
+                                     "error": "Item must be an object"})
+                    continue
+                try:
+                    if not item.get("session_id"):
+                        raise ValueError("Session ID is required")
+                    query_ask = build_mail_query(item.get("subject", ""), item.get("mailBody", ""))
+                    chat_history, past_dialogue = load_past_dialogue(item["session_id"])
+                    prepared.append((index, item, query_ask, chat_history,
+                                     " ".join(past_dialogue + [query_ask])))
+                except Exception as e:
+                    prepared.append({"index": index, "session_id": item.get("session_id"),
+                                     "status": "error", "error": str(e)})
+
+        # ------------------------------
+        # Step 2: Batched embedding + retrieval
+        # ------------------------------
+        pending = [p for p in prepared if not isinstance(p, dict)]
+        with log_stage("retrieve"):
+            collection = collection_manager.get(collection_name)
+            contexts, distances = await retrieve_documents_batch(
+                [p[4] for p in pending], collection, top_k=RETRIEVAL_TOP_K, with_distances=True
+            )
+
+        # ------------------------------
+        # Step 3: LLM fan-out under a concurrency cap
+        # ------------------------------
+        llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        async def triage(entry, results, result_distances):
+            index, item, query_ask, chat_history, _ = entry
+            if results is None:
+                return {"index": index, "session_id": item["session_id"], "status": "error",
+                        "error": "Embedding the query failed"}
+            try:
+                context, irrelevant = relevant_context(results, result_distances, collection_name,
+                                                       log_distance=False)
+                if irrelevant:
+                    record_llm_skipped("/query-batch", "no_relevant_context")
+                    response_text_tmp, response_text = no_relevant_info_response()
+                else:
+                    user_prompt = custom_prompt.format(context=context, question=query_ask)
+                    async with llm_slots:
+                        response_text_tmp = await call_chat_backend(user_prompt, deadline, llm_options)
+                    response_text = parse_query_response(response_text_tmp)
+                chat_history.add_user_message(query_ask)
+                chat_history.add_ai_message(response_text_tmp)
+                return {"index": index, "session_id": item["session_id"], "status": "ok",
+                        "response": build_adaptive_card(response_text)}
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                log.error(f"Batch item {index} failed: {detail}")
+                return {"index": index, "session_id": item["session_id"], "status": "error",
+                        "error": detail}
+
+        failed = [p for p in prepared if isinstance(p, dict)]
+        tasks = [asyncio.ensure_future(triage(entry, results, result_distances))
+                 for entry, results, result_distances in zip(pending, contexts, distances)]
+
+        # ------------------------------
+        # Step 4: Results
+        # ------------------------------
+        if stream:
+            async def ndjson():
+                try:
+                    for result in failed:
+                        yield json.dumps(result) + "\n"
+                    for task in asyncio.as_completed(tasks):
+                        yield json.dumps(await task) + "\n"
+                finally:
+                    for task in tasks:
+                        task.cancel()  # Client went away
+
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        results = failed + list(await asyncio.gather(*tasks))
+        results.sort(key=lambda r: r["index"])
+        return JSONResponse({
+            "collection": collection_name,
+            "total": len(results),
+            "succeeded": sum(1 for r in results if r["status"] == "ok"),
+            "results": results
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except RetrievalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        log.error(f"Error in /query-batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to process batch: {str(e)}")
+
+
+# ==========================
+# API: Solution Chat (Groq LLM)
+# ==========================
+
+async def answer_solution_chat(query_ask, chat_history, collection_name, deadline):
+    """
+    Retrieves context for a /solution-chat message and asks Groq for the
+    solution. Returns (solution, raw answer text for the history).
+
+    If every retrieved chunk is beyond the relevance threshold, the prompt's
+    fixed "no incident-related details" reply is returned without calling
+    Groq. Retrieval failures raise RetrievalError.
+    """
+    # Retrieve last 3 user messages from Redis
+    with log_stage("history"):
+        past_dialogue = [
+            msg.content for msg in chat_history.messages if isinstance(msg, HumanMessage)
+        ][-3:]
+
+    full_query = " ".join(past_dialogue + [query_ask])
+
+    # Retrieve top RETRIEVAL_TOP_K documents from Chroma
+    with log_stage("retrieve"):
+        collection = collection_manager.get(collection_name)
+        results, distances = await retrieve_documents(full_query, collection, top_k=RETRIEVAL_TOP_K, with_distances=True)
+
+    context, irrelevant = relevant_context(results, distances, collection_name)
+    if irrelevant:
+        record_llm_skipped("/solution-chat", "no_relevant_context")
+        return NO_CONTEXT_REPLY, json.dumps({"solution": NO_CONTEXT_REPLY})
+
+    # Prepare prompt
+    system_prompt = custom_prompt_solution_chat.format(
+        context=context, 
+        question=query_ask
+    )
+
+    # Query Groq (client is created once per worker)
+    async with admit("groq", deadline):
+        with log_stage("llm"):
+            groq_llm = get_groq_llm()
+            try:
+                response = await asyncio.wait_for(
+                    groq_llm.ainvoke([
+                        {"role": "system", "content": "You are Zeni, a helpful assistant."},
+                        {"role": "user", "content": system_prompt}
+                    ]),
+                    timeout=max(remaining_time(deadline, GROQ_TIMEOUT), 0.1)
+                )
+                response_payload = response.content.strip()
+            except Exception as e:
+                # JSON mode rejected the answer; repair it instead of generating again
+                response_payload = failed_generation(e)
+                if response_payload is None:
+                    raise
+
+    # Validate the JSON answer (raw text is used if it cannot be repaired)
+    groq_parsed = parse_structured(response_payload, SolutionAnswer, "groq")
+    return groq_parsed.solution, response_payload
+
+
+@app.post("/solution-chat")
+async def solution_chat(request: Request):
+    """
+    Query ChromaDB and return AI response using Groq LLM.
+    Greetings and small talk get the fixed greeting reply without retrieval
+    or an LLM call.
+    """
+    try:
+        body = await request.json()
+        query_ask = body.get("user_query")
+        session_id = body.get("session_id")
+        collection_name = "auto_ticket_creation"
+
+        if not session_id:
+            raise HTTPException(status_code=400, detail="Session ID is required")
+        set_log_context(session_id=session_id)
+
+        chat_history = RedisChatMessageHistory(session_id=session_id, url=REDIS_URL)
+        if is_small_talk(query_ask):
+            record_llm_skipped("/solution-chat", "small_talk")
+            solution, response_payload = GREETING_REPLY, json.dumps({"solution": GREETING_REPLY})
+        else:
+            solution, response_payload = await answer_solution_chat(
+                query_ask, chat_history, collection_name, request.state.deadline
+            )
+
+        # Save conversation to Redis
+        with log_stage("save_history"):
+            chat_history.add_user_message(query_ask)
+            chat_history.add_ai_message(response_payload)
+
+        # Build final response dictionary
+        final_response = {
+            "source": "rag_knowledge_base",
+            "query": query_ask,
+            "solution": solution,
+            "session_id": session_id,
+            "document": collection_name
+        }
+
+        return JSONResponse(final_response, status_code=200)
+
+    except HTTPException:
+        raise
+    except RetrievalError as e:
+        return JSONResponse(
+            {"status": "error", "message": str(e)},
+            status_code=503
+        )
+    except Exception as e:
+        log.error(f"Error in /solution-chat: {e}", exc_info=True)
+        return JSONResponse(
+            {"status": "error", "message": str(e)},
+            status_code=500
+        )
+
+# ==========================
+# Run the App
+# ==========================
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
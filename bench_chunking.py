@@ -0,0 +1,90 @@
+# ===========================================
+# ⏱ Chunking Benchmark
+# ===========================================
+# Compares the structure-aware ChunkingEngine (utils/chunking.py) with the
+# previous RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+# on speed, number of chunks and chunk size in tokens.
+#
+# Usage:
+#   python bench_chunking.py                       # synthetic incident report
+#   python bench_chunking.py kb1.txt kb2.txt       # your own text files
+#   python bench_chunking.py --incidents 5000 --max-tokens 512
+
+import argparse
+import random
+import statistics
+import time
+
+from utils.chunking import ChunkingEngine, estimate_tokens
+
+SECTIONS = ("Challenges", "Observations", "Actions Taken", "Root Cause Analysis")
+WORDS = ("dialer", "campaign", "agent", "queue", "timeout", "database", "lock", "sip",
+         "trunk", "restart", "configuration", "latency", "customer", "ticket", "call")
+
+
+def synthetic_report(n_incidents, seed=0):
+    """
+    Builds an incident report in the knowledge-base layout.
+    """
+    rng = random.Random(seed)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+    incidents = []
+    for i in range(n_incidents):
+        lines = [f"Main Issue: {sentence()}"]
+        for section in SECTIONS:
+            paragraphs = ["\n".join(sentence() for _ in range(rng.randint(1, 6)))
+                          for _ in range(rng.randint(1, 3))]
+            lines.append(f"{section}: " + "\n\n".join(paragraphs))
+        lines.append("Priority: Semi Critical")
+        incidents.append("\n".join(lines))
+    return "---\n" + "\n---\n".join(incidents) + "\n---\n"
+
+
+def measure(label, split, text, repeats):
+    """
+    Times split(text) and prints chunk statistics.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = split(text)
+        timings.append(time.perf_counter() - start)
+    tokens = [estimate_tokens(c.page_content) for c in chunks]
+    print(f"  {label:<22} time={statistics.median(timings) * 1000:9.1f} ms  "
+          f"chunks={len(chunks):6d}  tokens/chunk avg={statistics.mean(tokens):6.1f} "
+          f"max={max(tokens):5d}  total tokens={sum(tokens)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies")
+    parser.add_argument("files", nargs="*", help="Text files to split (default: synthetic report)")
+    parser.add_argument("--incidents", type=int, default=2000, help="Incidents in the synthetic report")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    if args.files:
+        texts = []
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                texts.append((path, f.read()))
+    else:
+        texts = [(f"synthetic ({args.incidents} incidents)", synthetic_report(args.incidents))]
+
+    recursive = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    engine = ChunkingEngine(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+
+    for name, text in texts:
+        print(f"\n{name}: {len(text):,} characters, ~{estimate_tokens(text):,} tokens")
+        measure("recursive 1000/200", lambda t: recursive.create_documents([t]), text, args.repeats)
+        measure(f"structure {args.max_tokens}/{args.overlap_tokens}", engine.split, text, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
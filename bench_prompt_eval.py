@@ -0,0 +1,129 @@
+# ===========================================
+# ⏱ Prompt Evaluation Benchmark
+# ===========================================
+# Sends the same /query prompts to a chat backend with three payload layouts
+# and compares prompt-evaluation and model-load time as reported by Ollama:
+#
+#   legacy  - instructions + context + question in one user message,
+#             no keep_alive, no options (the previous payload)
+#   split   - instructions as the system message, context + question as the
+#             user message, no keep_alive, no options
+#   tuned   - split layout plus keep_alive and sized num_ctx
+#             (utils/ollama_chat.build_chat_payload)
+#
+# Requests are sent in bursts with idle gaps in between, like ticket traffic.
+# Works against a real Ollama server or the local stand-in (mock_ollama.py).
+#
+# Usage:
+#   python mock_ollama.py --port 11435 --default-keep-alive 2s --load-seconds 1 &
+#   python bench_prompt_eval.py --url http://127.0.0.1:11435/api/chat --idle 3
+#   python bench_prompt_eval.py --url http://gpu-host:11434/api/chat --model mistral:latest
+
+import argparse
+import random
+import statistics
+import time
+
+import httpx
+
+from bench_chunking import synthetic_report, WORDS
+from prompt_template import custom_prompt, custom_system_prompt
+from utils.chunking import ChunkingEngine
+from utils.ollama_chat import build_chat_payload
+
+
+def build_prompts(n, seed=0):
+    """
+    Builds n (context, question) pairs from a synthetic knowledge base.
+    """
+    rng = random.Random(seed)
+    chunks = [c.page_content for c in ChunkingEngine().split(synthetic_report(200, seed))]
+    prompts = []
+    for _ in range(n):
+        context = "\n\n".join(rng.sample(chunks, 3))
+        question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + "?"
+        prompts.append((context, question))
+    return prompts
+
+
+def make_payload(layout, model, context, question):
+    """
+    Request body for one prompt in the given layout.
+    """
+    user_prompt = custom_prompt.format(context=context, question=question)
+    if layout == "legacy":
+        return {
+            "model": model,
+            "messages": [{"role": "user", "content": custom_system_prompt + user_prompt}],
+            "stream": False,
+            "think": False
+        }
+    payload = build_chat_payload(custom_system_prompt, user_prompt)
+    payload["model"] = model
+    if layout == "split":
+        payload.pop("keep_alive")
+        payload.pop("options")
+    return payload
+
+
+def run_layout(client, args, layout, prompts):
+    """
+    Sends all prompts in bursts and returns the per-request measurements.
+    """
+    base_url = args.url.rsplit("/api/", 1)[0]
+    try:
+        client.post(f"{base_url}/mock/reset")  # Start cold (stand-in only)
+    except httpx.HTTPError:
+        pass
+
+    samples = []
+    for index, (context, question) in enumerate(prompts):
+        if index and index % args.burst == 0:
+            time.sleep(args.idle)
+        start = time.perf_counter()
+        response = client.post(args.url, json=make_payload(layout, args.model, context, question))
+        response.raise_for_status()
+        data = response.json()
+        samples.append({
+            "wall_ms": (time.perf_counter() - start) * 1000,
+            "prompt_eval_ms": data.get("prompt_eval_duration", 0) / 1e6,
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "load_ms": data.get("load_duration", 0) / 1e6,
+            "truncated": bool(data.get("mock_truncated", False)),
+        })
+    return samples
+
+
+def report(layout, samples):
+    def p95(values):
+        return sorted(values)[max(int(len(values) * 0.95) - 1, 0)]
+
+    wall = [s["wall_ms"] for s in samples]
+    prompt = [s["prompt_eval_ms"] for s in samples]
+    print(f"  {layout:<7} wall p50={statistics.median(wall):8.1f} ms  p95={p95(wall):8.1f} ms  "
+          f"prompt_eval mean={statistics.mean(prompt):7.1f} ms  "
+          f"tokens evaluated mean={statistics.mean(s['prompt_tokens'] for s in samples):7.1f}  "
+          f"loads={sum(1 for s in samples if s['load_ms'] > 0):3d} "
+          f"({sum(s['load_ms'] for s in samples) / 1000:.1f} s)  "
+          f"truncated={sum(s['truncated'] for s in samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt-eval time of chat payload layouts")
+    parser.add_argument("--url", default="http://127.0.0.1:11435/api/chat", help="Chat endpoint")
+    parser.add_argument("--model", default="mistral:latest")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--burst", type=int, default=10, help="Requests per burst")
+    parser.add_argument("--idle", type=float, default=3.0, help="Seconds between bursts")
+    parser.add_argument("--layouts", default="legacy,split,tuned")
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.requests)
+    print(f"{args.requests} requests in bursts of {args.burst}, {args.idle}s idle, {args.url}")
+    with httpx.Client(timeout=600) as client:
+        for layout in args.layouts.split(","):
+            report(layout, run_layout(client, args, layout, prompts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# ===========================================
+# ⏱ Worker Startup Benchmark
+# ===========================================
+# Measures how long `import app` takes in a fresh interpreter and how much
+# memory (peak RSS) the worker holds afterwards.
+# Run it on two checkouts (before/after a change) to compare worker boot cost.
+#
+# Usage:
+#   python bench_startup.py             # 5 runs, import only
+#   python bench_startup.py --runs 10 --warmup
+#       --warmup also runs the startup warm-up (needs Chroma + embedding API)
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Code executed in each child interpreter; prints one JSON line with results
+CHILD_CODE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+warmup_seconds = None
+if {warmup}:
+    import asyncio
+    start = time.perf_counter()
+    asyncio.run(app.warm_up())
+    warmup_seconds = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "warmup_seconds": warmup_seconds,
+    "rss_mb": rss_kb / 1024,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def run_once(warmup):
+    """
+    Runs one fresh interpreter and returns the measurement dict it prints.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE.format(warmup=warmup)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and RSS per worker.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to start")
+    parser.add_argument("--warmup", action="store_true", help="Also run the startup warm-up")
+    args = parser.parse_args()
+
+    samples = [run_once(args.warmup) for _ in range(args.runs)]
+
+    for key in ("import_seconds", "warmup_seconds", "rss_mb", "modules"):
+        values = [s[key] for s in samples if s[key] is not None]
+        if not values:
+            continue
+        print(f"{key:>16}: median={statistics.median(values):.3f} "
+              f"min={min(values):.3f} max={max(values):.3f}")
+
+
+if __name__ == "__main__":
+    main()
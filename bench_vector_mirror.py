@@ -0,0 +1,135 @@
+# ===========================================
+# ⏱ Vector Mirror Benchmark
+# ===========================================
+# Compares top-k query latency of the in-memory vector mirror
+# (utils/vector_mirror.py) against ChromaDB's collection.query()
+# on synthetic collections of different sizes.
+#
+# Usage:
+#   python bench_vector_mirror.py                          # 10k, 100k, 1M
+#   python bench_vector_mirror.py --sizes 10000 --queries 200 --dtypes float16,int8
+#
+# Every mirror dtype is compared against the same Chroma collection. int8
+# mirrors are queried with rescoring, as in the service.
+#
+# Everything is written to a temporary directory and removed afterwards.
+# Note: loading 1M x 768 vectors into Chroma takes a while and ~3 GB of disk.
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.vector_mirror import SUPPORTED_DTYPES, VectorMirror
+
+# Largest batch accepted by a single Chroma add() call
+CHROMA_BATCH = 5000
+
+
+def percentile(values, pct):
+    """
+    Returns the pct-th percentile (0-100) of a list of numbers.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_queries(fn, queries):
+    """
+    Runs fn(query) for every query and returns per-query latencies in ms.
+    """
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run_size(size, dim, top_k, n_queries, dtypes, workdir):
+    """
+    Builds a Chroma collection and one mirror per dtype of 'size' random
+    vectors and reports latency of every read path plus top-k agreement
+    with the exact float32 result.
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    rng = np.random.default_rng(size)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    ids = [f"chunk_{i}" for i in range(size)]
+    documents = [""] * size
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+
+    client = chromadb.PersistentClient(path=f"{workdir}/chroma_{size}",
+                                       settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection(name=f"bench_{size}")
+    for start in range(0, size, CHROMA_BATCH):
+        end = start + CHROMA_BATCH
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end],
+                       documents=documents[start:end])
+
+    # Exact float32 top-k, the reference for every read path
+    sample = queries[:50]
+    exact = [set(np.argsort(((vectors - q) ** 2).sum(axis=1))[:top_k]) for q in sample]
+
+    def recall(found):
+        return statistics.mean(
+            len({int(i.split("_")[1]) for i in ids_} & truth) / top_k for ids_, truth in zip(found, exact))
+
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=top_k)  # warm-up
+    rows = [("chroma", time_queries(
+        lambda q: collection.query(query_embeddings=[q.tolist()], n_results=top_k), queries),
+        recall(collection.query(query_embeddings=[q.tolist()], n_results=top_k)["ids"][0] for q in sample),
+        None)]
+
+    for dtype in dtypes:
+        mirror = VectorMirror(f"bench_{size}", directory=f"{workdir}/mirror_{dtype}", dtype=dtype)
+        mirror.write(ids, vectors, documents)
+        mirror.query(queries[0], top_k=top_k)  # warm-up
+        rows.append((f"mirror {dtype}",
+                     time_queries(lambda q: mirror.query(q, top_k=top_k), queries),
+                     recall(mirror.query(q, top_k=top_k)["ids"][0] for q in sample),
+                     (mirror.nbytes(), mirror.rescore_nbytes())))
+
+    print(f"\n{size:,} vectors (dim={dim}, top_k={top_k})")
+    for label, values, hit_rate, nbytes in rows:
+        size_note = ""
+        if nbytes is not None:
+            size_note = f"  scanned={nbytes[0] / 1e6:.1f} MB"
+            if nbytes[1]:
+                size_note += f" (+{nbytes[1] / 1e6:.1f} MB rescore copy on disk)"
+        print(f"  {label:>14}: p50={percentile(values, 50):8.3f} ms  "
+              f"p95={percentile(values, 95):8.3f} ms  mean={statistics.mean(values):8.3f} ms  "
+              f"recall@{top_k}={hit_rate:.3f}{size_note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector mirror vs collection.query")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated collection sizes")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding size (nomic-embed-text: 768)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dtypes", default=",".join(SUPPORTED_DTYPES),
+                        help=f"Comma-separated mirror dtypes ({', '.join(SUPPORTED_DTYPES)})")
+    args = parser.parse_args()
+    dtypes = args.dtypes.split(",")
+    for dtype in dtypes:
+        if dtype not in SUPPORTED_DTYPES:
+            parser.error(f"unsupported dtype: {dtype}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_mirror_")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            run_size(size, args.dim, args.top_k, args.queries, dtypes, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
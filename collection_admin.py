@@ -0,0 +1,195 @@
+# ===========================================
+# 🗄 Collection Administration CLI
+# ===========================================
+# Maintenance commands for ChromaDB collections.
+#
+# Usage:
+#   python collection_admin.py compact <collection>
+#       Rebuilds the collection in place, dropping deleted entries, and
+#       prints disk usage before and after.
+#
+#   python collection_admin.py storage-report <collection> [--query-file queries.txt]
+#       Compares float32 / float16 / int8 storage of the collection's
+#       embeddings: memory and disk size, and recall@k against exact float32
+#       search on a fixed query set (one query per line in --query-file, or a
+#       fixed sample of stored embeddings if no file is given; sampled rows
+#       are held out of the searched index so they cannot find themselves).
+#
+#   python collection_admin.py export <collection> [--out ./snapshots/<collection>]
+#       Writes a portable snapshot (IDs, documents, metadata, embeddings).
+#
+#   python collection_admin.py import <snapshot_dir> [--name <collection>] [--replace]
+#       Loads a snapshot with bulk upserts; nothing is re-embedded.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from settings import SNAPSHOT_DIR
+from utils.chroma_utils import (
+    get_chroma_client, compact_collection, get_directory_size, get_embeddings
+)
+
+
+def cmd_compact(args):
+    """
+    Compacts a collection and prints the before/after report.
+    """
+    client = get_chroma_client()
+    report = compact_collection(client, args.collection)
+    report["disk_bytes_saved"] = report["disk_bytes_before"] - report["disk_bytes_after"]
+    print(json.dumps(report, indent=2))
+    if report["disk_bytes_saved"] <= 0:
+        sys.exit(f"Compaction of '{args.collection}' did not reduce disk usage")
+
+
+async def load_query_vectors(query_file):
+    """
+    Embeds every non-empty line of 'query_file'.
+    """
+    with open(query_file, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    vectors = [await get_embeddings(query) for query in queries]
+    return [v for v in vectors if v]
+
+
+def cmd_storage_report(args):
+    """
+    Prints memory/disk size and recall@k for each storage dtype.
+    """
+    import numpy as np
+    from utils.vector_mirror import VectorMirror
+
+    client = get_chroma_client()
+    collection = client.get_collection(name=args.collection)
+    results = collection.get(include=["embeddings", "documents"])
+    ids = results["ids"]
+    if not ids:
+        print(f"Collection '{args.collection}' is empty")
+        return
+    matrix = np.asarray(results["embeddings"], dtype=np.float32)
+    documents = results.get("documents") or [""] * len(ids)
+
+    # Fixed query set: embedded query file, or a seeded sample of stored rows.
+    # Sampled rows are removed from the index, otherwise each query's own row
+    # is a guaranteed hit at distance 0 and recall is overstated.
+    if args.query_file:
+        queries = np.asarray(asyncio.run(load_query_vectors(args.query_file)), dtype=np.float32)
+    else:
+        if len(ids) <= args.top_k:
+            print(f"Collection '{args.collection}' has too few entries to hold out queries; "
+                  f"use --query-file")
+            return
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(ids), size=min(args.queries, len(ids) - args.top_k), replace=False)
+        queries = matrix[sample]
+        held_out = np.zeros(len(ids), dtype=bool)
+        held_out[sample] = True
+        matrix = matrix[~held_out]
+        ids = [chunk_id for chunk_id, skip in zip(ids, held_out) if not skip]
+        documents = [document for document, skip in zip(documents, held_out) if not skip]
+
+    # Exact float32 ground truth
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+    truth = []
+    for query in queries:
+        distances = norms - 2.0 * (matrix @ query)
+        truth.append(set(np.argsort(distances)[:args.top_k].tolist()))
+
+    workdir = tempfile.mkdtemp(prefix="storage_report_")
+    report = {"collection": args.collection, "entries": len(ids), "top_k": args.top_k,
+              "queries": len(queries), "held_out": not args.query_file, "storage": []}
+    try:
+        position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        for dtype in ("float32", "float16", "int8"):
+            mirror = VectorMirror(args.collection, directory=f"{workdir}/{dtype}", dtype=dtype)
+            mirror.write(ids, matrix, documents)
+
+            modes = [(dtype, False)]
+            if dtype == "int8":
+                modes.append(("int8+rescore", True))
+            for label, rescore in modes:
+                hits = 0
+                for query, expected in zip(queries, truth):
+                    found = mirror.query(query, top_k=args.top_k, rescore=rescore)["ids"][0]
+                    hits += len(expected & {position[i] for i in found})
+                report["storage"].append({
+                    "dtype": label,
+                    "memory_bytes": mirror.nbytes(),
+                    "rescore_copy_bytes": mirror.rescore_nbytes(),
+                    "disk_bytes": get_directory_size(mirror.path),
+                    f"recall@{args.top_k}": hits / (len(queries) * args.top_k),
+                })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = report["storage"][0]["memory_bytes"]
+    for row in report["storage"]:
+        row["memory_saved_pct"] = round(100 * (1 - row["memory_bytes"] / baseline), 1)
+    print(json.dumps(report, indent=2))
+
+
+def cmd_export(args):
+    """
+    Exports a collection to a snapshot directory.
+    """
+    from utils.snapshot import export_collection
+
+    collection = get_chroma_client().get_collection(name=args.collection)
+    path = args.out or os.path.join(SNAPSHOT_DIR, args.collection)
+    manifest = export_collection(collection, path)
+    manifest["path"] = path
+    manifest["disk_bytes"] = get_directory_size(path)
+    print(json.dumps(manifest, indent=2))
+
+
+def cmd_import(args):
+    """
+    Imports a snapshot directory into a collection.
+    """
+    from utils.snapshot import import_snapshot
+
+    report = import_snapshot(get_chroma_client(), args.path, name=args.name, replace=args.replace,
+                             force=args.force, verify=not args.no_verify)
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChromaDB collection maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact = subparsers.add_parser("compact", help="Rebuild a collection to drop tombstones")
+    compact.add_argument("collection")
+    compact.set_defaults(func=cmd_compact)
+
+    storage = subparsers.add_parser("storage-report", help="Compare quantized storage options")
+    storage.add_argument("collection")
+    storage.add_argument("--query-file", help="Text file with one query per line")
+    storage.add_argument("--queries", type=int, default=200,
+                         help="Sampled stored vectors used as queries when no file is given")
+    storage.add_argument("--top-k", type=int, default=3)
+    storage.set_defaults(func=cmd_storage_report)
+
+    export = subparsers.add_parser("export", help="Write a portable collection snapshot")
+    export.add_argument("collection")
+    export.add_argument("--out", help="Snapshot directory (default: SNAPSHOT_DIR/<collection>)")
+    export.set_defaults(func=cmd_export)
+
+    load = subparsers.add_parser("import", help="Load a snapshot without re-embedding")
+    load.add_argument("path", help="Snapshot directory")
+    load.add_argument("--name", help="Target collection (default: the exported collection name)")
+    load.add_argument("--replace", action="store_true", help="Drop an existing collection first")
+    load.add_argument("--force", action="store_true", help="Ignore an embedding model mismatch")
+    load.add_argument("--no-verify", action="store_true", help="Skip file checksum verification")
+    load.set_defaults(func=cmd_import)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
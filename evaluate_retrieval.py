@@ -0,0 +1,397 @@
+# ===========================================
+# 🎯 Retrieval Evaluation
+# ===========================================
+# Offline sweep of chunking and retrieval parameters against a golden set,
+# to pick settings that minimize LLM input without losing accuracy.
+#
+# For every chunking configuration (strategy, max_tokens/overlap_tokens or
+# chunk_size/chunk_overlap) the corpus is split and indexed into a scratch
+# collection in EVAL_CHROMA_PATH, with the same code as /upload-pdf
+# (add_chunks_to_chroma: dedup, embedding, upsert). Every golden query is
+# then run with each --top-k, and the script reports per configuration:
+#
+#   recall@k         share of queries whose expected incident is in the top k
+#   mrr              mean reciprocal rank of the first matching chunk (0 if none)
+#   context_recall   share of queries whose expected incident is still in the
+#                    context actually sent to the LLM (after extract_relevant_data)
+#   context tokens   tokens of that context (mean and p95), i.e. the LLM input
+#   query ms         vector search latency (p50/p95; query embedding is
+#                    configuration-independent and reported once)
+#   ingest           chunks, split + embed + upsert time
+#   max hit distance largest top-1 distance of a correct answer, a lower
+#                    bound for RELEVANCE_MAX_DISTANCE
+#
+# The recommendation is the configuration with the fewest context tokens whose
+# --metric is within --tolerance of the best one. Chunking settings go into
+# CHUNKING_DEFAULTS / CHUNKING_PER_COLLECTION (re-upload the documents), top_k
+# into RETRIEVAL_TOP_K.
+#
+# Golden set: JSON lines {"query": "...", "expected": "..."}. A retrieved chunk
+# matches if it contains 'expected' (case-insensitive), e.g. the incident's
+# ticket number or "Main Issue:" text; 'expected' may also be a list of
+# alternatives. Corpus: the knowledge-base files as they are uploaded.
+#
+# Usage:
+#   python evaluate_retrieval.py --corpus kb.pdf kb2.txt --golden golden.jsonl
+#   python evaluate_retrieval.py --synthetic 300 --mock --out sweep.csv
+#   python evaluate_retrieval.py --corpus kb.txt --golden golden.jsonl \
+#       --strategies structure --max-tokens 128,256,384 --overlap-tokens 0,32 --top-k 1,2,3
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+
+from load_test import start_process, parse_list
+
+COMMON_WORDS = ("dialer", "campaign", "agent", "queue", "timeout", "database", "lock", "sip",
+                "trunk", "restart", "configuration", "latency", "customer", "ticket", "call",
+                "server", "report", "login", "network", "recording", "disposition", "crm")
+SECTIONS = ("Challenges", "Observations", "Actions Taken", "Root Cause Analysis")
+
+
+# ------------------------------
+# Inputs
+# ------------------------------
+def synthetic_corpus(n_incidents, queries_per_incident=1, seed=0):
+    """
+    Builds a knowledge base in the upload layout plus a golden set.
+
+    Each incident has its own few topic words mixed into common vocabulary;
+    its queries are new sentences on the same topic (never copied from the
+    text), expected to retrieve the incident's ticket number "INC-<n>".
+    """
+    rng = random.Random(seed)
+
+    def pseudo_word():
+        return "".join(rng.choice("bdfgklmnprstvz") + rng.choice("aeiou") for _ in range(3))
+
+    def sentence(topic):
+        words = [rng.choice(topic) if rng.random() < 0.35 else rng.choice(COMMON_WORDS)
+                 for _ in range(rng.randint(8, 16))]
+        return " ".join(words).capitalize() + "."
+
+    incidents, golden = [], []
+    for i in range(n_incidents):
+        topic = [pseudo_word() for _ in range(4)]
+        ticket = f"INC-{i:05d}"
+        lines = [f"Main Issue: {ticket} {sentence(topic)}"]
+        for section in SECTIONS:
+            paragraphs = [" ".join(sentence(topic) for _ in range(rng.randint(1, 4)))
+                          for _ in range(rng.randint(1, 3))]
+            lines.append(f"{section}: " + "\n\n".join(paragraphs))
+        lines.append("Priority: Semi Critical")
+        incidents.append("\n".join(lines))
+        golden.extend((sentence(topic), [ticket.lower()]) for _ in range(queries_per_incident))
+    return ["---\n" + "\n---\n".join(incidents) + "\n---\n"], golden
+
+
+def load_corpus(paths):
+    """
+    Reads the knowledge-base files (.txt directly, other types with the
+    upload extractors).
+    """
+    texts = []
+    for path in paths:
+        if path.lower().endswith(".txt"):
+            with open(path, encoding="utf-8") as f:
+                texts.append(f.read())
+        else:
+            from utils.pdf_utils import extract_file_text
+
+            texts.append(extract_file_text(path))
+    return texts
+
+
+def load_golden(path):
+    """
+    Reads (query, [expected, ...]) pairs; blank lines and lines starting
+    with '#' are skipped.
+    """
+    golden = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            expected = entry["expected"]
+            expected = [expected] if isinstance(expected, str) else list(expected)
+            golden.append((entry["query"], [e.lower() for e in expected]))
+    return golden
+
+
+# ------------------------------
+# Sweep
+# ------------------------------
+def chunking_configs(args):
+    """
+    Cartesian product of the chunking parameters per strategy.
+    """
+    configs = []
+    for strategy in args.strategies:
+        if strategy == "structure":
+            for max_tokens, overlap in itertools.product(args.max_tokens, args.overlap_tokens):
+                if overlap < max_tokens:
+                    configs.append({"strategy": "structure", "max_tokens": max_tokens,
+                                    "overlap_tokens": overlap})
+        else:
+            for size, overlap in itertools.product(args.chunk_sizes, args.chunk_overlaps):
+                if overlap < size:
+                    configs.append({"strategy": "recursive", "chunk_size": size, "chunk_overlap": overlap})
+    return configs
+
+
+def config_label(config):
+    if config["strategy"] == "structure":
+        return f"structure {config['max_tokens']}/{config['overlap_tokens']}"
+    return f"recursive {config['chunk_size']}/{config['chunk_overlap']}"
+
+
+def make_splitter(config):
+    """
+    Returns text -> List[Document] for a chunking configuration.
+    """
+    if config["strategy"] == "structure":
+        from utils.chunking import ChunkingEngine
+
+        return ChunkingEngine(max_tokens=config["max_tokens"], overlap_tokens=config["overlap_tokens"]).split
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=config["chunk_size"],
+                                              chunk_overlap=config["chunk_overlap"])
+    return lambda text: splitter.create_documents([text])
+
+
+def drop_scratch(client, name):
+    """
+    Deletes a scratch collection and its dedup index.
+    """
+    from settings import DEDUP_INDEX_DIR
+
+    try:
+        client.delete_collection(name=name)
+    except Exception:
+        pass  # Did not exist
+    shutil.rmtree(os.path.join(DEDUP_INDEX_DIR, name), ignore_errors=True)
+
+
+def matches(text, expected):
+    text = (text or "").lower()
+    return any(e in text for e in expected)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def evaluate_config(index, config, texts, golden, query_vectors, top_ks, client):
+    """
+    Indexes the corpus with one chunking configuration and scores every top_k.
+    """
+    from utils.chroma_utils import add_chunks_to_chroma
+    from utils.chunking import estimate_tokens
+    from utils.retriever import extract_relevant_data
+
+    name = f"eval_{index}"
+    drop_scratch(client, name)
+    collection = client.get_or_create_collection(name=name)
+
+    start = time.perf_counter()
+    split = make_splitter(config)
+    chunks = [chunk for text in texts for chunk in split(text)]
+    split_seconds = time.perf_counter() - start
+    ingest = await add_chunks_to_chroma(chunks, collection)
+    ingest_seconds = time.perf_counter() - start
+    chunk_tokens = [estimate_tokens(chunk.page_content) for chunk in chunks] or [0]
+
+    rows = []
+    for k in top_ks:
+        latencies, reciprocal_ranks, context_tokens, hit_distances = [], [], [], []
+        hits = context_hits = 0
+        for (_, expected), vector in zip(golden, query_vectors):
+            if not vector:
+                reciprocal_ranks.append(0.0)  # Embedding failed: counts as a miss
+                continue
+            t = time.perf_counter()
+            results = collection.query(query_embeddings=[vector], n_results=k)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+            docs = results["documents"][0]
+            distances = results["distances"][0]
+            rank = next((r for r, doc in enumerate(docs, 1) if matches(doc, expected)), None)
+            hits += rank is not None
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+            if rank == 1:
+                hit_distances.append(distances[0])
+
+            # Context as /query builds it
+            context_tmp = "\n\n".join(docs)
+            context = extract_relevant_data(context_tmp) or context_tmp
+            context_tokens.append(estimate_tokens(context))
+            context_hits += matches(context, expected)
+
+        rows.append({
+            "config": config_label(config),
+            **config,
+            "top_k": k,
+            "recall": round(hits / len(golden), 4),
+            "mrr": round(statistics.mean(reciprocal_ranks), 4),
+            "context_recall": round(context_hits / len(golden), 4),
+            "context_tokens_avg": round(statistics.mean(context_tokens), 1) if context_tokens else 0,
+            "context_tokens_p95": percentile(context_tokens, 0.95),
+            "query_ms_p50": round(percentile(latencies, 0.5), 2) if latencies else None,
+            "query_ms_p95": round(percentile(latencies, 0.95), 2) if latencies else None,
+            "chunks": len(chunks),
+            "chunks_stored": collection.count(),
+            "duplicates_skipped": ingest["duplicates"],
+            "chunk_tokens_avg": round(statistics.mean(chunk_tokens), 1),
+            "split_seconds": round(split_seconds, 3),
+            "ingest_seconds": round(ingest_seconds, 2),
+            "max_hit_distance": round(max(hit_distances), 4) if hit_distances else None,
+        })
+    return name, rows
+
+
+async def run_sweep(args, texts, golden, configs):
+    from utils.chroma_utils import get_chroma_client, get_embeddings_batch
+    from utils.http_client import close_http_client
+
+    client = get_chroma_client(args.chroma_path)
+    try:
+        start = time.perf_counter()
+        query_vectors = await get_embeddings_batch([query for query, _ in golden])
+        embed_seconds = time.perf_counter() - start
+        failed = sum(1 for v in query_vectors if not v)
+        print(f"Embedded {len(golden)} queries in {embed_seconds:.2f}s "
+              f"({embed_seconds / len(golden) * 1000:.1f} ms/query concurrent, {failed} failed)")
+
+        rows = []
+        for index, config in enumerate(configs):
+            name, config_rows = await evaluate_config(index, config, texts, golden, query_vectors,
+                                                      args.top_k, client)
+            rows.extend(config_rows)
+            print_rows(config_rows)
+            if not args.keep:
+                drop_scratch(client, name)
+        return rows
+    finally:
+        await close_http_client()
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def print_rows(rows):
+    for r in rows:
+        print(f"  {r['config']:<22} k={r['top_k']:<2} recall={r['recall']:.3f} mrr={r['mrr']:.3f} "
+              f"ctx_recall={r['context_recall']:.3f} ctx_tokens={r['context_tokens_avg']:7.1f} "
+              f"(p95 {r['context_tokens_p95']}) query p50/p95={r['query_ms_p50']}/{r['query_ms_p95']} ms "
+              f"chunks={r['chunks_stored']} ingest={r['ingest_seconds']}s")
+
+
+def recommend(rows, metric, tolerance):
+    """
+    Fewest context tokens (then fastest) among rows within 'tolerance' of the best 'metric'.
+    """
+    best = max(r[metric] for r in rows)
+    eligible = [r for r in rows if r[metric] >= best - tolerance]
+    return min(eligible, key=lambda r: (r["context_tokens_avg"], r["query_ms_p95"] or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunking/retrieval parameters against a golden set")
+    parser.add_argument("--corpus", nargs="*", default=[], help="Knowledge-base files to index")
+    parser.add_argument("--golden", help="JSON lines golden set {\"query\", \"expected\"}")
+    parser.add_argument("--synthetic", type=int, help="Generate this many incidents and a golden set instead")
+    parser.add_argument("--strategies", default="structure,recursive")
+    parser.add_argument("--max-tokens", default="128,256,512", help="structure: tokens per chunk")
+    parser.add_argument("--overlap-tokens", default="0,32", help="structure: overlap tokens")
+    parser.add_argument("--chunk-sizes", default="1000", help="recursive: characters per chunk")
+    parser.add_argument("--chunk-overlaps", default="200", help="recursive: overlap characters")
+    parser.add_argument("--top-k", default="1,2,3,5")
+    parser.add_argument("--metric", choices=("recall", "context_recall", "mrr"), default="recall",
+                        help="Accuracy metric for the recommendation")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Accuracy loss accepted for fewer context tokens")
+    parser.add_argument("--chroma-path", help="Chroma directory for scratch collections (default EVAL_CHROMA_PATH)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--mock", action="store_true", help="Start mock_ollama.py for embeddings")
+    parser.add_argument("--mock-port", type=int, default=11437)
+    parser.add_argument("--out", help="Write all rows to this .json or .csv file")
+    args = parser.parse_args()
+    args.strategies = parse_list(args.strategies, str)
+    args.max_tokens = parse_list(args.max_tokens, int)
+    args.overlap_tokens = parse_list(args.overlap_tokens, int)
+    args.chunk_sizes = parse_list(args.chunk_sizes, int)
+    args.chunk_overlaps = parse_list(args.chunk_overlaps, int)
+    args.top_k = parse_list(args.top_k, int)
+
+    with ExitStack() as stack:
+        if args.mock:
+            mock_url = f"http://127.0.0.1:{args.mock_port}"
+            os.environ["OLLAMA_URL"] = f"{mock_url}/api/embeddings"  # Read when settings is imported
+            stack.enter_context(start_process(
+                [sys.executable, "mock_ollama.py", "--port", str(args.mock_port)],
+                dict(os.environ), f"{mock_url}/mock/stats"))
+
+        from settings import EVAL_CHROMA_PATH
+
+        args.chroma_path = args.chroma_path or EVAL_CHROMA_PATH
+        if args.synthetic:
+            texts, golden = synthetic_corpus(args.synthetic)
+        elif args.corpus and args.golden:
+            texts, golden = load_corpus(args.corpus), load_golden(args.golden)
+        else:
+            sys.exit("Give --corpus and --golden, or --synthetic N")
+        if not golden:
+            sys.exit("Golden set is empty")
+
+        configs = chunking_configs(args)
+        print(f"{len(golden)} queries, {len(configs)} chunking configurations x top_k {args.top_k}")
+        rows = asyncio.run(run_sweep(args, texts, golden, configs))
+
+    # ------------------------------
+    # Recommendation
+    # ------------------------------
+    choice = recommend(rows, args.metric, args.tolerance)
+    best = max(r[args.metric] for r in rows)
+    print(f"\nBest {args.metric}: {best:.3f}")
+    print(f"Fewest context tokens within {args.tolerance} of it: {choice['config']}, top_k={choice['top_k']} "
+          f"({args.metric}={choice[args.metric]:.3f}, {choice['context_tokens_avg']} context tokens, "
+          f"query p95 {choice['query_ms_p95']} ms)")
+    chunking = {k: choice[k] for k in ("strategy", "max_tokens", "overlap_tokens", "chunk_size", "chunk_overlap")
+                if k in choice}
+    print(f"  CHUNKING_PER_COLLECTION = {{\"<collection>\": {json.dumps(chunking)}}}")
+    print(f"  RETRIEVAL_TOP_K = {choice['top_k']}")
+    if choice["max_hit_distance"] is not None:
+        print(f"  RELEVANCE_MAX_DISTANCE should stay above {choice['max_hit_distance']} "
+              f"(largest distance of a correct top-1 chunk)")
+
+    if args.out:
+        if args.out.endswith(".csv"):
+            fields = list(dict.fromkeys(key for row in rows for key in row))
+            with open(args.out, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
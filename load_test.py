@@ -0,0 +1,401 @@
+# ===========================================
+# 📈 Traffic Replay Load Test
+# ===========================================
+# Replays recorded (or synthesized) /query and /solution-chat requests against
+# the app and ramps the load to find where it saturates:
+#
+# - closed loop: N clients each send their next request as soon as the
+#   previous one returns, for N in --concurrency,
+# - open loop: requests arrive at a fixed rate (Poisson arrivals) for each
+#   rate in --rates, regardless of how fast the app answers.
+#
+# For every level it reports throughput, latency percentiles and errors
+# (429/503 load shedding counted separately), i.e. a throughput-vs-latency
+# curve, plus the saturation point: where more concurrency stops adding
+# throughput (closed loop), or the highest rate still served on time (open loop).
+#
+# With --workers 1,2,4 the script starts `uvicorn app:app --workers N` itself
+# for each count (and, with --mock, the backend stand-in mock_ollama.py), so
+# the `--workers` value in create_env.sh can be chosen from the results.
+# Redis must be running; Chroma uses the local ./chroma_data_db.
+#
+# Request files are JSON lines, either captured requests
+#   {"path": "/query", "body": {"subject": ..., "mailBody": ..., "session_id": ..., "collection_name": ...}}
+# or bare request bodies (path inferred: "user_query" -> /solution-chat, "mailBody" -> /query).
+# Other lines are skipped.
+#
+# Usage:
+#   python load_test.py --url http://127.0.0.1:9003 --replay captured.jsonl
+#   python load_test.py --workers 1,2,4 --mock --synthetic 500 --mode both --out results.json
+#   python load_test.py --url http://127.0.0.1:9003 --mode open --rates 1,2,5,10 --slo-p95 5000
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager, ExitStack
+
+import httpx
+
+WORDS = ("dialer", "campaign", "agent", "queue", "timeout", "database", "lock", "sip",
+         "trunk", "restart", "configuration", "latency", "customer", "ticket", "call",
+         "login", "recording", "report", "crm", "ivr")
+
+
+# ------------------------------
+# Request sources
+# ------------------------------
+def load_requests(path, collection_name=None):
+    """
+    Reads captured requests from a JSON lines file. 'collection_name', if
+    given, replaces the captured collection_name of /query requests.
+    Returns a list of (path, body) tuples and the number of skipped lines.
+    """
+    requests, skipped = [], 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict):
+                skipped += 1
+                continue
+            body = record.get("body", record)
+            route = record.get("path") or ("/solution-chat" if "user_query" in body
+                                           else "/query" if "mailBody" in body else None)
+            if route not in ("/query", "/solution-chat"):
+                skipped += 1
+                continue
+            if collection_name and route == "/query":
+                body = {**body, "collection_name": collection_name}
+            requests.append((route, body))
+    return requests, skipped
+
+
+def synthesize(count, query_share, collection_name, seed=0):
+    """
+    Builds 'count' synthetic requests; 'query_share' of them go to /query.
+    """
+    rng = random.Random(seed)
+
+    def sentence(low, high):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+    requests = []
+    for i in range(count):
+        if rng.random() < query_share:
+            requests.append(("/query", {
+                "subject": sentence(3, 8),
+                "mailBody": "\n".join(sentence(8, 25) + "." for _ in range(rng.randint(1, 6))),
+                "session_id": f"loadtest-{i}",
+                "collection_name": collection_name,
+            }))
+        else:
+            requests.append(("/solution-chat", {
+                "user_query": sentence(5, 20) + "?",
+                "session_id": f"loadtest-{i}",
+            }))
+    return requests
+
+
+# ------------------------------
+# Load generation
+# ------------------------------
+class Recorder:
+    """
+    Collects outcomes of one load level.
+    """
+
+    def __init__(self):
+        self.latencies = []  # seconds, successful requests only
+        self.ok = 0
+        self.shed = 0
+        self.errors = 0
+
+    def record(self, status, seconds):
+        if status is not None and status < 400:
+            self.ok += 1
+            self.latencies.append(seconds)
+        elif status in (429, 503):
+            self.shed += 1
+        else:
+            self.errors += 1
+
+
+async def send(client, base_url, request, recorder, fresh_sessions, counter):
+    route, body = request
+    if fresh_sessions and "session_id" in body:
+        body = {**body, "session_id": f"{body['session_id']}-{next(counter)}"}
+    start = time.perf_counter()
+    try:
+        response = await client.post(base_url + route, json=body)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    recorder.record(status, time.perf_counter() - start)
+
+
+async def closed_loop(client, args, requests, concurrency):
+    """
+    'concurrency' clients send back-to-back requests for args.duration seconds.
+    """
+    recorder, source, counter = Recorder(), itertools.cycle(requests), itertools.count()
+    stop_at = time.perf_counter() + args.duration
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            await send(client, args.url, next(source), recorder, args.fresh_sessions, counter)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder, time.perf_counter() - start
+
+
+async def open_loop(client, args, requests, rate):
+    """
+    Starts requests at 'rate' per second (Poisson arrivals) for args.duration
+    seconds, independent of response times, then waits for all of them.
+    """
+    recorder, source, counter = Recorder(), itertools.cycle(requests), itertools.count()
+    rng = random.Random(1)
+    tasks = []
+    start = time.perf_counter()
+    next_at = start
+    while next_at < start + args.duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(
+            send(client, args.url, next(source), recorder, args.fresh_sessions, counter)))
+        next_at += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return recorder, time.perf_counter() - start
+
+
+def summarize(recorder, elapsed, level, offered_rate=None):
+    """
+    One point of the throughput-vs-latency curve.
+    """
+    latencies = sorted(recorder.latencies)
+    total = recorder.ok + recorder.shed + recorder.errors
+
+    def pct(p):
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1) if latencies else None
+
+    return {
+        "level": level,
+        "offered_rps": offered_rate,
+        "throughput_rps": round(recorder.ok / elapsed, 3),
+        "requests": total,
+        "ok": recorder.ok,
+        "shed": recorder.shed,
+        "errors": recorder.errors,
+        "error_rate": round((recorder.shed + recorder.errors) / total, 4) if total else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+def closed_loop_saturation(points, knee):
+    """
+    Last concurrency level before added concurrency stops adding at least
+    'knee' (e.g. 10%) throughput.
+    """
+    best = points[0]
+    for point in points[1:]:
+        if point["throughput_rps"] < best["throughput_rps"] * (1 + knee):
+            break
+        best = point
+    return best
+
+
+def open_loop_saturation(points, slo_p95):
+    """
+    Highest offered rate that was served (>= 95% throughput, < 1% errors,
+    p95 within the SLO if one is given).
+    """
+    best = None
+    for point in points:
+        served = point["throughput_rps"] >= 0.95 * point["offered_rps"] and point["error_rate"] < 0.01
+        on_time = slo_p95 is None or (point["p95_ms"] is not None and point["p95_ms"] <= slo_p95)
+        if served and on_time:
+            best = point
+    return best
+
+
+def print_curve(title, points, level_name):
+    print(f"\n  {title}")
+    print(f"  {level_name:>11} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'shed':>6} {'err':>6}")
+    for p in points:
+        print(f"  {p['level']:>11} {p['throughput_rps']:>8.2f} {p['p50_ms'] or '-':>9} "
+              f"{p['p95_ms'] or '-':>9} {p['p99_ms'] or '-':>9} {p['shed']:>6} {p['errors']:>6}")
+
+
+async def run_ramp(args, requests, label):
+    """
+    Runs the configured closed/open loop ramps against args.url.
+    """
+    limits = httpx.Limits(max_connections=max(args.concurrency + [1]) + 50)
+    result = {"workers": label}
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.mode in ("closed", "both"):
+            points = []
+            for concurrency in args.concurrency:
+                recorder, elapsed = await closed_loop(client, args, requests, concurrency)
+                points.append(summarize(recorder, elapsed, concurrency))
+            result["closed_loop"] = points
+            result["closed_loop_saturation"] = closed_loop_saturation(points, args.knee)
+            print_curve(f"closed loop, workers={label}", points, "concurrency")
+
+        if args.mode in ("open", "both"):
+            points = []
+            for rate in args.rates:
+                recorder, elapsed = await open_loop(client, args, requests, rate)
+                points.append(summarize(recorder, elapsed, rate, offered_rate=rate))
+            result["open_loop"] = points
+            result["open_loop_saturation"] = open_loop_saturation(points, args.slo_p95)
+            print_curve(f"open loop, workers={label}", points, "offered rps")
+    return result
+
+
+# ------------------------------
+# Process management
+# ------------------------------
+@contextmanager
+def start_process(command, env, ready_url, timeout=120):
+    """
+    Starts a background process and waits until 'ready_url' answers.
+    """
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited with code {process.returncode}")
+            try:
+                if httpx.get(ready_url, timeout=2).status_code < 500:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError(f"{ready_url} not ready after {timeout}s")
+            time.sleep(0.5)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay /query and /solution-chat traffic with a load ramp")
+    parser.add_argument("--url", default="http://127.0.0.1:9003", help="App base URL")
+    parser.add_argument("--replay", help="JSON lines file with captured requests")
+    parser.add_argument("--synthetic", type=int, default=200, help="Synthetic requests if no --replay")
+    parser.add_argument("--query-share", type=float, default=0.7, help="Share of /query in synthetic traffic")
+    parser.add_argument("--collection",
+                        help="collection_name for /query (replay: overrides the captured one; "
+                             "synthetic: defaults to auto_ticket_creation)")
+    parser.add_argument("--mode", choices=("closed", "open", "both"), default="closed")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Closed-loop levels")
+    parser.add_argument("--rates", default="0.5,1,2,4,8", help="Open-loop request rates (per second)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=180, help="Per-request timeout")
+    parser.add_argument("--knee", type=float, default=0.10,
+                        help="Closed loop saturates when throughput gains less than this")
+    parser.add_argument("--slo-p95", type=float, help="p95 latency objective (ms) for the open loop")
+    parser.add_argument("--fresh-sessions", action="store_true",
+                        help="Give every request its own session_id (no Redis history growth)")
+    parser.add_argument("--workers", help="Start the app with each of these worker counts, e.g. 1,2,4")
+    parser.add_argument("--port", type=int, default=9103, help="Port for apps started by --workers")
+    parser.add_argument("--mock", action="store_true", help="Start mock_ollama.py and point the app at it")
+    parser.add_argument("--mock-port", type=int, default=11435)
+    parser.add_argument("--out", help="Write all curves to this .json or .csv file")
+    args = parser.parse_args()
+    args.concurrency = parse_list(args.concurrency, int)
+    args.rates = parse_list(args.rates, float)
+
+    if args.replay:
+        requests, skipped = load_requests(args.replay, args.collection)
+        print(f"Loaded {len(requests)} requests from {args.replay} ({skipped} lines skipped)")
+    else:
+        requests = synthesize(args.synthetic, args.query_share, args.collection or "auto_ticket_creation")
+        print(f"Synthesized {len(requests)} requests")
+    if not requests:
+        sys.exit("No requests to replay")
+
+    results = []
+    if not args.workers:
+        results.append(asyncio.run(run_ramp(args, requests, "external")))
+    else:
+        env = dict(os.environ)
+        with ExitStack() as stack:
+            if args.mock:
+                mock_url = f"http://127.0.0.1:{args.mock_port}"
+                env.update({"BITNET_URL": f"{mock_url}/api/chat", "OLLAMA_URL": f"{mock_url}/api/embeddings",
+                            "GROQ_BASE_URL": mock_url, "GROQ_API_KEY": env.get("GROQ_API_KEY") or "test"})
+                stack.enter_context(start_process(
+                    [sys.executable, "mock_ollama.py", "--port", str(args.mock_port)],
+                    env, f"{mock_url}/mock/stats"))
+            args.url = f"http://127.0.0.1:{args.port}"
+            for workers in parse_list(args.workers, int):
+                command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+                           "--port", str(args.port), "--workers", str(workers)]
+                with start_process(command, env, f"{args.url}/metrics/admission"):
+                    results.append(asyncio.run(run_ramp(args, requests, workers)))
+
+    # ------------------------------
+    # Saturation summary
+    # ------------------------------
+    print("\nSaturation points")
+    for result in results:
+        for key in ("closed_loop_saturation", "open_loop_saturation"):
+            if key in result:
+                point = result[key]
+                text = (f"{point['throughput_rps']:.2f} rps at {point['level']} "
+                        f"(p95 {point['p95_ms']} ms)") if point else "none (already saturated)"
+                print(f"  workers={result['workers']:<9} {key.split('_saturation')[0]:<12} {text}")
+
+    saturated = [r for r in results if r.get("closed_loop_saturation")]
+    if len(saturated) > 1:
+        best = max(r["closed_loop_saturation"]["throughput_rps"] for r in saturated)
+        enough = next(r for r in saturated if r["closed_loop_saturation"]["throughput_rps"] >= 0.95 * best)
+        print(f"\n  Smallest worker count within 5% of the best closed-loop throughput: {enough['workers']}")
+
+    if args.out:
+        if args.out.endswith(".csv"):
+            with open(args.out, "w", newline="", encoding="utf-8") as f:
+                writer = None
+                for result in results:
+                    for loop in ("closed_loop", "open_loop"):
+                        for point in result.get(loop, []):
+                            row = {"workers": result["workers"], "loop": loop, **point}
+                            if writer is None:
+                                writer = csv.DictWriter(f, fieldnames=list(row))
+                                writer.writeheader()
+                            writer.writerow(row)
+        else:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# ===========================================
+# 🧪 Local Stand-in for the Ollama Server
+# ===========================================
+# A small FastAPI app that answers /api/chat and /api/embeddings like Ollama
+# does (and Groq's /openai/v1/chat/completions), so prompt layouts, payload options and load tests can be measured on
+# a laptop without a GPU. It simulates the costs that matter for us:
+#
+# - model load: the first request, a request after 'keep_alive' expired, or a
+#   request with a different num_ctx loads the model (--load-seconds),
+# - prompt evaluation: only tokens after the longest prefix cached in one of
+#   the --parallel slots are evaluated (--prompt-rate tokens per second),
+# - generation: --eval-tokens tokens at --eval-rate tokens per second,
+# - truncation: prompts longer than num_ctx are counted as truncated,
+# - malformed answers: without a "format" schema, --malformed-rate of the
+#   answers are broken JSON (code fences, trailing commas, cut off).
+#
+# Timings are reported in the same fields as Ollama (nanoseconds):
+# load_duration, prompt_eval_count, prompt_eval_duration, eval_count,
+# eval_duration, total_duration.
+#
+# Usage:
+#   python mock_ollama.py --port 11435
+#   python mock_ollama.py --port 11435 --default-keep-alive 2s --load-seconds 1
+#
+# Then point the app at it (environment variables) or run bench_prompt_eval.py:
+#   BITNET_URL=http://127.0.0.1:11435/api/chat
+#   OLLAMA_URL=http://127.0.0.1:11435/api/embeddings
+#   GROQ_BASE_URL=http://127.0.0.1:11435 GROQ_API_KEY=test
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+
+from fastapi import FastAPI, Request
+
+_TOKEN = re.compile(r"\w{1,8}|[^\w\s]")
+_DURATION = re.compile(r"^(-?\d+(?:\.\d+)?)(ms|s|m|h)?$")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+app = FastAPI(title="Ollama stand-in")
+config = argparse.Namespace(
+    load_seconds=2.0, prompt_rate=400.0, eval_rate=40.0, eval_tokens=24, parallel=4,
+    default_keep_alive="5m", default_num_ctx=2048, embedding_dim=768, malformed_rate=0.0
+)
+
+
+def parse_keep_alive(value):
+    """
+    Seconds a model stays loaded for an Ollama keep_alive value (None = forever).
+    """
+    if value is None:
+        value = config.default_keep_alive
+    match = _DURATION.match(str(value).strip())
+    if not match:
+        return parse_keep_alive(config.default_keep_alive)
+    seconds = float(match.group(1)) * _UNITS[match.group(2)]
+    return None if seconds < 0 else seconds
+
+
+def render_prompt(messages):
+    """
+    Renders chat messages like a Mistral-style template (system text first).
+    """
+    system = "\n\n".join(m["content"] for m in messages if m.get("role") == "system")
+    turns = [m["content"] for m in messages if m.get("role") != "system"]
+    return "[INST] " + (system + "\n\n" if system else "") + "\n".join(turns) + " [/INST]"
+
+
+class ModelState:
+    """
+    Load state and prompt-cache slots of one model.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.expires_at = None
+        self.num_ctx = None
+        self.slots = []  # cached token lists, most recently used last
+        self.lock = asyncio.Lock()
+        self.semaphore = asyncio.Semaphore(config.parallel)
+        self.counters = {"requests": 0, "loads": 0, "prompt_tokens": 0,
+                         "cached_tokens": 0, "truncated": 0}
+
+    def expired(self, now):
+        return not self.loaded or (self.expires_at is not None and now >= self.expires_at)
+
+    def take_slot(self, tokens):
+        """
+        Returns how many leading tokens are cached in the best slot and
+        stores 'tokens' in that slot.
+        """
+        best, best_len = None, 0
+        for index, cached in enumerate(self.slots):
+            common = 0
+            for a, b in zip(cached, tokens):
+                if a != b:
+                    break
+                common += 1
+            if common > best_len:
+                best, best_len = index, common
+        if best is not None:
+            self.slots.pop(best)
+        elif len(self.slots) >= config.parallel:
+            self.slots.pop(0)
+        self.slots.append(tokens)
+        return best_len
+
+
+models = {}
+
+
+def get_model(name):
+    if name not in models:
+        models[name] = ModelState()
+    return models[name]
+
+
+async def ensure_loaded(model, num_ctx, keep_alive):
+    """
+    Loads (or reloads) the model if needed and returns the load time in seconds.
+    """
+    async with model.lock:
+        now = time.time()
+        load_seconds = 0.0
+        if model.expired(now) or model.num_ctx != num_ctx:
+            await asyncio.sleep(config.load_seconds)
+            load_seconds = config.load_seconds
+            model.loaded, model.num_ctx, model.slots = True, num_ctx, []
+            model.counters["loads"] += 1
+        seconds = parse_keep_alive(keep_alive)
+        model.expires_at = None if seconds is None else time.time() + seconds
+        return load_seconds
+
+
+def fake_answer(messages, constrained):
+    question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    words = " ".join(question.split()[-12:])
+    answer = json.dumps({
+        "solution": f"Checked the reported issue ({words}) and restarted the affected service.",
+        "Disposition": "Dialer Issue",
+        "Sub Disposition": "Rule Based Dialing Issue",
+        "Priority": "Semi Critical",
+    }, indent=2)
+    if constrained or random.random() >= config.malformed_rate:
+        return answer
+    breakage = random.choice(("fence", "comma", "cut"))
+    if breakage == "fence":
+        return "Here is the JSON:\n```json\n" + answer + "\n```"
+    if breakage == "comma":
+        return answer[:-2] + ",\n}"
+    return answer[:len(answer) // 2]
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    started = time.perf_counter()
+    model = get_model(body.get("model", "default"))
+    options = body.get("options") or {}
+    num_ctx = int(options.get("num_ctx", config.default_num_ctx))
+    messages = body.get("messages") or []
+    load_seconds = await ensure_loaded(model, num_ctx, body.get("keep_alive"))
+
+    if not messages:  # Load-only request
+        return {"model": body.get("model"), "done": True, "done_reason": "load",
+                "load_duration": int(load_seconds * 1e9)}
+
+    async with model.semaphore:
+        tokens = _TOKEN.findall(render_prompt(messages))
+        truncated = len(tokens) > num_ctx
+        if truncated:
+            tokens = tokens[-num_ctx:]  # Ollama keeps the end of the prompt
+            model.counters["truncated"] += 1
+        cached = model.take_slot(tokens)
+        evaluated = len(tokens) - cached
+        prompt_seconds = evaluated / config.prompt_rate
+        eval_tokens = min(int(options.get("num_predict", config.eval_tokens)), config.eval_tokens)
+        eval_seconds = eval_tokens / config.eval_rate
+        await asyncio.sleep(prompt_seconds + eval_seconds)
+
+    model.counters["requests"] += 1
+    model.counters["prompt_tokens"] += evaluated
+    model.counters["cached_tokens"] += cached
+    return {
+        "model": body.get("model"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": fake_answer(messages, bool(body.get("format")))},
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": int((time.perf_counter() - started) * 1e9),
+        "load_duration": int(load_seconds * 1e9),
+        "prompt_eval_count": evaluated,
+        "prompt_eval_duration": int(prompt_seconds * 1e9),
+        "eval_count": eval_tokens,
+        "eval_duration": int(eval_seconds * 1e9),
+        "mock_cached_tokens": cached,
+        "mock_truncated": truncated,
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def groq_chat(request: Request):
+    """
+    Groq (OpenAI-compatible) chat completion with the same simulated costs.
+    """
+    body = await request.json()
+    model = get_model(body.get("model", "groq"))
+    messages = body.get("messages") or []
+    model.loaded = True  # Hosted model: never loads or expires
+
+    async with model.semaphore:
+        tokens = _TOKEN.findall(render_prompt(messages))
+        cached = model.take_slot(tokens)
+        evaluated = len(tokens) - cached
+        await asyncio.sleep(evaluated / config.prompt_rate + config.eval_tokens / config.eval_rate)
+
+    model.counters["requests"] += 1
+    model.counters["prompt_tokens"] += evaluated
+    model.counters["cached_tokens"] += cached
+    question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    content = json.dumps({"solution": "Restarted the affected service: " + " ".join(question.split()[-12:])})
+    return {
+        "id": f"chatcmpl-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(tokens), "completion_tokens": config.eval_tokens,
+                  "total_tokens": len(tokens) + config.eval_tokens},
+    }
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    """
+    Deterministic bag-of-words vector, so similar texts get similar vectors.
+    """
+    body = await request.json()
+    vector = [0.0] * config.embedding_dim
+    for word in re.findall(r"\w+", body.get("prompt", "").lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % config.embedding_dim] += 1.0 if h & 1 else -1.0
+    return {"embedding": vector}
+
+
+@app.get("/mock/stats")
+async def stats():
+    return {name: {**m.counters, "loaded": not m.expired(time.time()), "num_ctx": m.num_ctx}
+            for name, m in models.items()}
+
+
+@app.post("/mock/reset")
+async def reset():
+    """
+    Unloads all models and clears the prompt caches.
+    """
+    models.clear()
+    return {"status": "reset"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama chat/embedding API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--load-seconds", type=float, default=config.load_seconds,
+                        help="Time to load the model")
+    parser.add_argument("--prompt-rate", type=float, default=config.prompt_rate,
+                        help="Prompt tokens evaluated per second")
+    parser.add_argument("--eval-rate", type=float, default=config.eval_rate,
+                        help="Generated tokens per second")
+    parser.add_argument("--eval-tokens", type=int, default=config.eval_tokens,
+                        help="Tokens generated per answer")
+    parser.add_argument("--parallel", type=int, default=config.parallel,
+                        help="Concurrent requests / prompt-cache slots per model")
+    parser.add_argument("--default-keep-alive", default=config.default_keep_alive,
+                        help="keep_alive used when a request sends none (Ollama: 5m)")
+    parser.add_argument("--default-num-ctx", type=int, default=config.default_num_ctx,
+                        help="num_ctx used when a request sends none")
+    parser.add_argument("--malformed-rate", type=float, default=config.malformed_rate,
+                        help="Share of broken JSON answers when no format schema is sent")
+    args = parser.parse_args()
+
+    for key, value in vars(args).items():
+        setattr(config, key, value)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,455 @@
-# ==========================
-# 🔧 Configuration Settings
-# ==========================
-# This file centralizes all environment variables and service configurations
-# required to run the Auto Create Ticket application.
-# It includes API endpoints, model names, ports, logging, Redis settings, and AI credentials.
-
-
-# --------------------------
-# Hugging Face / Ollama APIs
-# --------------------------
-# Used for generating **text embeddings**, which are numerical vector representations of text.
-# Embeddings enable semantic similarity searches, useful for retrieving relevant documents.
-
-# ✅ OLLAMA_URL:
-# Endpoint for the Ollama server that generates embeddings.
-# The application sends POST requests with text and receives vector embeddings in response.
-OLLAMA_URL = "https://api-embeddings-ollama.c-zentrix.com/api/embeddings"
-
-# ✅ OLLAMA_MODEL_NAME:
-# Specific embedding model deployed on Ollama.
-# Ensure this model is active at the endpoint. Different models may produce slightly different embeddings.
-OLLAMA_MODEL_NAME = "nomic-embed-text:v1.5"
-
-
-# --------------------------
-# BitNet Retriever API
-# --------------------------
-# Used for generating **human-like responses** based on retrieved documents from ChromaDB.
-# Essentially, this is the LLM endpoint for answering user queries.
-
-# ✅ BITNET_URL:
-# Endpoint for the chat or LLM service.
-# The app sends context and user queries here to generate responses.
-BITNET_URL = "https://api-embeddings-ollama.c-zentrix.com/api/chat"
-
-# ✅ BITNET_MODEL_NAME:
-# Name of the LLM used for generating responses.
-# Must match a deployed model at the chat endpoint (e.g., Mistral latest version).
-BITNET_MODEL_NAME = "mistral:latest"
-
-
-# --------------------------
-# FastAPI Service Settings
-# --------------------------
-# Settings for running the FastAPI server.
-
-# ✅ PORT:
-# Port on which the FastAPI application will run.
-# Default is 9003; change only if another service uses this port.
-PORT = 9003
-
-
-# --------------------------
-# Logging Configuration
-# --------------------------
-# Determines where logs are stored and their file naming.
-
-# ✅ LOG_DIR:
-# Directory to save application logs.
-# Must exist and be writable by the FastAPI service.
-LOG_DIR = "/var/log/czentrix/"
-
-# ✅ LOG_FILENAME:
-# Name of the log file for the FastAPI application.
-# Useful for debugging, monitoring, and auditing application behavior.
-LOG_FILENAME = "auto_create_ticket.log"
-
-
-# --------------------------
-# Redis Configuration
-# --------------------------
-# Redis is used for storing session-based chat history and optional caching.
-
-# ✅ REDIS_URL:
-# URL for connecting to the Redis server.
-# Format: redis://<host>:<port>
-# The application uses this to persist chat sessions and maintain state between requests.
-REDIS_URL = "redis://127.0.0.1:6379"
-
-
-# --------------------------
-# Systemd Service Name
-# --------------------------
-# Name of the systemd service for managing the app as a background service.
-
-# ✅ SERVICE_FILE:
-# Name of the service file for systemd.
-# Commands you can run:
-#   systemctl status auto-create-ticket   # Check status
-#   systemctl start auto-create-ticket    # Start service
-#   systemctl restart auto-create-ticket  # Restart service
-SERVICE_FILE = "auto-create-ticket"
-
-
-# --------------------------
-# Groq API Settings
-# --------------------------
-# Used to authenticate and configure access to Groq AI services.
-
-# ✅ GROQ_API_KEY:
-# API key for authenticating requests to Groq.
-# Keep this key secure, as it grants access to the AI model.
-GROQ_API_KEY = ""
-
-# ✅ GROQ_MODEL:
-# Specific Groq model to use for generating AI responses.
-# Example: LLaMA 3.1 8B Instant for fast, interactive responses.
-GROQ_MODEL = "llama-3.1-8b-instant"
+# ==========================
+# 🔧 Configuration Settings
+# ==========================
+# This file centralizes all environment variables and service configurations
+# required to run the Auto Create Ticket application.
+# It includes API endpoints, model names, ports, logging, Redis settings, and AI credentials.
+
+import os
+
+
+# --------------------------
+# Hugging Face / Ollama APIs
+# --------------------------
+# Used for generating **text embeddings**, which are numerical vector representations of text.
+# Embeddings enable semantic similarity searches, useful for retrieving relevant documents.
+
+# ✅ OLLAMA_URL:
+# Endpoint for the Ollama server that generates embeddings.
+# The application sends POST requests with text and receives vector embeddings in response.
+# Can be overridden with the OLLAMA_URL environment variable (e.g. to use mock_ollama.py).
+OLLAMA_URL = os.getenv("OLLAMA_URL", "https://api-embeddings-ollama.c-zentrix.com/api/embeddings")
+
+# ✅ OLLAMA_MODEL_NAME:
+# Specific embedding model deployed on Ollama.
+# Ensure this model is active at the endpoint. Different models may produce slightly different embeddings.
+OLLAMA_MODEL_NAME = "nomic-embed-text:v1.5"
+
+
+# --------------------------
+# BitNet Retriever API
+# --------------------------
+# Used for generating **human-like responses** based on retrieved documents from ChromaDB.
+# Essentially, this is the LLM endpoint for answering user queries.
+
+# ✅ BITNET_URL:
+# Endpoint for the chat or LLM service.
+# The app sends context and user queries here to generate responses.
+# Can be overridden with the BITNET_URL environment variable (e.g. to use mock_ollama.py).
+BITNET_URL = os.getenv("BITNET_URL", "https://api-embeddings-ollama.c-zentrix.com/api/chat")
+
+# ✅ BITNET_MODEL_NAME:
+# Name of the LLM used for generating responses.
+# Must match a deployed model at the chat endpoint (e.g., Mistral latest version).
+BITNET_MODEL_NAME = "mistral:latest"
+
+# ✅ BITNET_TIMEOUT:
+# Maximum seconds to wait for one chat response (capped further by the client's deadline).
+BITNET_TIMEOUT = 120
+
+# ✅ BITNET_KEEP_ALIVE:
+# How long the chat backend keeps the model loaded after a request
+# (Ollama duration string, e.g. "30m"; "-1" keeps it loaded until the server restarts).
+# Ollama's default of 5 minutes unloads the model between bursts of tickets.
+BITNET_KEEP_ALIVE = "30m"
+
+# ✅ BITNET_OPTIONS:
+# Default Ollama "options" sent with every chat request (e.g. {"temperature": 0}).
+BITNET_OPTIONS = {}
+
+# ✅ BITNET_NUM_CTX_BUCKETS:
+# Context window sizes (num_ctx) to choose from. Each request uses the smallest
+# one that fits its prompt plus BITNET_RESPONSE_TOKENS. Ollama reloads the model
+# whenever num_ctx changes, so keep this list short.
+BITNET_NUM_CTX_BUCKETS = [4096, 8192]
+
+# ✅ BITNET_RESPONSE_TOKENS:
+# Tokens reserved for the answer when sizing num_ctx.
+BITNET_RESPONSE_TOKENS = 1024
+
+# ✅ BITNET_ALLOWED_OPTIONS:
+# Option names a client may override per request via "llm_options" in the body.
+# "keep_alive" is always allowed.
+BITNET_ALLOWED_OPTIONS = ["num_ctx", "num_predict", "temperature", "top_p", "top_k", "seed", "repeat_penalty"]
+
+# ✅ LLM_STRUCTURED_OUTPUT:
+# Constrain answers to the response JSON schema (Ollama "format", needs Ollama >= 0.5)
+# and use JSON mode for Groq. Answers are validated either way.
+LLM_STRUCTURED_OUTPUT = True
+
+
+# --------------------------
+# FastAPI Service Settings
+# --------------------------
+# Settings for running the FastAPI server.
+
+# ✅ PORT:
+# Port on which the FastAPI application will run.
+# Default is 9003; change only if another service uses this port.
+PORT = 9003
+
+
+# --------------------------
+# Logging Configuration
+# --------------------------
+# Determines where logs are stored and their file naming.
+
+# ✅ LOG_DIR:
+# Directory to save application logs.
+# Must exist and be writable by the FastAPI service.
+LOG_DIR = "/var/log/czentrix/"
+
+# ✅ LOG_FILENAME:
+# Name of the log file for the FastAPI application.
+# Useful for debugging, monitoring, and auditing application behavior.
+LOG_FILENAME = "auto_create_ticket.log"
+
+# ✅ LOG_FORMAT:
+# "json" writes one structured JSON object per line (with request_id, session_id
+# and stage timings); "text" keeps the classic human-readable line format.
+LOG_FORMAT = "json"
+
+# ✅ LOG_QUEUE_SIZE:
+# Records waiting for the background log writer. When full, new records are dropped
+# instead of blocking the request.
+LOG_QUEUE_SIZE = 10000
+
+# ✅ LOG_INFO_SAMPLE_RATE:
+# Fraction (0.0 - 1.0) of INFO records that are kept. WARNING and above are always kept.
+LOG_INFO_SAMPLE_RATE = 1.0
+
+# ✅ LOG_EVENT_SAMPLE_RATES:
+# Per-event overrides for high-volume INFO events, keyed by the record's "event" field.
+# Example: {"request_completed": 0.1} keeps 10% of per-request summary lines.
+LOG_EVENT_SAMPLE_RATES = {}
+
+
+# --------------------------
+# Redis Configuration
+# --------------------------
+# Redis is used for storing session-based chat history and optional caching.
+
+# ✅ REDIS_URL:
+# URL for connecting to the Redis server.
+# Format: redis://<host>:<port>
+# The application uses this to persist chat sessions and maintain state between requests.
+REDIS_URL = "redis://127.0.0.1:6379"
+
+
+# --------------------------
+# Systemd Service Name
+# --------------------------
+# Name of the systemd service for managing the app as a background service.
+
+# ✅ SERVICE_FILE:
+# Name of the service file for systemd.
+# Commands you can run:
+#   systemctl status auto-create-ticket   # Check status
+#   systemctl start auto-create-ticket    # Start service
+#   systemctl restart auto-create-ticket  # Restart service
+SERVICE_FILE = "auto-create-ticket"
+
+
+# --------------------------
+# Groq API Settings
+# --------------------------
+# Used to authenticate and configure access to Groq AI services.
+
+# ✅ GROQ_API_KEY:
+# API key for authenticating requests to Groq.
+# Keep this key secure, as it grants access to the AI model.
+GROQ_API_KEY = ""
+
+# ✅ GROQ_MODEL:
+# Specific Groq model to use for generating AI responses.
+# Example: LLaMA 3.1 8B Instant for fast, interactive responses.
+GROQ_MODEL = "llama-3.1-8b-instant"
+
+# ✅ GROQ_TIMEOUT:
+# Maximum seconds to wait for one Groq response (capped further by the client's deadline).
+GROQ_TIMEOUT = 60
+
+
+# --------------------------
+# Startup Warm-up
+# --------------------------
+# Each worker prepares itself at startup so the first real request is not the cold one.
+
+# ✅ WARMUP_COLLECTIONS:
+# Collections opened (and their vector index loaded) when a worker starts.
+# "auto_ticket_creation" is the collection used by /solution-chat on every request.
+WARMUP_COLLECTIONS = ["auto_ticket_creation"]
+
+# ✅ WARMUP_PROBE_QUERY:
+# Optional text embedded once at startup and queried against each warm-up collection.
+# Warms the embedding connection and the collection index. Set to "" to disable.
+WARMUP_PROBE_QUERY = "incident report"
+
+# ✅ WARMUP_CHAT_MODEL:
+# Send one short chat request at startup so the chat model is loaded (with
+# BITNET_KEEP_ALIVE) and the system prompt prefix is cached before the first ticket.
+WARMUP_CHAT_MODEL = True
+
+
+# --------------------------
+# In-memory Vector Mirror
+# --------------------------
+# Optional read path that serves hot collections from a memory-mapped matrix
+# instead of querying ChromaDB's persistence layer on every request.
+
+# ✅ VECTOR_MIRROR_COLLECTIONS:
+# Collections answered from the mirror. Empty list disables the feature.
+# Example: ["auto_ticket_creation"]
+VECTOR_MIRROR_COLLECTIONS = []
+
+# ✅ VECTOR_MIRROR_DIR:
+# Directory holding the mirror files. Shared by all workers on the host.
+VECTOR_MIRROR_DIR = "./vector_mirror"
+
+# ✅ VECTOR_MIRROR_DTYPE:
+# Storage type of the mirrored embeddings:
+#   "float32" - exact, 4 bytes per dimension
+#   "float16" - half the memory, negligible recall loss
+#   "int8"    - a quarter of the memory scanned per query; candidates are rescored against a
+#               float16 copy on disk (only the candidate rows are read)
+VECTOR_MIRROR_DTYPE = "float32"
+
+# ✅ VECTOR_MIRROR_RESCORE_FACTOR:
+# For int8 mirrors, top_k * factor candidates are rescored with the float16 copy.
+VECTOR_MIRROR_RESCORE_FACTOR = 4
+
+# ✅ VECTOR_MIRROR_MAX_SEGMENTS / VECTOR_MIRROR_MAX_DEAD_FRACTION:
+# Uploads are appended to the mirror as small segments and replaced rows are only
+# marked dead. Past this many segments, or this share of dead rows, the live rows
+# are merged into one segment.
+VECTOR_MIRROR_MAX_SEGMENTS = 8
+VECTOR_MIRROR_MAX_DEAD_FRACTION = 0.2
+
+
+# --------------------------
+# Collection Maintenance
+# --------------------------
+# Used by collection_admin.py (compaction and storage reports).
+
+# ✅ COMPACTION_BATCH_SIZE:
+# Number of entries copied per batch when a collection is rebuilt by compaction.
+COMPACTION_BATCH_SIZE = 1000
+
+
+# --------------------------
+# Collection Cache (multi-tenant)
+# --------------------------
+# Each tenant has its own collection. Open collection handles are kept in an LRU
+# cache per worker.
+
+# ✅ COLLECTION_CACHE_SIZE:
+# Collection handles a worker keeps open before the least recently used one is dropped.
+# This does not bound Chroma's index memory (see utils/collection_manager.py).
+COLLECTION_CACHE_SIZE = 64
+
+# ✅ COLLECTION_USAGE_STATS_FILE:
+# JSON file with request counts per collection, shared by all workers.
+# Used to preload the busiest collections at startup.
+COLLECTION_USAGE_STATS_FILE = "./collection_usage.json"
+
+# ✅ COLLECTION_PRELOAD_LIMIT:
+# Maximum number of collections preloaded from usage statistics at startup.
+COLLECTION_PRELOAD_LIMIT = 10
+
+# ✅ COLLECTION_STATS_FLUSH_EVERY:
+# Collection accesses between writes of the usage statistics file.
+COLLECTION_STATS_FLUSH_EVERY = 100
+
+
+# --------------------------
+# Chunking
+# --------------------------
+# Controls how uploaded text is split into chunks before embedding.
+
+# ✅ CHUNKING_DEFAULTS:
+# strategy:          "structure" splits at incident ("---") and section headers ("Main Issue:", ...)
+#                    into token-sized chunks; "recursive" is the previous character splitter.
+# max_tokens:        Approximate embedding tokens per chunk ("structure" only).
+# overlap_tokens:    Trailing tokens repeated in the next chunk of the same incident.
+# respect_incidents: Never merge text across "---" incident boundaries.
+# chunk_size / chunk_overlap: Characters per chunk / overlap ("recursive" only).
+CHUNKING_DEFAULTS = {
+    "strategy": "structure",
+    "max_tokens": 256,
+    "overlap_tokens": 32,
+    "respect_incidents": True,
+    "chunk_size": 1000,
+    "chunk_overlap": 200,
+}
+
+# ✅ CHUNKING_PER_COLLECTION:
+# Per-collection overrides of CHUNKING_DEFAULTS.
+# Example: {"auto_ticket_creation": {"max_tokens": 512}}
+CHUNKING_PER_COLLECTION = {}
+
+
+# --------------------------
+# Near-duplicate Detection
+# --------------------------
+# Chunks that are near-identical to chunks already stored (shared templates,
+# escalation matrices, signatures) are skipped before embedding. Whole chunks
+# are compared; boilerplate that shares a chunk with other text is embedded.
+
+# ✅ DEDUP_ENABLED:
+# Turn near-duplicate detection at ingest on or off.
+DEDUP_ENABLED = True
+
+# ✅ DEDUP_INDEX_DIR:
+# Directory holding the persistent MinHash index of each collection.
+DEDUP_INDEX_DIR = "./dedup_index"
+
+# ✅ DEDUP_THRESHOLD:
+# Estimated Jaccard similarity (0.0 - 1.0) of word shingles above which a chunk is a duplicate.
+DEDUP_THRESHOLD = 0.85
+
+# ✅ DEDUP_NUM_PERM / DEDUP_BANDS:
+# MinHash signature length and number of LSH bands (DEDUP_NUM_PERM must be divisible by DEDUP_BANDS).
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 8
+
+# ✅ DEDUP_SHINGLE_SIZE:
+# Number of consecutive words per shingle.
+DEDUP_SHINGLE_SIZE = 5
+
+
+# --------------------------
+# Admission Control
+# --------------------------
+# Concurrency limits with a bounded wait queue for endpoints and LLM backends.
+# Requests beyond the queue get 429, requests that wait too long get 503 (both with Retry-After).
+# Limits apply per worker process.
+
+# ✅ ADMISSION_LIMITS:
+# Keys are endpoint paths or backend names ("ollama_chat", "groq").
+ADMISSION_LIMITS = {
+    "/query": {"max_concurrency": 32, "max_queue": 64},
+    "/query-batch": {"max_concurrency": 2, "max_queue": 4},
+    "/solution-chat": {"max_concurrency": 32, "max_queue": 64},
+    "ollama_chat": {"max_concurrency": 8, "max_queue": 32},
+    "groq": {"max_concurrency": 8, "max_queue": 32},
+}
+
+# ✅ ADMISSION_QUEUE_TIMEOUT:
+# Maximum seconds a request waits for a slot before it is shed with 503.
+ADMISSION_QUEUE_TIMEOUT = 10
+
+# ✅ ADMISSION_RETRY_AFTER:
+# Value (seconds) of the Retry-After header sent with 429/503 responses.
+ADMISSION_RETRY_AFTER = 5
+
+# --------------------------
+# Batch Triage (/query-batch)
+# --------------------------
+# ✅ BATCH_MAX_ITEMS:
+# Maximum number of mails accepted in one /query-batch request.
+BATCH_MAX_ITEMS = 200
+
+# ✅ EMBED_BATCH_SIZE:
+# Number of embedding requests sent to Ollama at the same time.
+EMBED_BATCH_SIZE = 16
+
+# ✅ BATCH_LLM_CONCURRENCY:
+# Maximum LLM calls one batch runs at the same time (the "ollama_chat" admission limit still applies).
+BATCH_LLM_CONCURRENCY = 4
+
+# --------------------------
+# Mail Normalization
+# --------------------------
+# Cleans mail bodies before they are embedded and sent to the LLM (see utils/mail_utils.py).
+
+# ✅ MAIL_NORMALIZATION:
+# - enabled: master switch (False = use the raw subject and body)
+# - strip_html / strip_quoted / strip_signature / strip_disclaimers: individual steps
+# - disclaimer_min_chars: shorter paragraphs are never treated as disclaimers
+# - max_tokens: body is cut after this many estimated tokens (0 = no limit)
+MAIL_NORMALIZATION = {
+    "enabled": True,
+    "strip_html": True,
+    "strip_quoted": True,
+    "strip_signature": True,
+    "strip_disclaimers": True,
+    "disclaimer_min_chars": 80,
+    "max_tokens": 512,
+}
+
+# --------------------------
+# Collection Snapshots
+# --------------------------
+# Portable export/import of collections with their embeddings (see utils/snapshot.py).
+
+# ✅ SNAPSHOT_DIR:
+# Directory for snapshots created and imported through the API (CLI accepts any path).
+SNAPSHOT_DIR = "./snapshots"
+
+# ✅ SNAPSHOT_BATCH_SIZE:
+# Entries read per page on export and upserted per batch on import.
+SNAPSHOT_BATCH_SIZE = 5000
+
+# --------------------------
+# Collection Write Locks
+# --------------------------
+# Writes to one collection are serialized across workers (see utils/collection_lock.py).
+
+# ✅ COLLECTION_LOCK_DIR:
+# Directory for the per-collection lock files (must be shared by all workers on the host).
+COLLECTION_LOCK_DIR = "./collection_locks"
+
+# ✅ COLLECTION_LOCK_TIMEOUT:
+# Seconds an upload waits for another write to the same collection before giving up (503).
+COLLECTION_LOCK_TIMEOUT = 300
+
+# ✅ INGEST_UPSERT_BATCH_SIZE:
+# Chunks written per upsert call during upload.
+INGEST_UPSERT_BATCH_SIZE = 1000
+
+# --------------------------
+# Relevance Short-Circuit
+# --------------------------
+# Answers without an LLM call when retrieval finds nothing relevant, or when a
+# /solution-chat message is only a greeting (see utils/relevance.py).
+
+# ✅ RELEVANCE_MAX_DISTANCE:
+# Retrieved chunks farther than this from the query are dropped; if chunks were
+# retrieved and all of them were dropped, the canned "couldn't find relevant
+# information" answer is returned without an LLM call.
+# Distance is Chroma's (squared L2 for default collections); lower is closer.
+# The distance of every lookup is logged as "retrieval_distance" to help tune it.
+# None = keep every retrieved chunk (always call the LLM, as before).
+RELEVANCE_MAX_DISTANCE = None
+
+# ✅ RELEVANCE_MAX_DISTANCE_PER_COLLECTION:
+# Per-collection thresholds, e.g. {"auto_ticket_creation": 280.0}; overrides the default.
+RELEVANCE_MAX_DISTANCE_PER_COLLECTION = {}
+
+# ✅ SMALL_TALK_ENABLED:
+# Answer /solution-chat greetings ("hi", "hello zeni", ...) with the fixed reply.
+SMALL_TALK_ENABLED = True
+
+# ✅ SMALL_TALK_WORDS:
+# A message made only of these words (at most SMALL_TALK_MAX_WORDS) is small talk.
+# Keep it to real greetings and thanks: words like "good" or "team" also start
+# real questions ("good morning team printer down"), and a bare "test" mail is a
+# probe that should go through retrieval like any other mail.
+SMALL_TALK_WORDS = ["hi", "hii", "hiii", "hello", "helo", "hey", "heyy", "hola",
+                    "zeni", "morning", "afternoon", "evening", "thanks", "thank", "you", "thx"]
+
+# ✅ SMALL_TALK_MAX_WORDS:
+SMALL_TALK_MAX_WORDS = 4
+
+# --------------------------
+# Retrieval
+# --------------------------
+
+# ✅ RETRIEVAL_TOP_K:
+# Chunks retrieved per question by /query, /query-batch and /solution-chat.
+# Use evaluate_retrieval.py to compare values (recall vs prompt tokens).
+RETRIEVAL_TOP_K = 3
+
+# ✅ EVAL_CHROMA_PATH:
+# Separate Chroma database for the scratch collections of evaluate_retrieval.py.
+EVAL_CHROMA_PATH = "./eval_chroma_db"
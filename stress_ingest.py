@@ -0,0 +1,189 @@
+# ===========================================
+# 🔒 Concurrent Ingest Stress Test
+# ===========================================
+# Fires many /upload-pdf calls at once and checks that every collection ends
+# up consistent, i.e. that writes to one collection were serialized:
+#
+# - --uploads uploads per collection, all sent concurrently, each with its own
+#   randomly generated text of the same size (so all produce the same chunk
+#   IDs chunk_0..chunk_n) and a tag "[upload-<c>-<u>]" in every sentence.
+# - Afterwards each collection must hold the chunks of exactly ONE upload
+#   (the last writer), never a mix of chunk_0 from one upload and chunk_1
+#   from another, and every chunk must carry a single tag.
+# - The collection's dedup index must list exactly the collection's IDs,
+#   and its vector mirror (if any) must hold the same IDs.
+#
+# Uploads to different collections are not serialized; the report shows the
+# wall time, so --collections 1 vs 4 with the same total uploads shows the
+# parallelism across collections.
+#
+# With --workers N the script starts `uvicorn app:app --workers N` itself
+# (and, with --mock, mock_ollama.py for embeddings), so uploads really land
+# on different worker processes. Scratch collections "stress_ingest_<c>" and
+# their dedup indexes are deleted afterwards unless --keep is given.
+#
+# Usage:
+#   python stress_ingest.py --workers 4 --mock --collections 3 --uploads 8
+#   python stress_ingest.py --url http://127.0.0.1:9003 --collections 1 --uploads 20 --keep
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import time
+from contextlib import ExitStack
+
+import httpx
+
+from load_test import start_process
+
+_TAG = re.compile(r"\[upload-(\d+)-(\d+)\]")
+_WORDS = ("ticket", "invoice", "login", "password", "network", "printer", "refund", "order",
+          "delivery", "account", "mailbox", "server", "timeout", "license", "update", "backup",
+          "payment", "address", "report", "access", "error", "install", "profile", "queue")
+
+
+def make_document(collection_index, upload_index, sentences, seed):
+    """
+    Random text with the upload's tag in every sentence (no near-duplicates
+    between uploads, so deduplication does not hide a mix-up).
+    """
+    rng = random.Random(seed)
+    tag = f"[upload-{collection_index}-{upload_index}]"
+    lines = []
+    for s in range(sentences):
+        words = " ".join(rng.choice(_WORDS) for _ in range(14))
+        lines.append(f"{tag} Step {s}: {words}.")
+    return "\n".join(lines)
+
+
+async def upload(client, url, collection, text):
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"{url}/upload-pdf", data={"file_str": text, "collection_name": collection})
+        status = response.status_code
+    except httpx.HTTPError:
+        status = "error"
+    return {"collection": collection, "status": status,
+            "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def run_uploads(args, documents):
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        start = time.perf_counter()
+        jobs = [upload(client, args.url, collection, text) for collection, text in documents]
+        results = await asyncio.gather(*jobs)
+        return results, time.perf_counter() - start
+
+
+def check_collection(client, name):
+    """
+    Returns a list of consistency problems found in one collection.
+    """
+    from settings import DEDUP_ENABLED
+    from utils.dedup import NearDuplicateIndex
+    from utils.vector_mirror import VectorMirror, is_mirrored
+
+    problems = []
+    page = client.get_collection(name=name).get(include=["documents"])
+    ids = set(page["ids"])
+    owners = set()
+    for chunk_id, document in zip(page["ids"], page["documents"]):
+        tags = set(_TAG.findall(document or ""))
+        if len(tags) != 1:
+            problems.append(f"{chunk_id} holds text of {len(tags)} uploads")
+        owners |= tags
+    if len(owners) > 1:
+        problems.append(f"chunks come from {len(owners)} different uploads: "
+                        f"{sorted('-'.join(o) for o in owners)}")
+    if not ids:
+        problems.append("collection is empty")
+
+    if DEDUP_ENABLED:
+        indexed = {chunk_id for chunk_id in NearDuplicateIndex(name).ids if chunk_id is not None}
+        if indexed != ids:
+            problems.append(f"dedup index differs from collection: {len(indexed - ids)} extra, "
+                            f"{len(ids - indexed)} missing")
+    if is_mirrored(name):
+        mirror = VectorMirror(name)
+        mirrored = set(mirror.ids()) if mirror.exists() else set()
+        if mirrored != ids:
+            problems.append(f"vector mirror differs from collection: {len(mirrored ^ ids)} ids")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /upload-pdf stress test")
+    parser.add_argument("--url", default="http://127.0.0.1:9003", help="App base URL")
+    parser.add_argument("--collections", type=int, default=2, help="Scratch collections to write")
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent uploads per collection")
+    parser.add_argument("--sentences", type=int, default=120, help="Sentences per uploaded document")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, help="Start the app with this many workers")
+    parser.add_argument("--port", type=int, default=9104, help="Port for the app started by --workers")
+    parser.add_argument("--mock", action="store_true", help="Start mock_ollama.py and point the app at it")
+    parser.add_argument("--mock-port", type=int, default=11436)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    args = parser.parse_args()
+
+    names = [f"stress_ingest_{c}" for c in range(args.collections)]
+    documents = [(names[c], make_document(c, u, args.sentences, args.seed * 1000 + c * 100 + u))
+                 for u in range(args.uploads) for c in range(args.collections)]
+
+    env = dict(os.environ)
+    with ExitStack() as stack:
+        if args.workers:
+            if args.mock:
+                mock_url = f"http://127.0.0.1:{args.mock_port}"
+                env.update({"BITNET_URL": f"{mock_url}/api/chat", "OLLAMA_URL": f"{mock_url}/api/embeddings"})
+                stack.enter_context(start_process(
+                    [sys.executable, "mock_ollama.py", "--port", str(args.mock_port)],
+                    env, f"{mock_url}/mock/stats"))
+            args.url = f"http://127.0.0.1:{args.port}"
+            command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+                       "--port", str(args.port), "--workers", str(args.workers)]
+            stack.enter_context(start_process(command, env, f"{args.url}/metrics/admission"))
+
+        print(f"Sending {len(documents)} uploads to {len(names)} collections at once ...")
+        results, seconds = asyncio.run(run_uploads(args, documents))
+
+    # ------------------------------
+    # Consistency checks
+    # ------------------------------
+    from utils.chroma_utils import get_chroma_client
+    from utils.dedup import NearDuplicateIndex
+
+    client = get_chroma_client()
+    report = {"uploads": len(results), "wall_seconds": round(seconds, 2),
+              "status": {}, "collections": {}}
+    for result in results:
+        report["status"][str(result["status"])] = report["status"].get(str(result["status"]), 0) + 1
+    for name in names:
+        try:
+            problems = check_collection(client, name)
+        except Exception as e:
+            problems = [f"cannot read collection: {e}"]
+        latencies = sorted(r["ms"] for r in results if r["collection"] == name)
+        report["collections"][name] = {"consistent": not problems, "problems": problems,
+                                       "max_upload_ms": latencies[-1] if latencies else None}
+        if not args.keep:
+            try:
+                client.delete_collection(name=name)
+            except Exception:
+                pass
+            shutil.rmtree(NearDuplicateIndex(name).path, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+    failed = [n for n, r in report["collections"].items() if not r["consistent"]]
+    if failed or set(report["status"]) - {"200"}:
+        sys.exit(f"FAILED: inconsistent collections {failed}, upload statuses {report['status']}")
+    print("OK: every collection holds exactly one upload's chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from settings import ADMISSION_LIMITS, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+from utils.logger import log
+
+# ------------------------------
+# Admission control and load shedding
+# ------------------------------
+# Each endpoint (e.g. "/query") and each LLM backend (e.g. "ollama_chat",
+# "groq") has its own limiter configured in ADMISSION_LIMITS:
+#
+# - at most 'max_concurrency' requests run at once,
+# - at most 'max_queue' more wait for a slot,
+# - anything beyond that is rejected immediately with 429 + Retry-After,
+# - a waiter that cannot get a slot within ADMISSION_QUEUE_TIMEOUT seconds (or
+#   before its client deadline) is rejected with 503 + Retry-After,
+# - a request whose client deadline has already passed is rejected before
+#   the LLM is called.
+#
+# Clients may send a deadline as "X-Request-Deadline: <unix epoch seconds>"
+# or "X-Request-Timeout: <seconds from now>".
+#
+# Limits are per worker process (asyncio semaphores).
+
+
+def get_request_deadline(request):
+    """
+    Returns the client's absolute deadline (time.time() seconds) or None.
+    """
+    try:
+        deadline = request.headers.get("X-Request-Deadline")
+        if deadline:
+            return float(deadline)
+        timeout = request.headers.get("X-Request-Timeout")
+        if timeout:
+            return time.time() + float(timeout)
+    except ValueError:
+        log.warning("Ignoring malformed request deadline header")
+    return None
+
+
+def remaining_time(deadline, default):
+    """
+    Seconds left until 'deadline', capped at 'default' (default if no deadline).
+    """
+    if deadline is None:
+        return default
+    return min(default, deadline - time.time())
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit with a bounded wait queue and deadline-aware shedding.
+
+    Args:
+        name (str): Endpoint path or backend name (used in metrics/logs).
+        max_concurrency (int): Requests allowed to run at the same time.
+        max_queue (int): Requests allowed to wait for a slot.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "shed_queue_full": 0, "shed_queue_timeout": 0,
+                         "shed_deadline": 0}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _shed(self, reason, status_code, detail):
+        self.counters[f"shed_{reason}"] += 1
+        log.warning(f"Shedding request at '{self.name}': {detail}",
+                    extra={"event": "load_shed", "limiter": self.name, "reason": reason})
+        raise HTTPException(status_code=status_code, detail=detail,
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+
+    def check_deadline(self, deadline):
+        """
+        Rejects the request (503) if its client deadline has already passed.
+        """
+        if deadline is not None and time.time() >= deadline:
+            self._shed("deadline", 503, "Client deadline already passed")
+
+    @asynccontextmanager
+    async def admit(self, deadline=None):
+        """
+        Waits for a slot (bounded queue, bounded wait) and holds it for the
+        duration of the 'async with' block.
+        """
+        self.check_deadline(deadline)
+
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._shed("queue_full", 429, f"Too many requests queued for {self.name}")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(),
+                                       timeout=max(remaining_time(deadline, ADMISSION_QUEUE_TIMEOUT), 0))
+            except asyncio.TimeoutError:
+                self._shed("queue_timeout", 503, f"Timed out waiting for {self.name}")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        self.counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def metrics(self):
+        """
+        Current queue depth, concurrency and shed counts.
+        """
+        return {
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **self.counters,
+        }
+
+
+# Worker-wide limiters, one per configured endpoint/backend
+limiters = {
+    name: AdmissionLimiter(name, config["max_concurrency"], config["max_queue"])
+    for name, config in ADMISSION_LIMITS.items()
+}
+
+
+def get_limiter(name):
+    """
+    Returns the limiter for an endpoint/backend, or None if it is unlimited.
+    """
+    return limiters.get(name)
+
+
+@asynccontextmanager
+async def admit(name, deadline=None):
+    """
+    'async with admit("groq", deadline):' - admits through the named limiter,
+    or only checks the deadline if that name has no limit configured.
+    """
+    limiter = limiters.get(name)
+    if limiter is None:
+        if deadline is not None and time.time() >= deadline:
+            raise HTTPException(status_code=503, detail="Client deadline already passed",
+                                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+        yield
+        return
+    async with limiter.admit(deadline):
+        yield
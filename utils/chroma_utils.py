@@ -1,155 +1,518 @@
-import chromadb
-from settings import OLLAMA_URL, OLLAMA_MODEL_NAME 
-from chromadb.config import Settings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import httpx
-from typing import List
-import traceback
-from langchain_core.documents import Document
-from utils.logger import log
-import warnings
-
-# -------------------------------
-# Suppress unnecessary warnings
-# -------------------------------
-warnings.filterwarnings('ignore')
-
-
-# -------------------------------
-# Function: split_text
-# -------------------------------
-def split_text(text: str) -> List[Document]:
-    """
-    Splits input text into smaller chunks for embeddings.
-    
-    - Uses RecursiveCharacterTextSplitter from LangChain.
-    - chunk_size=1000: maximum characters per chunk.
-    - chunk_overlap=200: overlap to maintain context between chunks.
-    - Returns a list of Document objects, each containing a chunk.
-    """
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = splitter.create_documents([text])
-    return chunks
-
-
-# -------------------------------
-# Function: get_embeddings
-# -------------------------------
-async def get_embeddings(text: str):
-    """
-    Fetches embeddings from Ollama (via Hugging Face style API) for a given text.
-    
-    - Sends POST request with 'model' and 'prompt'.
-    - Returns a list of vector embeddings.
-    - Logs warning if embedding is empty.
-    - Catches and logs any exceptions.
-    """
-    payload = {
-        "model": OLLAMA_MODEL_NAME,
-        "prompt": text   # Input text for embedding
-    }
-
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(OLLAMA_URL, json=payload)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            data = response.json()
-            vector = data.get("embedding", [])
-
-            if vector == []:
-                log.warning("Empty embedding vector received")
-
-            return vector
-    except Exception as e:
-        log.error(f"Failed to fetch embedding: {e}", exc_info=True)
-        return []
-
-
-# -------------------------------
-# Function: get_chroma_client
-# -------------------------------
-def get_chroma_client(path="./chroma_data_db"):
-    """
-    Initializes and returns a ChromaDB PersistentClient.
-    
-    - PersistentClient stores embeddings and metadata on disk.
-    - 'anonymized_telemetry=False' disables sending anonymous usage data.
-    - Default path is './chroma_data_db'.
-    """
-    return chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
-
-
-# -------------------------------
-# Function: get_or_create_collection
-# -------------------------------
-def get_or_create_collection(client, name):
-    """
-    Retrieves an existing collection from ChromaDB.
-    If it doesn't exist, creates a new one.
-    
-    - 'client': ChromaDB client instance.
-    - 'name': Collection name.
-    - Logs warning if collection creation is required.
-    """
-    try:
-        return client.get_collection(name=name)
-    except Exception as e:
-        log.warning(f"Collection '{name}' not found. Creating new one. Error={e}")
-        return client.create_collection(name=name)
-
-
-# -------------------------------
-# Function: add_chunks_to_chroma
-# -------------------------------
-async def add_chunks_to_chroma(chunks: List[Document], collection):
-    """
-    Adds document chunks into a ChromaDB collection.
-    
-    Steps:
-    1. Fetch existing document IDs to avoid duplicates.
-    2. Iterate through each chunk:
-        a. Generate embedding for the chunk using get_embeddings().
-        b. Skip chunk if embedding is empty.
-        c. Delete old chunk in collection if ID already exists.
-        d. Add chunk content, metadata, and embedding to collection.
-    
-    - 'chunks': List of Document objects.
-    - 'collection': ChromaDB collection object.
-    - Logs errors or warnings for failures.
-    """
-    existing_ids = set()
-
-    # Fetch existing document IDs
-    try:
-        results = collection.get()  # Default returns existing IDs and documents
-        existing_ids = set(results['ids']) if 'ids' in results else set()
-    except Exception as e:
-        log.warning(f"Failed to fetch existing IDs: {e}")
-        traceback.print_exc()
-
-    # Iterate and add each chunk
-    for i, chunk in enumerate(chunks):
-        chunk_id = f"chunk_{i}"  # Unique ID for chunk
-
-        vector = await get_embeddings(chunk.page_content)
-        if not vector:
-            log.warning(f"Skipping {chunk_id} due to empty embedding")
-            continue
-
-        # Delete old chunk if it exists
-        if chunk_id in existing_ids:
-            try:
-                collection.delete(ids=[chunk_id])
-            except Exception as e:
-                log.error(f"Failed to delete existing {chunk_id}: {e}", exc_info=True)
-
-        # Add new chunk to collection
-        try:
-            collection.add(
-                documents=[chunk.page_content],
-                metadatas=[{"source": chunk_id}],
-                embeddings=[vector],
-                ids=[chunk_id]
-            )
-        except Exception as e:
-            log.error(f"Failed to add {chunk_id} to collection: {e}", exc_info=True)
+import asyncio
+import os
+import re
+import shutil
+import sqlite3
+from contextlib import closing
+from settings import (
+    OLLAMA_URL, OLLAMA_MODEL_NAME, COMPACTION_BATCH_SIZE, DEDUP_ENABLED,
+    EMBED_BATCH_SIZE, INGEST_UPSERT_BATCH_SIZE
+)
+from typing import List
+from langchain_core.documents import Document
+from utils.chunking import get_chunking_config, get_chunking_engine
+from utils.collection_lock import (
+    collection_write_lock, collection_write_lock_sync, publish_collection_id
+)
+from utils.http_client import get_http_client
+from utils.dedup import NearDuplicateIndex, minhash_signature
+from utils.logger import log
+from utils.vector_mirror import get_vector_mirror
+import warnings
+
+# -------------------------------
+# Suppress unnecessary warnings
+# -------------------------------
+warnings.filterwarnings('ignore')
+
+# -------------------------------
+# Lazy backends
+# -------------------------------
+# chromadb and langchain_text_splitters are imported on first use so that
+# importing this module (and therefore app.py) stays cheap. The startup
+# warm-up in app.py triggers the chromadb import before traffic arrives.
+_chroma_clients = {}
+
+
+# -------------------------------
+# Function: split_text
+# -------------------------------
+def split_text(text: str, collection_name: str = None) -> List[Document]:
+    """
+    Splits input text into smaller chunks for embeddings.
+    
+    - Chunking settings come from get_chunking_config(collection_name)
+      (CHUNKING_DEFAULTS overridden by CHUNKING_PER_COLLECTION).
+    - strategy "structure": ChunkingEngine (utils/chunking.py) splits at
+      incident ("---") and section boundaries into token-sized chunks.
+    - strategy "recursive": the previous RecursiveCharacterTextSplitter
+      with chunk_size/chunk_overlap in characters (1000/200).
+    - Returns a list of Document objects, each containing a chunk.
+    """
+    config = get_chunking_config(collection_name)
+    if config["strategy"] == "structure":
+        return get_chunking_engine(collection_name).split(text)
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"]
+    )
+    chunks = splitter.create_documents([text])
+    return chunks
+
+
+# -------------------------------
+# Function: get_embeddings
+# -------------------------------
+async def get_embeddings(text: str):
+    """
+    Fetches embeddings from Ollama (via Hugging Face style API) for a given text.
+    
+    - Sends POST request with 'model' and 'prompt'.
+    - Returns a list of vector embeddings.
+    - Logs warning if embedding is empty.
+    - Catches and logs any exceptions.
+    """
+    payload = {
+        "model": OLLAMA_MODEL_NAME,
+        "prompt": text   # Input text for embedding
+    }
+
+    try:
+        client = get_http_client()  # Pooled keep-alive connections
+        response = await client.post(OLLAMA_URL, json=payload)
+        response.raise_for_status()  # Raise exception for HTTP errors
+        data = response.json()
+        vector = data.get("embedding", [])
+
+        if vector == []:
+            log.warning("Empty embedding vector received")
+
+        return vector
+    except Exception as e:
+        log.error(f"Failed to fetch embedding: {e}", exc_info=True)
+        return []
+
+
+# -------------------------------
+# Function: get_embeddings_batch
+# -------------------------------
+async def get_embeddings_batch(texts: List[str]):
+    """
+    Fetches embeddings for many texts, EMBED_BATCH_SIZE requests at a time
+    over the pooled connections.
+
+    - Returns one vector per text, in input order ([] where embedding failed).
+    - Uses the same /api/embeddings endpoint as get_embeddings(): Ollama's
+      /api/embed batch endpoint returns normalized vectors, which would not
+      be comparable with the vectors already stored in the collections.
+    """
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        vectors.extend(await asyncio.gather(*(get_embeddings(text) for text in batch)))
+    return vectors
+
+
+# -------------------------------
+# Function: get_chroma_client
+# -------------------------------
+def get_chroma_client(path="./chroma_data_db"):
+    """
+    Initializes and returns a ChromaDB PersistentClient.
+    
+    - PersistentClient stores embeddings and metadata on disk.
+    - 'anonymized_telemetry=False' disables sending anonymous usage data.
+    - Default path is './chroma_data_db'.
+    - One client is kept per path for the lifetime of the worker, so
+      requests reuse the already opened database instead of reopening it.
+    - chromadb >= 1.0 keeps up to (open file limit / 5) HNSW indexes loaded
+      regardless of size; lower `ulimit -n` to bound index memory.
+    """
+    client = _chroma_clients.get(path)
+    if client is None:
+        import chromadb
+        from chromadb.config import Settings
+
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        _chroma_clients[path] = client
+    return client
+
+
+# -------------------------------
+# Function: get_or_create_collection
+# -------------------------------
+def get_or_create_collection(client, name):
+    """
+    Retrieves an existing collection from ChromaDB.
+    If it doesn't exist, creates a new one.
+    
+    - 'client': ChromaDB client instance.
+    - 'name': Collection name.
+    - Logs warning if collection creation is required.
+    """
+    try:
+        return client.get_collection(name=name)
+    except Exception as e:
+        log.warning(f"Collection '{name}' not found. Creating new one. Error={e}")
+        return client.create_collection(name=name)
+
+
+# -------------------------------
+# Function: add_chunks_to_chroma
+# -------------------------------
+async def add_chunks_to_chroma(chunks: List[Document], collection):
+    """
+    Adds document chunks into a ChromaDB collection.
+    
+    Steps:
+    1. Take the collection's write lock (utils/collection_lock.py), so
+       concurrent uploads to the same collection, from any worker, are
+       applied one after the other. Other collections are not blocked.
+    2. If DEDUP_ENABLED, decide which chunks are near-duplicates of chunks
+       already stored (utils/dedup.py); those are never embedded. Stored
+       chunks about to be overwritten that skipped chunks are linked to are
+       first copied to a linked id (rehome_duplicates()).
+    3. Generate embeddings for the remaining chunks concurrently
+       (get_embeddings_batch()) and skip chunks whose embedding is empty.
+    4. Upsert chunk content, metadata, and embedding into the collection in
+       batches. Upsert replaces an existing ID in place, so re-uploads no
+       longer leave deleted entries (tombstones) behind in the index.
+    5. Delete stale entries whose ID was skipped as a duplicate.
+    6. Apply the changes to the collection's vector mirror, if any.
+
+    Blocking Chroma and index calls run in a thread, so the worker keeps
+    serving other requests (and other collections' uploads) meanwhile.
+    
+    - 'chunks': List of Document objects.
+    - 'collection': ChromaDB collection object.
+    - Logs errors or warnings for failures.
+    - Returns a dict with the number of chunks added and skipped as duplicates.
+    """
+    async with collection_write_lock(collection.name):
+        plan = await asyncio.to_thread(_plan_chunks, chunks, collection)
+        vectors = await get_embeddings_batch([chunk.page_content for _, chunk in plan["to_embed"]])
+        return await asyncio.to_thread(_write_chunks, plan, vectors, collection)
+
+
+def _plan_chunks(chunks: List[Document], collection):
+    """
+    Dedup pass of add_chunks_to_chroma(): returns the chunks to embed, the
+    stale ids to delete and the (updated, unsaved) dedup index.
+    """
+    to_embed, stale_ids, replaced = [], [], set()
+    duplicates = 0
+
+    dedup_index = NearDuplicateIndex(collection.name) if DEDUP_ENABLED else None
+    if dedup_index is not None:
+        if collection.count() == 0:
+            dedup_index.clear()  # Collection was recreated; the index is stale
+        elif not dedup_index.exists():
+            # Collection predates deduplication: index what it already holds,
+            # so skipped ids that still have old content are deleted as stale
+            stored = collection.get(include=["documents"])
+            for chunk_id, document in zip(stored["ids"], stored["documents"]):
+                dedup_index.add(chunk_id, document or "", minhash_signature(document or ""))
+            log.info(f"Built dedup index for '{collection.name}' from {len(stored['ids'])} stored chunks")
+    # Ids this upload will overwrite are not valid duplicate targets until rewritten
+    pending_ids = {f"chunk_{i}" for i in range(len(chunks))}
+
+    rehomed = ([], [], [])
+    if dedup_index is not None and dedup_index.links:
+        # Chunks that skipped ids are linked to keep their content elsewhere
+        overwritten = [f"chunk_{i}" for i, chunk in enumerate(chunks)
+                       if not dedup_index.unchanged(f"chunk_{i}", chunk.page_content)]
+        rehomed = rehome_duplicates(collection, dedup_index, overwritten, keep=pending_ids)
+
+    for i, chunk in enumerate(chunks):
+        chunk_id = f"chunk_{i}"  # Unique ID for chunk
+        pending_ids.discard(chunk_id)
+
+        if dedup_index is not None:
+            signature = minhash_signature(chunk.page_content)
+            duplicate_of = dedup_index.find_duplicate(
+                chunk_id, chunk.page_content, signature, exclude=pending_ids
+            )
+            if duplicate_of is not None:
+                duplicates += 1
+                if duplicate_of != chunk_id and dedup_index.contains(chunk_id):
+                    stale_ids.append(chunk_id)  # Old content under this id
+                    dedup_index.remove(chunk_id)
+                dedup_index.link(chunk_id, duplicate_of)
+                continue
+            if dedup_index.contains(chunk_id):
+                replaced.add(chunk_id)
+            # Indexed now so later chunks of this upload can match it;
+            # undone in _write_chunks() if embedding or upsert fails
+            dedup_index.add(chunk_id, chunk.page_content, signature)
+
+        to_embed.append((chunk_id, chunk))
+
+    return {"to_embed": to_embed, "stale_ids": stale_ids, "replaced": replaced,
+            "duplicates": duplicates, "dedup_index": dedup_index, "rehomed": rehomed}
+
+
+def _write_chunks(plan, vectors, collection):
+    """
+    Write pass of add_chunks_to_chroma(): upserts the embedded chunks,
+    deletes stale ids and updates the dedup index and vector mirror.
+    """
+    dedup_index, stale_ids = plan["dedup_index"], list(plan["stale_ids"])
+    added_ids, added_vectors, added_documents, added_metadatas = [], [], [], []
+    failed_ids = []
+
+    for (chunk_id, chunk), vector in zip(plan["to_embed"], vectors):
+        if not vector:
+            log.warning(f"Skipping {chunk_id} due to empty embedding")
+            failed_ids.append(chunk_id)
+            continue
+        added_ids.append(chunk_id)
+        added_vectors.append(vector)
+        added_documents.append(chunk.page_content)
+        added_metadatas.append({**chunk.metadata, "source": chunk_id})
+
+    # Add (or replace) chunks in collection
+    stored = 0
+    for offset in range(0, len(added_ids), INGEST_UPSERT_BATCH_SIZE):
+        batch = slice(offset, offset + INGEST_UPSERT_BATCH_SIZE)
+        try:
+            collection.upsert(
+                documents=added_documents[batch],
+                metadatas=added_metadatas[batch],
+                embeddings=added_vectors[batch],
+                ids=added_ids[batch]
+            )
+            stored = offset + len(added_ids[batch])
+        except Exception as e:
+            log.error(f"Failed to add {added_ids[batch][0]}..{added_ids[batch][-1]} to collection: {e}",
+                      exc_info=True)
+            break
+    failed_ids.extend(added_ids[stored:])
+    del added_ids[stored:], added_vectors[stored:], added_documents[stored:]
+
+    if dedup_index is not None:
+        for chunk_id in failed_ids:
+            # The index already holds the new content; drop the old content too
+            dedup_index.remove(chunk_id)
+            if chunk_id in plan["replaced"]:
+                stale_ids.append(chunk_id)
+            lost = dedup_index.unlink(chunk_id)
+            if lost:
+                log.warning(f"{chunk_id} was not stored; chunks skipped as its duplicates are missing "
+                            f"too, re-upload to store them: {lost}")
+
+    if stale_ids:
+        try:
+            collection.delete(ids=stale_ids)
+        except Exception as e:
+            log.error(f"Failed to delete stale chunks {stale_ids}: {e}", exc_info=True)
+
+    if dedup_index is not None:
+        try:
+            dedup_index.save()
+        except Exception as e:
+            log.error(f"Failed to save dedup index: {e}", exc_info=True)
+        log.info(f"Skipped {plan['duplicates']} duplicate chunks in '{collection.name}'",
+                 extra={"event": "dedup", "collection": collection.name, "duplicates": plan["duplicates"]})
+
+    # Keep the in-memory mirror in step with the collection
+    rehomed_ids, rehomed_vectors, rehomed_documents = plan["rehomed"]
+    mirror_ids = rehomed_ids + added_ids
+    if mirror_ids or stale_ids:
+        try:
+            mirror = get_vector_mirror(collection)
+            if mirror is not None and not mirror.exists():
+                # Already holding the write lock; the build includes this write
+                mirror.build(collection)
+            elif mirror is not None:
+                if stale_ids:
+                    mirror.delete(stale_ids)
+                if mirror_ids:
+                    mirror.upsert(mirror_ids, rehomed_vectors + added_vectors,
+                                  rehomed_documents + added_documents)
+        except Exception as e:
+            log.error(f"Failed to refresh vector mirror: {e}", exc_info=True)
+
+    return {"added": len(added_ids), "duplicates": plan["duplicates"]}
+
+
+# -------------------------------
+# Function: get_directory_size
+# -------------------------------
+def get_directory_size(path) -> int:
+    """
+    Returns the total size in bytes of all files under 'path'.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# -------------------------------
+# Function: upsert_records
+# -------------------------------
+def upsert_records(collection, ids, embeddings, documents, metadatas=None):
+    """
+    Upserts copied rows (compaction, snapshot import) whose metadata may be
+    missing for some of them.
+
+    - Chroma rejects empty metadata dicts, and older versions also reject
+      None inside a metadata list, so rows without metadata are upserted in
+      a separate call that omits the field.
+    - 'embeddings' is a list or a numpy array.
+    """
+    with_metadata = [i for i, metadata in enumerate(metadatas or []) if metadata]
+    if len(with_metadata) == len(ids) or not with_metadata:
+        collection.upsert(ids=list(ids), embeddings=embeddings, documents=list(documents),
+                          metadatas=list(metadatas) if with_metadata else None)
+        return
+
+    def pick(values, rows):
+        return values[rows] if hasattr(values, "shape") else [values[i] for i in rows]
+
+    chosen = set(with_metadata)
+    without_metadata = [i for i in range(len(ids)) if i not in chosen]
+    collection.upsert(ids=pick(ids, with_metadata), embeddings=pick(embeddings, with_metadata),
+                      documents=pick(documents, with_metadata), metadatas=pick(metadatas, with_metadata))
+    collection.upsert(ids=pick(ids, without_metadata), embeddings=pick(embeddings, without_metadata),
+                      documents=pick(documents, without_metadata))
+
+
+# -------------------------------
+# Function: rehome_duplicates
+# -------------------------------
+def rehome_duplicates(collection, dedup_index, chunk_ids, keep=()):
+    """
+    Keeps the content of skipped duplicates when the chunks they are linked
+    to are about to be overwritten or deleted (utils/dedup.py).
+
+    - For every id in 'chunk_ids' that skipped chunks are linked to, its
+      stored embedding, document and metadata are copied to one of the
+      linked ids, and the remaining links are moved to that id. Nothing is
+      re-embedded.
+    - Ids in 'keep' are written by the caller anyway and never chosen.
+    - Must run before the chunks are overwritten, under the collection
+      write lock.
+    - Returns the ids, embeddings and documents written (for the vector mirror).
+    """
+    holders = {}
+    for chunk_id in chunk_ids:
+        linked = [skipped for skipped in dedup_index.linked_to(chunk_id) if skipped not in keep]
+        if linked and dedup_index.contains(chunk_id):
+            holders[chunk_id] = linked[0]
+    if not holders:
+        return [], [], []
+
+    stored = collection.get(ids=list(holders), include=["embeddings", "documents", "metadatas"])
+    ids = [holders[chunk_id] for chunk_id in stored["ids"]]
+    metadatas = [{**(metadata or {}), "source": holder}
+                 for holder, metadata in zip(ids, stored["metadatas"])]
+    upsert_records(collection, ids, stored["embeddings"], stored["documents"], metadatas)
+    for chunk_id in stored["ids"]:
+        dedup_index.move_links(chunk_id, holders[chunk_id])
+    log.info(f"Moved {len(ids)} chunks with linked duplicates in '{collection.name}' before overwriting them",
+             extra={"event": "dedup_rehome", "collection": collection.name, "chunks": len(ids)})
+    return ids, list(stored["embeddings"]), stored["documents"]
+
+
+# -------------------------------
+# Function: remove_orphan_segments
+# -------------------------------
+_SEGMENT_DIR = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def remove_orphan_segments(path="./chroma_data_db"):
+    """
+    Frees the disk space of deleted collections.
+
+    - chromadb >= 1.0 keeps a deleted collection's vector segment directory
+      (<path>/<segment id>/) on disk. Directories whose id is no longer in
+      chroma.sqlite3's 'segments' table are removed.
+    - chroma.sqlite3 is then VACUUMed to return the deleted rows' pages. If
+      another writer holds the database, VACUUM is skipped with a warning.
+    - Returns the number of bytes freed.
+    """
+    size_before = get_directory_size(path)
+    db_path = os.path.join(path, "chroma.sqlite3")
+    with closing(sqlite3.connect(db_path, timeout=30)) as db:
+        live = {row[0] for row in db.execute("SELECT id FROM segments")}
+
+    for entry in os.listdir(path):
+        segment_path = os.path.join(path, entry)
+        if _SEGMENT_DIR.fullmatch(entry) and entry not in live and os.path.isdir(segment_path):
+            shutil.rmtree(segment_path, ignore_errors=True)
+            log.info(f"Removed orphaned segment directory {segment_path}")
+
+    try:
+        with closing(sqlite3.connect(db_path, timeout=30, isolation_level=None)) as db:
+            db.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        log.warning(f"Could not VACUUM {db_path}: {e}")
+    return size_before - get_directory_size(path)
+
+
+# -------------------------------
+# Function: compact_collection
+# -------------------------------
+def compact_collection(client, name, batch_size=COMPACTION_BATCH_SIZE, path="./chroma_data_db"):
+    """
+    Rebuilds a collection in place to drop deleted entries (tombstones)
+    that accumulate in its vector index.
+
+    Steps:
+    1. Copy every ID, document, metadata and embedding, page by page,
+       into a temporary collection '<name>__compact'.
+    2. Delete the original collection.
+    3. Rename the temporary collection to the original name.
+    4. Remove the old collection's files (see remove_orphan_segments).
+
+    - Embeddings are copied as stored; nothing is re-embedded.
+    - Holds the collection's write lock, so uploads wait until it is done.
+    - The rebuilt collection has a new ID; it is published so every
+      worker's collection manager reopens its handle.
+    - Returns a dict with the entry count and disk size before/after. A
+      rebuild that did not reduce the size is logged as a warning.
+    """
+    with collection_write_lock_sync(name):
+        source = client.get_collection(name=name)
+        size_before = get_directory_size(path)
+        temp_name = f"{name}__compact"
+
+        try:
+            client.delete_collection(name=temp_name)  # Leftover from an interrupted run
+        except Exception:
+            pass
+        target = client.create_collection(name=temp_name, metadata=source.metadata)
+
+        total = source.count()
+        for offset in range(0, total, batch_size):
+            page = source.get(
+                limit=batch_size, offset=offset,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not page["ids"]:
+                break
+            upsert_records(target, page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+
+        client.delete_collection(name=name)
+        target.modify(name=name)
+        publish_collection_id(name, target.id)  # Workers reopen their handles
+        remove_orphan_segments(path)
+        size_after = get_directory_size(path)
+
+        log.info(f"Compacted collection '{name}': {total} entries, "
+                 f"{size_before} -> {size_after} bytes on disk")
+        if size_after >= size_before:
+            log.warning(f"Compacting '{name}' saved no disk space ({size_before} -> {size_after} bytes)")
+        return {
+            "collection": name,
+            "entries": total,
+            "disk_bytes_before": size_before,
+            "disk_bytes_after": size_after,
+        }
@@ -0,0 +1,218 @@
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+from settings import CHUNKING_DEFAULTS, CHUNKING_PER_COLLECTION
+
+# ------------------------------
+# Structure-aware, token-sized chunking
+# ------------------------------
+# Knowledge-base documents are lists of incidents separated by "---" lines,
+# each with headed sections ("Main Issue:", "Observations:", "RCA:", ...).
+# The engine:
+#
+# 1. Splits the text at incident boundaries ("---" lines).
+# 2. Splits each incident at section headers.
+# 3. Packs whole sections into chunks of at most 'max_tokens' tokens; only a
+#    section that is too large on its own is split further, by paragraph,
+#    then sentence, then word.
+# 4. Re-wraps every chunk of an incident in "---" markers and repeats the
+#    incident's "Main Issue:" line on its continuation chunks, so
+#    extract_relevant_data() in app.py still finds the incident in each chunk.
+#
+# All work is done on (start, end) offsets into the original string with
+# precompiled patterns, so one upload is processed in a single linear pass
+# and text is only sliced when a chunk is emitted.
+
+_INCIDENT_BOUNDARY = re.compile(r"^[ \t]*-{3,}[ \t]*$", re.MULTILINE)
+_SECTION_HEADER = re.compile(
+    r"^[ \t]*(?:\*\*)?(?:Main Issue|Challenges?|Observations?|Actions? Taken|"
+    r"Root Cause(?: Analysis)?|RCA|Solution|Resolution|Future Prevention[^:\n]*|"
+    r"Disposition|Sub Disposition|Priority)(?:\*\*)?[ \t]*:",
+    re.MULTILINE | re.IGNORECASE
+)
+_MAIN_ISSUE = re.compile(r"^[ \t]*(?:\*\*)?Main Issue(?:\*\*)?[ \t]*:[^\n]*", re.MULTILINE | re.IGNORECASE)
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\S+")
+
+# Approximates the WordPiece tokenizer of nomic-embed-text: every word piece of
+# up to 8 characters and every punctuation mark counts as one token.
+_TOKEN = re.compile(r"\w{1,8}|[^\w\s]")
+
+
+def estimate_tokens(text, start=0, end=None):
+    """
+    Approximate embedding-model token count of text[start:end].
+    """
+    end = len(text) if end is None else end
+    return sum(1 for _ in _TOKEN.finditer(text, start, end))
+
+
+def _strip_span(text, start, end):
+    """
+    Narrows (start, end) so it excludes leading/trailing whitespace.
+    """
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_spans(text, start, end, pattern):
+    """
+    Splits text[start:end] at every match of 'pattern'.
+    Section headers stay at the start of their piece; separators
+    ("---" lines, blank lines, sentence gaps) are dropped.
+    """
+    keep_match = pattern is _SECTION_HEADER
+    spans = []
+    cursor = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > cursor:
+            spans.append((cursor, match.start()))
+        cursor = match.start() if keep_match else match.end()
+    if cursor < end:
+        spans.append((cursor, end))
+    return [s for s in (_strip_span(text, a, b) for a, b in spans) if s[0] < s[1]]
+
+
+class ChunkingEngine:
+    """
+    Splits incident documents into token-sized chunks along their structure.
+
+    Args:
+        max_tokens (int): Upper bound of (estimated) tokens per chunk.
+        overlap_tokens (int): Tokens of trailing context repeated at the start
+            of the next chunk when an incident spans several chunks.
+        respect_incidents (bool): Never merge text across "---" boundaries.
+    """
+
+    def __init__(self, max_tokens=256, overlap_tokens=32, respect_incidents=True):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.respect_incidents = respect_incidents
+
+    # ------------------------------
+    # Units: pieces no larger than max_tokens
+    # ------------------------------
+    def _units(self, text, start, end, limit):
+        """
+        Yields (start, end, tokens) pieces of text[start:end], each at most
+        'limit' tokens, preferring section > paragraph > sentence > word cuts.
+        """
+        levels = (_SECTION_HEADER, _PARAGRAPH_BREAK, _SENTENCE_BREAK)
+        stack = [(start, end, 0)]
+        while stack:
+            a, b, level = stack.pop()
+            tokens = estimate_tokens(text, a, b)
+            if tokens <= limit:
+                yield a, b, tokens
+                continue
+            if level < len(levels):
+                pieces = _split_spans(text, a, b, levels[level])
+                if len(pieces) > 1:
+                    stack.extend((pa, pb, level + 1) for pa, pb in reversed(pieces))
+                else:
+                    stack.append((a, b, level + 1))
+                continue
+            # Last resort: windows of whole words
+            window_start, window_tokens, window_end = None, 0, a
+            for match in _WORD.finditer(text, a, b):
+                word_tokens = estimate_tokens(text, match.start(), match.end())
+                if window_start is not None and window_tokens + word_tokens > limit:
+                    yield window_start, window_end, window_tokens
+                    window_start, window_tokens = None, 0
+                if window_start is None:
+                    window_start = match.start()
+                window_tokens += word_tokens
+                window_end = match.end()
+            if window_start is not None:
+                yield window_start, window_end, window_tokens
+
+    # ------------------------------
+    # Packing
+    # ------------------------------
+    def _pack(self, text, start, end, limit):
+        """
+        Greedily packs consecutive units of text[start:end] into chunk spans
+        of at most 'limit' tokens, carrying up to overlap_tokens of trailing
+        units into the next chunk.
+        """
+        chunks = []
+        current = []  # list of (start, end, tokens)
+        current_tokens = 0
+        for unit in self._units(text, start, end, limit):
+            if current and current_tokens + unit[2] > limit:
+                chunks.append((current[0][0], current[-1][1]))
+                carried, carried_tokens = [], 0
+                for prev in reversed(current):
+                    if carried_tokens + prev[2] > self.overlap_tokens:
+                        break
+                    carried.insert(0, prev)
+                    carried_tokens += prev[2]
+                if carried_tokens + unit[2] > limit:
+                    carried, carried_tokens = [], 0
+                current, current_tokens = carried, carried_tokens
+            current.append(unit)
+            current_tokens += unit[2]
+        if current:
+            chunks.append((current[0][0], current[-1][1]))
+        return chunks
+
+    # ------------------------------
+    # Public API
+    # ------------------------------
+    def split(self, text) -> List[Document]:
+        """
+        Splits 'text' and returns a list of Document chunks.
+        Metadata carries the incident number and the chunk's position in it.
+        """
+        wrap = self.respect_incidents and _INCIDENT_BOUNDARY.search(text) is not None
+        incidents = _split_spans(text, 0, len(text), _INCIDENT_BOUNDARY) if wrap else \
+            [s for s in [_strip_span(text, 0, len(text))] if s[0] < s[1]]
+
+        documents = []
+        for incident_no, (start, end) in enumerate(incidents):
+            heading = _MAIN_ISSUE.search(text, start, end)
+            # Leave room for the repeated heading and the "---" markers
+            reserved = (estimate_tokens(heading.group(0)) if heading else 0) + (6 if wrap else 0)
+            spans = self._pack(text, start, end, max(self.max_tokens - reserved, 1))
+            for part_no, (a, b) in enumerate(spans):
+                body = text[a:b]
+                if heading and not (a <= heading.start() < b):
+                    body = heading.group(0).strip() + "\n" + body
+                if wrap:
+                    body = "---\n" + body + "\n---"
+                documents.append(Document(
+                    page_content=body,
+                    metadata={"incident": incident_no, "part": part_no, "parts": len(spans)}
+                ))
+        return documents
+
+
+# ------------------------------
+# Per-collection configuration
+# ------------------------------
+def get_chunking_config(collection_name=None):
+    """
+    Returns the chunking settings for a collection:
+    CHUNKING_DEFAULTS overridden by CHUNKING_PER_COLLECTION[collection_name].
+    """
+    config = dict(CHUNKING_DEFAULTS)
+    config.update(CHUNKING_PER_COLLECTION.get(collection_name, {}))
+    return config
+
+
+def get_chunking_engine(collection_name=None):
+    """
+    Builds a ChunkingEngine from the collection's chunking settings.
+    """
+    config = get_chunking_config(collection_name)
+    return ChunkingEngine(
+        max_tokens=config["max_tokens"],
+        overlap_tokens=config["overlap_tokens"],
+        respect_incidents=config["respect_incidents"]
+    )
@@ -0,0 +1,159 @@
+import asyncio
+import fcntl
+import os
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from settings import COLLECTION_LOCK_DIR, COLLECTION_LOCK_TIMEOUT
+from utils.logger import log
+
+# ------------------------------
+# Per-collection write locks
+# ------------------------------
+# Writes to one collection (upload, snapshot import, compaction) must not
+# interleave: two uploads both upserting chunk_0..chunk_n and rewriting the
+# dedup index and vector mirror would leave a mix of both.
+#
+# - Inside a worker, writers of the same collection queue on an asyncio.Lock.
+# - Across workers and CLI processes, the holder also takes an exclusive
+#   flock() on <COLLECTION_LOCK_DIR>/<collection>.lock. The lock is released
+#   by the kernel if the process dies, so a crash never leaves it stuck.
+# - Different collections use different locks and are written in parallel.
+#
+# Waiting longer than COLLECTION_LOCK_TIMEOUT seconds raises TimeoutError.
+#
+# Compaction and replacing imports recreate the collection under a new Chroma
+# ID. The writer records the new ID in <COLLECTION_LOCK_DIR>/<collection>.id,
+# and the collection manager of every worker reopens its cached handle when
+# the recorded ID differs from the one it holds.
+
+_SAFE_NAME = re.compile(r"[^\w.-]")
+_local_locks = {}  # collection name -> [asyncio.Lock, holders + waiters]; removed when unused
+_published_ids = {}  # collection name -> ((inode, mtime) of the .id file, ID read from it)
+
+
+class CollectionLockTimeout(TimeoutError):
+    """
+    Raised when a collection's write lock could not be acquired in time.
+    """
+
+
+def _marker_path(collection_name, suffix):
+    return os.path.join(COLLECTION_LOCK_DIR, _SAFE_NAME.sub("_", collection_name) + suffix)
+
+
+def _lock_path(collection_name, suffix=".lock"):
+    os.makedirs(COLLECTION_LOCK_DIR, exist_ok=True)
+    return _marker_path(collection_name, suffix)
+
+
+def publish_collection_id(collection_name, collection_id):
+    """
+    Records the ID of a recreated collection so other workers drop handles
+    to the old one. Call while holding the collection's write lock.
+    """
+    path = _lock_path(collection_name, ".id")
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(collection_id))
+    os.replace(tmp_path, path)
+
+
+def published_collection_id(collection_name):
+    """
+    The last ID recorded by publish_collection_id, or None.
+
+    Called on every request, so the file is only read again when it was
+    replaced (its inode or modification time changed); otherwise this
+    costs one stat().
+    """
+    path = _marker_path(collection_name, ".id")
+    try:
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached = _published_ids.get(collection_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(path, encoding="utf-8") as f:
+            collection_id = f.read().strip() or None
+    except FileNotFoundError:
+        return None
+    _published_ids[collection_name] = (version, collection_id)
+    return collection_id
+
+
+def _try_flock(handle):
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@asynccontextmanager
+async def collection_write_lock(collection_name, timeout=COLLECTION_LOCK_TIMEOUT):
+    """
+    'async with collection_write_lock(name):' - exclusive write access to a
+    collection across all coroutines, workers and processes on this host.
+    """
+    start = time.monotonic()
+    entry = _local_locks.setdefault(collection_name, [asyncio.Lock(), 0])
+    entry[1] += 1
+    local_lock = entry[0]
+    try:
+        await asyncio.wait_for(local_lock.acquire(), timeout=timeout)
+    except asyncio.TimeoutError:
+        _release_local_entry(collection_name, entry)
+        raise CollectionLockTimeout(f"Timed out waiting for write lock on '{collection_name}'")
+    except BaseException:
+        _release_local_entry(collection_name, entry)
+        raise
+
+    try:
+        with open(_lock_path(collection_name), "a") as handle:
+            delay = 0.01
+            while not _try_flock(handle):
+                if time.monotonic() - start >= timeout:
+                    raise CollectionLockTimeout(
+                        f"Timed out waiting for write lock on '{collection_name}' (held by another process)")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.25)
+            waited = time.monotonic() - start
+            if waited > 1:
+                log.info(f"Waited {waited:.2f}s for write lock on '{collection_name}'",
+                         extra={"event": "collection_lock_wait", "collection": collection_name})
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    finally:
+        local_lock.release()
+        _release_local_entry(collection_name, entry)
+
+
+def _release_local_entry(collection_name, entry):
+    """
+    Forgets a collection's asyncio.Lock once nobody holds or waits for it,
+    so the dict does not grow with every collection ever written.
+    """
+    entry[1] -= 1
+    if entry[1] == 0 and _local_locks.get(collection_name) is entry:
+        del _local_locks[collection_name]
+
+
+@contextmanager
+def collection_write_lock_sync(collection_name, timeout=COLLECTION_LOCK_TIMEOUT):
+    """
+    Blocking variant for CLI tools (snapshot import, compaction).
+    """
+    start = time.monotonic()
+    with open(_lock_path(collection_name), "a") as handle:
+        while not _try_flock(handle):
+            if time.monotonic() - start >= timeout:
+                raise CollectionLockTimeout(f"Timed out waiting for write lock on '{collection_name}'")
+            time.sleep(0.1)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from settings import (
+    COLLECTION_CACHE_SIZE, COLLECTION_USAGE_STATS_FILE,
+    COLLECTION_PRELOAD_LIMIT, COLLECTION_STATS_FLUSH_EVERY
+)
+from utils.chroma_utils import get_chroma_client, get_or_create_collection
+from utils.collection_lock import published_collection_id
+from utils.logger import log
+from utils.vector_mirror import release_vector_mirror
+
+# ------------------------------
+# Tenant-aware collection manager
+# ------------------------------
+# `collection_name` is a free-form request field, so every tenant gets its own
+# collection. The manager:
+#
+# - keeps opened collection handles in LRU order, at most
+#   COLLECTION_CACHE_SIZE of them, and drops the least recently used handle
+#   (and the worker's memory map of its vector mirror) beyond that,
+# - reopens a handle when compaction or a replacing import recreated the
+#   collection under a new ID (see utils/collection_lock.py),
+# - counts hits/loads per collection and persists usage to
+#   COLLECTION_USAGE_STATS_FILE so the busiest collections can be preloaded
+#   at startup,
+# - exposes per-collection hit metrics (GET /metrics/collections).
+#
+# Dropping a handle does not unload the HNSW index Chroma keeps for the
+# collection: chromadb >= 1.0 keeps up to (open file limit / 5) indexes
+# loaded per process, whatever their size, and there is no API to unload
+# one. Lower `ulimit -n` of the workers to bound index memory.
+
+
+class CollectionManager:
+    """
+    LRU cache of open Chroma collection handles.
+
+    Args:
+        max_open (int): Handles kept open in this worker.
+        stats_path (str): JSON file with persisted usage counts per collection.
+    """
+
+    def __init__(self, max_open=COLLECTION_CACHE_SIZE,
+                 stats_path=COLLECTION_USAGE_STATS_FILE):
+        self.max_open = max_open
+        self.stats_path = stats_path
+        self._entries = OrderedDict()  # name -> entry dict, least recently used first
+        self._metrics = {}             # name -> counters, kept after eviction
+        self._pending_usage = {}       # name -> hits not yet flushed to stats_path
+        self._accesses_since_flush = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------
+    # Access
+    # ------------------------------
+    def get(self, name, record_usage=True):
+        """
+        Returns the collection 'name', opening (or creating) it if needed,
+        and drops the least recently used handle beyond COLLECTION_CACHE_SIZE.
+
+        - 'record_usage=False' (used by preloading) leaves hit counts and
+          usage statistics untouched.
+        - A handle whose collection was recreated by another process
+          (compaction, replacing import) is reopened.
+        """
+        current_id = published_collection_id(name)
+        with self._lock:
+            metrics = self._metrics.setdefault(
+                name, {"hits": 0, "loads": 0, "evictions": 0})
+            entry = self._entries.get(name)
+            if entry is not None and current_id and current_id != str(entry["collection"].id):
+                log.info(f"Collection '{name}' was recreated (id {current_id}); reopening",
+                         extra={"event": "collection_reopened", "collection": name})
+                self._evict(name)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(name)
+                entry["last_used"] = time.time()
+                if record_usage:
+                    metrics["hits"] += 1
+                    self._record_usage(name)
+                return entry["collection"]
+
+        # Open outside the lock; opening can touch disk
+        collection = get_or_create_collection(get_chroma_client(), name)
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and str(entry["collection"].id) != str(collection.id):
+                entry = None  # Another thread cached the old collection meanwhile
+            if entry is None:
+                entry = {"collection": collection, "loaded_at": time.time(), "last_used": time.time()}
+                self._entries[name] = entry
+                metrics["loads"] += 1
+            elif record_usage:
+                metrics["hits"] += 1
+            self._entries.move_to_end(name)
+            if record_usage:
+                self._record_usage(name)
+            while len(self._entries) > self.max_open:
+                self._evict(next(iter(self._entries)))
+            return entry["collection"]
+
+    def evict(self, name):
+        """
+        Drops a collection handle from the cache and releases its vector mirror.
+        """
+        with self._lock:
+            self._evict(name)
+
+    # ------------------------------
+    # Internals
+    # ------------------------------
+    def _evict(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return
+        self._metrics[name]["evictions"] += 1
+        release_vector_mirror(name)
+        log.info(f"Evicted collection '{name}'",
+                 extra={"event": "collection_evicted", "collection": name})
+
+    def _record_usage(self, name):
+        self._pending_usage[name] = self._pending_usage.get(name, 0) + 1
+        self._accesses_since_flush += 1
+        if self._accesses_since_flush >= COLLECTION_STATS_FLUSH_EVERY:
+            self._flush_usage()
+
+    # ------------------------------
+    # Usage statistics
+    # ------------------------------
+    def _read_usage(self):
+        try:
+            with open(self.stats_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _flush_usage(self):
+        """
+        Adds pending hit counts to the shared stats file (atomic replace).
+        Concurrent flushes from other workers may occasionally lose an update;
+        the counts only guide preloading.
+        """
+        if not self._pending_usage:
+            return
+        usage = self._read_usage()
+        for name, hits in self._pending_usage.items():
+            usage[name] = usage.get(name, 0) + hits
+        tmp_path = f"{self.stats_path}.tmp.{os.getpid()}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(usage, f)
+            os.replace(tmp_path, self.stats_path)
+            self._pending_usage = {}
+            self._accesses_since_flush = 0
+        except OSError as e:
+            log.warning(f"Failed to write collection usage stats: {e}")
+
+    def flush(self):
+        """
+        Writes pending usage counts to disk (called on shutdown).
+        """
+        with self._lock:
+            self._flush_usage()
+
+    def preload(self, always=()):
+        """
+        Opens the given collections plus the most used ones from the stats
+        file (up to COLLECTION_PRELOAD_LIMIT and COLLECTION_CACHE_SIZE).
+        Returns a dict of the loaded collections by name.
+        """
+        usage = self._read_usage()
+        ranked = sorted(usage, key=usage.get, reverse=True)[:COLLECTION_PRELOAD_LIMIT]
+        loaded = {}
+        client = get_chroma_client()
+        existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+
+        for name in list(always) + [n for n in ranked if n not in always]:
+            if name not in always and name not in existing:
+                continue  # Stats may mention deleted collections
+            if name not in always and len(loaded) >= self.max_open:
+                break
+            loaded[name] = self.get(name, record_usage=False)
+        log.info(f"Preloaded collections: {list(loaded)}")
+        return loaded
+
+    # ------------------------------
+    # Metrics
+    # ------------------------------
+    def metrics(self):
+        """
+        Per-collection hit metrics and totals for this worker.
+        """
+        with self._lock:
+            collections = {}
+            for name, counters in self._metrics.items():
+                entry = self._entries.get(name)
+                lookups = counters["hits"] + counters["loads"]
+                collections[name] = {
+                    **counters,
+                    "open": entry is not None,
+                    "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                    "last_used": entry["last_used"] if entry else None,
+                }
+            return {
+                "pid": os.getpid(),
+                "max_open": self.max_open,
+                "open_collections": list(self._entries),
+                "collections": collections,
+            }
+
+
+# Worker-wide manager used by the API
+collection_manager = CollectionManager()
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from settings import (
+    DEDUP_INDEX_DIR, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_SIZE
+)
+from utils.logger import log
+
+# ------------------------------
+# Near-duplicate detection (MinHash + LSH)
+# ------------------------------
+# RCA documents share boilerplate (templates, escalation matrices, signatures).
+# Before a chunk is embedded, its MinHash signature is compared against a
+# persistent per-collection index. Whole chunks are compared: boilerplate
+# that shares a chunk with other text is still embedded.
+#
+#   <DEDUP_INDEX_DIR>/<collection>/
+#       signatures.npy - (N, DEDUP_NUM_PERM) uint32 MinHash signatures
+#       entries.json   - chunk ids and content hashes (row-aligned), plus
+#                        links {skipped chunk id: existing chunk id}
+#
+# - Candidates are found with LSH banding (DEDUP_BANDS bands), then accepted
+#   if their estimated Jaccard similarity is >= DEDUP_THRESHOLD.
+# - A near-duplicate of another chunk is skipped (no embedding call, no index
+#   entry) and linked to the chunk it duplicates. If the skipped id held
+#   other content before, the caller deletes that stale entry.
+# - A near-duplicate of the chunk with the same id (a re-upload with small
+#   edits) is re-embedded; an exact duplicate of it is skipped.
+# - Chunk ids are positional (chunk_<i>), so a later upload can overwrite a
+#   chunk that skipped chunks are linked to. Before that happens, the stored
+#   chunk is copied to one of the linked ids and the other links are moved
+#   to it (rehome_duplicates() in utils/chroma_utils.py), so its content
+#   stays in the collection without another embedding call.
+# - Chunks about to be overwritten by the current upload are never used as
+#   duplicate targets (pass them as 'exclude').
+# - Collections that existed before deduplication have no index yet; it is
+#   built from their stored documents on the first upload.
+
+_WORD = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64(4294967311)  # Smallest prime above 2**32
+
+# Fixed permutation parameters so signatures are stable across processes
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, 2 ** 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 2 ** 31, size=DEDUP_NUM_PERM, dtype=np.uint64)
+
+
+def content_hash(text):
+    """
+    Short hash of the exact (whitespace-normalized) chunk text.
+    """
+    return hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def minhash_signature(text, shingle_size=DEDUP_SHINGLE_SIZE):
+    """
+    MinHash signature (DEDUP_NUM_PERM uint32 values) of the word shingles of 'text'.
+    """
+    words = [w.lower() for w in _WORD.findall(text)]
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p for every permutation and shingle; a, x < 2**32 so no overflow
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash LSH index of the chunks stored in one collection.
+
+    Args:
+        collection_name (str): Collection the index belongs to.
+        directory (str): Root directory of all dedup indexes.
+    """
+
+    def __init__(self, collection_name, directory=DEDUP_INDEX_DIR):
+        self.path = os.path.join(directory, collection_name)
+        self.rows_per_band = DEDUP_NUM_PERM // DEDUP_BANDS
+        self.signatures = np.zeros((0, DEDUP_NUM_PERM), dtype=np.uint32)
+        self.ids = []
+        self.hashes = []
+        self.links = {}
+        self._row_of = {}
+        self._buckets = {}
+        self._pending = []
+        self._load()
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def _load(self):
+        entries_path = os.path.join(self.path, "entries.json")
+        if not os.path.exists(entries_path):
+            return
+        try:
+            with open(entries_path, encoding="utf-8") as f:
+                entries = json.load(f)
+            self.signatures = np.load(os.path.join(self.path, "signatures.npy"))
+            self.ids, self.hashes = entries["ids"], entries["hashes"]
+            self.links = entries.get("links", {})
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Dedup index at {self.path} unreadable, starting empty: {e}")
+            self.signatures = np.zeros((0, DEDUP_NUM_PERM), dtype=np.uint32)
+            self.ids, self.hashes, self.links = [], [], {}
+        for row, chunk_id in enumerate(self.ids):
+            if chunk_id is None:
+                continue  # Removed entry
+            self._row_of[chunk_id] = row
+            self._index_bands(row, self.signatures[row])
+
+    def exists(self):
+        """
+        True if the index has been saved to disk before.
+        """
+        return os.path.exists(os.path.join(self.path, "entries.json"))
+
+    def clear(self):
+        """
+        Empties the index (used when the collection itself is empty).
+        """
+        self.signatures = np.zeros((0, DEDUP_NUM_PERM), dtype=np.uint32)
+        self.ids, self.hashes, self.links = [], [], {}
+        self._row_of, self._buckets, self._pending = {}, {}, []
+
+    def save(self):
+        """
+        Writes the index to disk (atomic replace of both files).
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if self._pending:
+            self.signatures = np.vstack([self.signatures, np.stack(self._pending)])
+            self._pending = []
+        tmp = f".tmp.{os.getpid()}"
+        signatures_path = os.path.join(self.path, "signatures.npy")
+        entries_path = os.path.join(self.path, "entries.json")
+        with open(signatures_path + tmp, "wb") as f:
+            np.save(f, self.signatures)
+        with open(entries_path + tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "hashes": self.hashes, "links": self.links}, f)
+        os.replace(signatures_path + tmp, signatures_path)
+        os.replace(entries_path + tmp, entries_path)
+
+    # ------------------------------
+    # Lookup / update
+    # ------------------------------
+    def _bands(self, signature):
+        r = self.rows_per_band
+        return [(band, signature[band * r:(band + 1) * r].tobytes()) for band in range(DEDUP_BANDS)]
+
+    def _index_bands(self, row, signature):
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(row)
+
+    def _signature(self, row):
+        stored = len(self.signatures)
+        return self.signatures[row] if row < stored else self._pending[row - stored]
+
+    def contains(self, chunk_id):
+        """
+        True if 'chunk_id' is currently stored in the collection.
+        """
+        return chunk_id in self._row_of
+
+    def unchanged(self, chunk_id, text):
+        """
+        True if 'chunk_id' is stored with exactly this (whitespace-normalized) text.
+        """
+        row = self._row_of.get(chunk_id)
+        return row is not None and self.hashes[row] == content_hash(text)
+
+    def linked_to(self, chunk_id):
+        """
+        Ids that were skipped as duplicates of 'chunk_id'.
+        """
+        return [skipped for skipped, existing in self.links.items() if existing == chunk_id]
+
+    def find_duplicate(self, chunk_id, text, signature, exclude=()):
+        """
+        Returns the id of an existing chunk that 'text' duplicates, or None.
+
+        - An unchanged chunk (same id, same content) returns its own id.
+        - Exact duplicates (same content hash) of other chunks always match.
+        - Near-duplicates only match chunks with a different id.
+        - Ids in 'exclude' are never returned.
+        """
+        digest = content_hash(text)
+        if self.unchanged(chunk_id, text):
+            return chunk_id
+
+        candidates = {row for key in self._bands(signature) for row in self._buckets.get(key, ())}
+        best_id, best_score = None, DEDUP_THRESHOLD
+        for row in candidates:
+            if self.ids[row] is None or self.ids[row] == chunk_id or self.ids[row] in exclude:
+                continue
+            if self.hashes[row] == digest:
+                return self.ids[row]
+            score = float(np.mean(self._signature(row) == signature))
+            if score >= best_score:
+                best_id, best_score = self.ids[row], score
+        return best_id
+
+    def add(self, chunk_id, text, signature):
+        """
+        Records (or replaces) a stored chunk in the index.
+        """
+        self.links.pop(chunk_id, None)
+        self._set_row(chunk_id, content_hash(text), signature)
+
+    def _set_row(self, chunk_id, digest, signature):
+        row = self._row_of.get(chunk_id)
+        if row is not None and row < len(self.signatures):
+            # Replace in place; stale band entries are harmless (scores are re-checked)
+            self.signatures[row] = signature
+            self.hashes[row] = digest
+        elif row is not None:
+            self._pending[row - len(self.signatures)] = signature
+            self.hashes[row] = digest
+        else:
+            row = len(self.ids)
+            self.ids.append(chunk_id)
+            self.hashes.append(digest)
+            self._pending.append(signature)
+            self._row_of[chunk_id] = row
+        self._index_bands(row, signature)
+
+    def remove(self, chunk_id):
+        """
+        Forgets a chunk that was deleted from the collection.
+        """
+        row = self._row_of.pop(chunk_id, None)
+        if row is not None:
+            self.ids[row] = None
+            self.hashes[row] = None
+
+    def link(self, chunk_id, existing_id):
+        """
+        Records that 'chunk_id' was skipped as a duplicate of 'existing_id'.
+        """
+        if existing_id != chunk_id:
+            self.links[chunk_id] = existing_id
+
+    def unlink(self, chunk_id):
+        """
+        Forgets the links to 'chunk_id' and returns the ids that had them.
+        """
+        linked = self.linked_to(chunk_id)
+        for skipped in linked:
+            del self.links[skipped]
+        return linked
+
+    def move_links(self, chunk_id, holder_id):
+        """
+        Records that 'holder_id' (one of the ids linked to 'chunk_id') now
+        stores chunk_id's content, and links the other skipped ids to it.
+        """
+        row = self._row_of[chunk_id]
+        for skipped in self.unlink(chunk_id):
+            if skipped != holder_id:
+                self.links[skipped] = holder_id
+        self._set_row(holder_id, self.hashes[row], self._signature(row).copy())
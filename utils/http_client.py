@@ -0,0 +1,39 @@
+import httpx
+from utils.logger import log
+
+# ------------------------------
+# Shared HTTP client (connection pool)
+# ------------------------------
+# - One AsyncClient per worker process, reused by every request.
+# - Keeps TCP/TLS connections to the Ollama embedding and chat endpoints
+#   alive instead of paying a new handshake on every call.
+# - Opened during the startup warm-up and closed on shutdown (see app.py).
+_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the worker-wide pooled httpx.AsyncClient, creating it on first use.
+
+    - Default timeout is 60 seconds (same as the previous per-call clients).
+    - Connection limits keep a small pool of warm keep-alive connections.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        log.info("Opened pooled HTTP client")
+    return _client
+
+
+async def close_http_client():
+    """
+    Closes the pooled HTTP client (called on application shutdown).
+    """
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        log.info("Closed pooled HTTP client")
+    _client = None
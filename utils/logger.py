@@ -1,69 +1,228 @@
-import logging
-from logging.handlers import TimedRotatingFileHandler
-import os
-from settings import LOG_DIR, LOG_FILENAME
-
-# ------------------------------
-# Ensure log directory exists
-# ------------------------------
-# - If LOG_DIR does not exist, create it.
-# - Ensures that the log files can be written without errors.
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Full log file path
-# Example: /var/log/czentrix/auto_create_ticket.log
-LOG_FILE = os.path.join(LOG_DIR, LOG_FILENAME)
-
-# ------------------------------
-# Create main logger
-# ------------------------------
-# - Name the logger "auto_create_ticket" to distinguish logs if multiple loggers exist.
-# - Set default logging level to INFO (will capture INFO, WARNING, ERROR, CRITICAL).
-log = logging.getLogger("auto_create_ticket")
-log.setLevel(logging.INFO)
-
-# ------------------------------
-# Define log format
-# ------------------------------
-# Format: timestamp - logger name - level - line number - message
-# Example: 2025-09-18 13:20:15,123 - auto_create_ticket - INFO - 42 - Starting app...
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s'
-)
-
-# ------------------------------
-# File Handler (Rotating Logs)
-# ------------------------------
-# - Writes logs to a file.
-# - Rotates daily at midnight.
-# - Keeps 7 backup files (old logs are kept for 7 days).
-# - Encoding set to UTF-8 to support all characters.
-file_handler = TimedRotatingFileHandler(
-    LOG_FILE, when="midnight", interval=1, backupCount=7, encoding="utf-8"
-)
-file_handler.setFormatter(formatter)  # Apply formatter to file logs
-file_handler.setLevel(logging.INFO)   # Only log INFO and above to file
-
-# ------------------------------
-# Console Handler (stdout logs)
-# ------------------------------
-# - Prints logs to the console.
-# - Useful during development or debugging to see logs in real time.
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)  # Apply formatter to console logs
-console_handler.setLevel(logging.INFO)   # Only log INFO and above to console
-
-# ------------------------------
-# Attach handlers to the logger
-# ------------------------------
-# - Prevent duplicate logs if this module is imported multiple times.
-if not log.handlers:
-    log.addHandler(file_handler)
-    log.addHandler(console_handler)
-
-# ------------------------------
-# Usage Examples
-# ------------------------------
-# log.info("App started successfully")
-# log.warning("This is a warning")
-# log.error("An error occurred", exc_info=True)
+import atexit
+import contextvars
+import copy
+import json
+import logging
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from settings import (
+    LOG_DIR, LOG_FILENAME, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_INFO_SAMPLE_RATE, LOG_EVENT_SAMPLE_RATES
+)
+
+# ------------------------------
+# Ensure log directory exists
+# ------------------------------
+# - If LOG_DIR does not exist, create it.
+# - Ensures that the log files can be written without errors.
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# Full log file path
+# Example: /var/log/czentrix/auto_create_ticket.log
+LOG_FILE = os.path.join(LOG_DIR, LOG_FILENAME)
+
+# ------------------------------
+# Request context
+# ------------------------------
+# - Holds request_id, session_id and stage timings of the current request.
+# - A mutable dict is stored so values set inside an endpoint are visible to
+#   the middleware that created it (see app.py).
+_log_context = contextvars.ContextVar("log_context", default=None)
+
+
+def new_log_context(request_id):
+    """
+    Starts a fresh log context for a request and returns it.
+    """
+    context = {"request_id": request_id, "session_id": None, "stages": {}, "counters": {}}
+    _log_context.set(context)
+    return context
+
+
+def set_log_context(**fields):
+    """
+    Adds fields (e.g. session_id=...) to the current request's log context.
+    """
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def add_log_counter(name, value=1):
+    """
+    Adds 'value' to a per-request counter (e.g. tokens saved) that is
+    reported with the request's "request_completed" line.
+    """
+    context = _log_context.get()
+    if context is not None:
+        context["counters"][name] = context["counters"].get(name, 0) + value
+
+
+@contextmanager
+def log_stage(name):
+    """
+    Times a block of code and records it under 'name' in the request's
+    stage timings (milliseconds).
+
+    Example:
+        with log_stage("retrieve"):
+            results = await retrieve_documents(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        context = _log_context.get()
+        if context is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            context["stages"][name] = round(context["stages"].get(name, 0) + elapsed, 2)
+
+
+# ------------------------------
+# JSON formatter
+# ------------------------------
+# One JSON object per line. Example:
+# {"ts": "2025-09-18T13:20:15.123", "level": "INFO", "logger": "auto_create_ticket",
+#  "line": 42, "message": "Starting app...", "request_id": "...", "session_id": "..."}
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON with request context and extras.
+    """
+
+    # Attributes every LogRecord has; anything else was passed via extra={...}
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        context = getattr(record, "log_context", None)
+        if context:
+            data["request_id"] = context.get("request_id")
+            data["session_id"] = context.get("session_id")
+        for key, value in vars(record).items():
+            if key not in self._RESERVED and key != "log_context":
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+# ------------------------------
+# Non-blocking queue handler
+# ------------------------------
+# - The request path only puts the record on an in-memory queue.
+# - A background QueueListener thread does the file and console writes, so a
+#   slow or stalled disk never adds latency to a request.
+# - If the queue is full the record is dropped (and counted) instead of blocking.
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that samples INFO events, snapshots the request context
+    and drops records when the queue is full.
+    """
+
+    dropped = 0
+
+    def filter(self, record):
+        if record.levelno == logging.INFO:
+            rate = LOG_EVENT_SAMPLE_RATES.get(getattr(record, "event", None), LOG_INFO_SAMPLE_RATE)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        return super().filter(record)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (they may reference objects
+        # that change later) but leave the final formatting to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        context = _log_context.get()
+        if context is not None:
+            # Copy so later changes to the context don't alter queued records
+            record.log_context = {"request_id": context["request_id"],
+                                  "session_id": context["session_id"]}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+# ------------------------------
+# Create main logger
+# ------------------------------
+# - Name the logger "auto_create_ticket" to distinguish logs if multiple loggers exist.
+# - Set default logging level to INFO (will capture INFO, WARNING, ERROR, CRITICAL).
+log = logging.getLogger("auto_create_ticket")
+log.setLevel(logging.INFO)
+
+# ------------------------------
+# Define log format
+# ------------------------------
+# LOG_FORMAT = "json": structured JSON lines (default)
+# LOG_FORMAT = "text": timestamp - logger name - level - line number - message
+# Example: 2025-09-18 13:20:15,123 - auto_create_ticket - INFO - 42 - Starting app...
+if LOG_FORMAT == "json":
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s'
+    )
+
+# ------------------------------
+# File Handler (Rotating Logs)
+# ------------------------------
+# - Writes logs to a file.
+# - Rotates daily at midnight.
+# - Keeps 7 backup files (old logs are kept for 7 days).
+# - Encoding set to UTF-8 to support all characters.
+file_handler = TimedRotatingFileHandler(
+    LOG_FILE, when="midnight", interval=1, backupCount=7, encoding="utf-8"
+)
+file_handler.setFormatter(formatter)  # Apply formatter to file logs
+file_handler.setLevel(logging.INFO)   # Only log INFO and above to file
+
+# ------------------------------
+# Console Handler (stdout logs)
+# ------------------------------
+# - Prints logs to the console.
+# - Useful during development or debugging to see logs in real time.
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(formatter)  # Apply formatter to console logs
+console_handler.setLevel(logging.INFO)   # Only log INFO and above to console
+
+# ------------------------------
+# Attach handlers to the logger
+# ------------------------------
+# - The logger only has the queue handler; the listener thread owns the
+#   file and console handlers.
+# - Prevent duplicate logs if this module is imported multiple times.
+if not log.handlers:
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    log.addHandler(NonBlockingQueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush remaining records on exit
+
+# ------------------------------
+# Usage Examples
+# ------------------------------
+# log.info("App started successfully")
+# log.warning("This is a warning")
+# log.error("An error occurred", exc_info=True)
+# log.info("request_completed", extra={"event": "request_completed", "total_ms": 12.5})
@@ -0,0 +1,202 @@
+import html
+import re
+
+from settings import MAIL_NORMALIZATION
+# Same token estimate and paragraph split as chunking, so truncation and chunk sizes agree
+from utils.chunking import estimate_tokens, _PARAGRAPH_BREAK, _TOKEN
+
+# ------------------------------
+# Mail normalization
+# ------------------------------
+# Ticket mails arrive as raw bodies: HTML remnants, the whole quoted reply
+# chain, signatures and legal disclaimers. None of it helps retrieval, and all
+# of it is embedded and sent to the LLM (together with the last three past
+# messages). Before embedding and prompting, normalize_mail():
+#
+# 1. converts HTML to text (drops <style>/<script>, tags and entities),
+# 2. cuts the quoted history at the first reply marker ("On ... wrote:",
+#    "-----Original Message-----", an Outlook "From:/Sent:" header block whose
+#    subject is a reply, or a run of "> " lines). Forwarded messages are the
+#    ticket itself: only their "Forwarded message" header lines are dropped,
+#    their content is kept,
+# 3. cuts the signature at a sign-off ("Regards,", "-- ", "Sent from my ...")
+#    found in the last lines of what is left,
+# 4. drops disclaimer paragraphs at the end of the mail, i.e. trailing
+#    paragraphs matching at least two disclaimer phrases ("intended
+#    recipient", "if you have received this ... in error", ...), so a single
+#    word such as "confidential" or "privileged" in the issue text is kept,
+# 5. removes "RE:/FW:" prefixes from the subject and collapses whitespace,
+# 6. truncates the body to 'max_tokens' estimated tokens.
+#
+# Every step can be switched off in MAIL_NORMALIZATION. All patterns are
+# precompiled and each step is a single pass over the text.
+
+_HTML_HINT = re.compile(r"<(?:html|body|div|p|br|table|span|font)\b", re.IGNORECASE)
+_HTML_DROP = re.compile(r"<(style|script|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_BREAK = re.compile(r"<\s*(?:br|/p|/div|/tr|/li|/h\d)\s*/?>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+_QUOTE_MARKERS = re.compile(
+    r"^[ \t]*(?:"
+    r"On\s.{0,200}?\swrote:"                               # Gmail / Apple Mail
+    r"|-{2,}\s*Original Message\s*-{2,}"                   # Outlook
+    r"|(?:_{10,}[ \t]*\n[ \t]*)?From:\s.+\n(?:[ \t]*(?:Sent|Date|To|Cc):.*\n){0,4}"
+    r"[ \t]*Subject:[ \t]*(?:re|aw|antw)\s*:"                # Outlook reply header block
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+# Forward header: the marker line plus the From/Date/Subject/To/Cc lines after it
+_FORWARD_HEADER = re.compile(
+    r"^[ \t]*(?:-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:)[ \t]*\n"
+    r"(?:[ \t]*(?:From|Sent|Date|To|Cc|Subject):.*\n?)*",
+    re.IGNORECASE | re.MULTILINE
+)
+_QUOTED_LINES = re.compile(r"^(?:[ \t]*>.*(?:\n|$)){2,}", re.MULTILINE)
+
+_SIGN_OFF = re.compile(
+    r"^[ \t]*(?:--[ \t]*$|(?:thanks(?: and| &)? |best |kind |warm |with )?regards\b.*$"
+    r"|sent from my \w+.*$|cheers,?[ \t]*$)",
+    re.IGNORECASE | re.MULTILINE
+)
+# A paragraph is a disclaimer only if it matches at least two of these
+_DISCLAIMER_PHRASES = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"\bdisclaimer\b",
+    r"\bintended (?:solely )?for the (?:use of the )?(?:individual|addressee|recipient)",
+    r"\bintended recipient",
+    r"\bif you (?:have|are not|received)\b.{0,40}\b(?:received|recipient)\b.{0,40}\b(?:in error|by mistake)",
+    r"\bconfidential\b.{0,120}\bprivileged\b|\bprivileged\b.{0,120}\bconfidential\b",
+    r"\b(?:notify|inform) the sender\b",
+    r"\bunauthori[sz]ed (?:use|disclosure|review|copying|distribution)",
+    r"\bvirus(?:es)? (?:free|scan)",
+    r"\bplease consider the environment\b",
+))
+_SUBJECT_PREFIX = re.compile(r"^(?:\s*(?:re|fw|fwd|aw|wg)\s*(?:\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+_SPACES = re.compile(r"[ \t\xa0]+")
+_LINE_EDGES = re.compile(r"[ \t]*\n[ \t]*")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def html_to_text(text):
+    """
+    Converts an HTML mail body to plain text (line breaks kept).
+    """
+    text = _HTML_DROP.sub(" ", text)
+    text = _HTML_BREAK.sub("\n", text)
+    text = _HTML_TAG.sub(" ", text)
+    return html.unescape(text)
+
+
+def strip_quoted_history(text):
+    """
+    Removes the quoted reply chain: everything from the first reply marker
+    on, and any remaining blocks of "> " lines. Forwarded content is kept
+    without its "Forwarded message" header lines.
+    """
+    text = _FORWARD_HEADER.sub("", text)
+    match = _QUOTE_MARKERS.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()]
+    return _QUOTED_LINES.sub("", text)
+
+
+def strip_signature(text, search_lines=12):
+    """
+    Cuts the text at the first sign-off found in its final 'search_lines' lines.
+    """
+    lines = text.rstrip().split("\n")
+    tail_start = max(len(lines) - search_lines, 1)  # Never cut the first line
+    tail = "\n".join(lines[tail_start:])
+    offset = len(text.rstrip()) - len(tail)
+    match = _SIGN_OFF.search(tail)  # First sign-off in the tail; the rest is signature
+    if match is None:
+        return text
+    return text[:offset + match.start()]
+
+
+def is_disclaimer(paragraph, min_chars=80):
+    """
+    True if a paragraph of at least 'min_chars' characters matches two or
+    more disclaimer phrases.
+    """
+    if len(paragraph) < min_chars:
+        return False
+    return sum(1 for phrase in _DISCLAIMER_PHRASES if phrase.search(paragraph)) >= 2
+
+
+def strip_disclaimers(text, min_chars=80):
+    """
+    Drops legal/confidentiality disclaimer paragraphs from the end of the
+    mail. Paragraphs before the last non-disclaimer paragraph are never
+    removed, so the issue description is kept even if it mentions
+    "confidential" or "privileged".
+    """
+    paragraphs = _PARAGRAPH_BREAK.split(text)
+    end = len(paragraphs)
+    while end > 1 and (not paragraphs[end - 1].strip() or is_disclaimer(paragraphs[end - 1], min_chars)):
+        end -= 1
+    return "\n\n".join(paragraphs[:end])
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    Cuts text after 'max_tokens' estimated tokens.
+    """
+    for count, match in enumerate(_TOKEN.finditer(text), 1):
+        if count > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def clean_subject(subject):
+    """
+    Removes reply/forward prefixes ("RE: FW: ...") from a subject line.
+    """
+    return _SPACES.sub(" ", _SUBJECT_PREFIX.sub("", subject or "")).strip()
+
+
+def normalize_body(body, config=None):
+    """
+    Applies the enabled normalization steps to a mail body.
+    """
+    config = {**MAIL_NORMALIZATION, **(config or {})}
+    text = (body or "").replace("\r\n", "\n").replace("\r", "\n")
+    if not config["enabled"]:
+        return text
+    if config["strip_html"] and _HTML_HINT.search(text):
+        text = html_to_text(text)
+    if config["strip_quoted"]:
+        text = strip_quoted_history(text)
+    if config["strip_signature"]:
+        text = strip_signature(text)
+    if config["strip_disclaimers"]:
+        text = strip_disclaimers(text, config["disclaimer_min_chars"])
+    text = _LINE_EDGES.sub("\n", _SPACES.sub(" ", text))
+    text = _BLANK_LINES.sub("\n\n", text).strip()
+    if config["max_tokens"]:
+        text = truncate_tokens(text, config["max_tokens"])
+    return text
+
+
+def normalize_mail(subject, body, config=None):
+    """
+    Builds the query text ("subject\\nbody") from a raw mail.
+
+    Args:
+        subject (str): Mail subject.
+        body (str): Raw mail body (plain text or HTML).
+        config (dict, optional): Overrides for MAIL_NORMALIZATION.
+
+    Returns:
+        tuple: (query_text, stats) where stats has the estimated tokens of the
+               raw and normalized text and the tokens saved.
+    """
+    raw = (subject or "") + "\n" + (body or "")
+    enabled = {**MAIL_NORMALIZATION, **(config or {})}["enabled"]
+    text = (clean_subject(subject) if enabled else subject or "") + "\n" + normalize_body(body, config)
+    tokens_before = estimate_tokens(raw)
+    tokens_after = estimate_tokens(text)
+    return text, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
@@ -0,0 +1,101 @@
+from settings import (
+    BITNET_MODEL_NAME, BITNET_KEEP_ALIVE, BITNET_OPTIONS, BITNET_NUM_CTX_BUCKETS,
+    BITNET_RESPONSE_TOKENS, BITNET_ALLOWED_OPTIONS
+)
+from utils.chunking import estimate_tokens
+from utils.logger import log
+
+# ------------------------------
+# Ollama /api/chat payloads
+# ------------------------------
+# - Messages are [system, user]: the static instructions come first and are
+#   byte-identical across requests, so the backend can reuse the cached
+#   prompt prefix.
+# - "keep_alive" keeps the model loaded between bursts (BITNET_KEEP_ALIVE).
+# - "num_ctx" is sized to the prompt: the smallest of BITNET_NUM_CTX_BUCKETS
+#   that fits the prompt plus BITNET_RESPONSE_TOKENS. Ollama's own default
+#   window is small enough to silently truncate long contexts, and a
+#   different num_ctx on every request would reload the model, hence buckets.
+# - Clients can override keep_alive and BITNET_ALLOWED_OPTIONS per request
+#   with "llm_options" in the request body.
+
+# estimate_tokens() approximates the embedding tokenizer; leave headroom for
+# the chat model's tokenizer and chat template.
+_TOKEN_MARGIN = 1.15
+
+
+def size_num_ctx(messages, response_tokens=BITNET_RESPONSE_TOKENS):
+    """
+    Returns the smallest num_ctx bucket that fits the messages plus the answer.
+    """
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    needed = int(prompt_tokens * _TOKEN_MARGIN) + response_tokens
+    for bucket in sorted(BITNET_NUM_CTX_BUCKETS):
+        if needed <= bucket:
+            return bucket
+    log.warning(f"Prompt needs ~{needed} tokens, more than the largest num_ctx bucket")
+    return max(BITNET_NUM_CTX_BUCKETS)
+
+
+def validate_llm_options(llm_options):
+    """
+    Checks client "llm_options" before any work is done.
+
+    Raises:
+        ValueError: 'llm_options' is not an object, or "num_ctx" is not a
+            positive integer.
+    """
+    if llm_options is None:
+        return
+    if not isinstance(llm_options, dict):
+        raise ValueError("llm_options must be an object")
+    if "num_ctx" in llm_options:
+        value = llm_options["num_ctx"]
+        if isinstance(value, bool) or not isinstance(value, (int, str)) \
+                or not str(value).strip().isdigit() or int(value) <= 0:
+            raise ValueError(f"llm_options.num_ctx must be a positive integer, got {value!r}")
+
+
+def build_chat_payload(system_prompt, user_prompt, llm_options=None, format_schema=None):
+    """
+    Builds the /api/chat request body.
+
+    Args:
+        system_prompt (str): Static instructions (stable prefix).
+        user_prompt (str): Per-request context and question.
+        llm_options (dict, optional): Client overrides, e.g.
+            {"keep_alive": "1h", "num_ctx": 8192, "temperature": 0}.
+            Unknown option names are ignored.
+        format_schema (dict, optional): JSON schema the answer must follow
+            (Ollama structured outputs).
+
+    Returns:
+        dict: JSON payload for the chat endpoint.
+    """
+    validate_llm_options(llm_options)
+    llm_options = dict(llm_options or {})
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    keep_alive = llm_options.pop("keep_alive", BITNET_KEEP_ALIVE)
+
+    ignored = [name for name in llm_options if name not in BITNET_ALLOWED_OPTIONS]
+    if ignored:
+        log.warning(f"Ignoring unsupported llm_options: {ignored}")
+    options = {**BITNET_OPTIONS, "num_ctx": size_num_ctx(messages)}
+    options.update({k: v for k, v in llm_options.items() if k in BITNET_ALLOWED_OPTIONS})
+    if "num_ctx" in llm_options:
+        options["num_ctx"] = min(int(options["num_ctx"]), max(BITNET_NUM_CTX_BUCKETS))
+
+    payload = {
+        "model": BITNET_MODEL_NAME,
+        "messages": messages,
+        "stream": False,
+        "think": False,
+        "keep_alive": keep_alive,
+        "options": options,
+    }
+    if format_schema is not None:
+        payload["format"] = format_schema
+    return payload
@@ -0,0 +1,94 @@
+import re
+import threading
+
+from settings import (
+    RELEVANCE_MAX_DISTANCE, RELEVANCE_MAX_DISTANCE_PER_COLLECTION,
+    SMALL_TALK_ENABLED, SMALL_TALK_WORDS, SMALL_TALK_MAX_WORDS
+)
+from utils.logger import log, add_log_counter
+
+# ------------------------------
+# Relevance short-circuit
+# ------------------------------
+# Both prompts already define fixed replies for "nothing relevant found" and
+# for greetings, but the LLM was called to produce them. These checks return
+# the fixed reply directly instead:
+#
+# - Retrieved chunks farther than the collection's relevance threshold
+#   (RELEVANCE_MAX_DISTANCE / RELEVANCE_MAX_DISTANCE_PER_COLLECTION) are
+#   dropped. If chunks were retrieved and the threshold dropped all of them,
+#   there is nothing for the LLM to extract from. An empty lookup is not
+#   short-circuited, and a failed one is an error (see RetrievalError).
+# - A /solution-chat message made only of greeting words (SMALL_TALK_WORDS)
+#   is answered before history lookup, embedding and retrieval.
+#
+# Skipped LLM calls are counted per endpoint and reason, reported in the
+# request log ("llm_calls_avoided") and at GET /metrics/short-circuit.
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SMALL_TALK = frozenset(word.lower() for word in SMALL_TALK_WORDS)
+
+_stats_lock = threading.Lock()
+short_circuit_stats = {}
+
+
+def relevance_threshold(collection_name):
+    """
+    Maximum distance of a relevant chunk for a collection (None = no limit).
+    """
+    return RELEVANCE_MAX_DISTANCE_PER_COLLECTION.get(collection_name, RELEVANCE_MAX_DISTANCE)
+
+
+def filter_relevant(documents, distances, collection_name):
+    """
+    Drops retrieved documents beyond the collection's relevance threshold.
+
+    Args:
+        documents (list): Retrieved document texts, closest first.
+        distances (list): Their distances to the query.
+        collection_name (str): Collection the documents came from.
+
+    Returns:
+        list: The documents within the threshold (all of them if no
+              threshold is configured). Empty only if 'documents' is empty
+              or a threshold dropped every document.
+    """
+    threshold = relevance_threshold(collection_name)
+    if threshold is None:
+        return list(documents)
+    kept = [doc for doc, distance in zip(documents, distances) if distance <= threshold]
+    if len(kept) < len(documents):
+        log.info(f"Dropped {len(documents) - len(kept)} of {len(documents)} retrieved chunks "
+                 f"beyond distance {threshold} in '{collection_name}'")
+    return kept
+
+
+def is_small_talk(text):
+    """
+    True if 'text' is only a short greeting such as "hi", "Hello Zeni!" or "thanks".
+    """
+    if not SMALL_TALK_ENABLED or not text:
+        return False
+    words = _NON_WORD.sub(" ", text.lower()).split()
+    return 0 < len(words) <= SMALL_TALK_MAX_WORDS and all(word in _SMALL_TALK for word in words)
+
+
+def record_llm_skipped(endpoint, reason):
+    """
+    Counts an LLM call that was answered with a fixed reply instead.
+    'reason' is "no_relevant_context" or "small_talk".
+    """
+    with _stats_lock:
+        counters = short_circuit_stats.setdefault(endpoint, {})
+        counters[reason] = counters.get(reason, 0) + 1
+    add_log_counter("llm_calls_avoided")
+    log.info(f"Answered {endpoint} without LLM call ({reason})",
+             extra={"event": "llm_short_circuit", "endpoint": endpoint, "reason": reason})
+
+
+def short_circuit_metrics():
+    """
+    LLM calls avoided per endpoint and reason for this worker.
+    """
+    with _stats_lock:
+        return {endpoint: dict(counters) for endpoint, counters in short_circuit_stats.items()}
@@ -1,65 +1,177 @@
-import traceback
-import warnings
-from utils.chroma_utils import get_embeddings  # Function to generate vector embeddings
-from utils.logger import log  # Custom logger instance
-
-# Suppress unwanted warnings for cleaner logs
-warnings.filterwarnings('ignore')
-
-
-async def retrieve_documents(question, collection, top_k=2):
-    """
-    Retrieve relevant documents from ChromaDB based on the input question.
-
-    Steps:
-    1. Generate a vector embedding for the input question using the embedding model.
-    2. Query the ChromaDB collection for the top_k most similar documents.
-    3. Extract the actual document text from the query results.
-
-    Args:
-        question (str): The input query/question from the user.
-        collection: ChromaDB collection object to search against.
-        top_k (int, optional): Number of top documents to retrieve. Defaults to 2.
-
-    Returns:
-        list: List of retrieved document texts.
-              Returns an empty list if no documents found or if an error occurs.
-    """
-    try:
-        # ------------------------------
-        # Step 1: Generate embedding
-        # ------------------------------
-        # Converts the question into a numerical vector for semantic similarity search
-        question_embedding = await get_embeddings(question)
-
-        # ------------------------------
-        # Step 2: Query ChromaDB collection
-        # ------------------------------
-        # n_results specifies how many closest documents to return
-        results = collection.query(
-            query_embeddings=[question_embedding],
-            n_results=top_k
-        )
-
-        # ------------------------------
-        # Step 3: Extract document texts
-        # ------------------------------
-        documents = []
-        if "documents" in results and results["documents"]:
-            # results["documents"][0] contains the list of document texts
-            for i in range(len(results["ids"][0])):
-                documents.append(results["documents"][0][i])
-        else:
-            # Warn if no documents found
-            log.warning("No documents found for the given query.")
-
-        return documents
-
-    except Exception as e:
-        # ------------------------------
-        # Error handling
-        # ------------------------------
-        # Logs the error message and prints traceback for debugging
-        log.error(f"Error in retrieve_documents: {e}")
-        traceback.print_exc()
-        return []
+import re
+import warnings
+from utils.chroma_utils import get_embeddings, get_embeddings_batch  # Functions to generate vector embeddings
+from utils.logger import log  # Custom logger instance
+from utils.vector_mirror import ensure_vector_mirror  # Optional in-memory read path
+
+# Suppress unwanted warnings for cleaner logs
+warnings.filterwarnings('ignore')
+
+
+class RetrievalError(Exception):
+    """
+    Raised when a question could not be embedded or the collection could
+    not be queried (as opposed to a lookup that found nothing).
+    """
+
+
+async def retrieve_documents(question, collection, top_k=2, with_distances=False):
+    """
+    Retrieve relevant documents from ChromaDB based on the input question.
+
+    Steps:
+    1. Generate a vector embedding for the input question using the embedding model.
+    2. Query the ChromaDB collection for the top_k most similar documents.
+       Collections listed in VECTOR_MIRROR_COLLECTIONS are answered from the
+       in-memory vector mirror instead of Chroma's persistence layer.
+    3. Extract the actual document text (and distance) from the query results.
+
+    Args:
+        question (str): The input query/question from the user.
+        collection: ChromaDB collection object to search against.
+        top_k (int, optional): Number of top documents to retrieve. Defaults to 2.
+        with_distances (bool, optional): Also return each document's distance
+            to the question (lower is closer), e.g. for a relevance threshold.
+
+    Returns:
+        list: List of retrieved document texts (empty if nothing was found).
+        With with_distances=True: (documents, distances), two lists in the same order.
+
+    Raises:
+        RetrievalError: Embedding or querying failed.
+    """
+    try:
+        # ------------------------------
+        # Step 1: Generate embedding
+        # ------------------------------
+        # Converts the question into a numerical vector for semantic similarity search
+        question_embedding = await get_embeddings(question)
+        if not question_embedding:
+            raise RetrievalError("Embedding the question failed")
+
+        # ------------------------------
+        # Step 2: Query ChromaDB collection
+        # ------------------------------
+        # n_results specifies how many closest documents to return
+        mirror = await ensure_vector_mirror(collection)
+        if mirror is not None:
+            results = mirror.query(question_embedding, top_k=top_k)
+        else:
+            results = collection.query(
+                query_embeddings=[question_embedding],
+                n_results=top_k
+            )
+
+        # ------------------------------
+        # Step 3: Extract document texts
+        # ------------------------------
+        documents, distances = [], []
+        if "documents" in results and results["documents"]:
+            # results["documents"][0] contains the list of document texts
+            for i in range(len(results["ids"][0])):
+                documents.append(results["documents"][0][i])
+            distances = list((results.get("distances") or [[]])[0])
+        else:
+            # Warn if no documents found
+            log.warning("No documents found for the given query.")
+
+        if with_distances:
+            return documents, distances
+        return documents
+
+    except RetrievalError:
+        raise
+    except Exception as e:
+        # ------------------------------
+        # Error handling
+        # ------------------------------
+        # Logs the error message with traceback for debugging
+        log.error(f"Error in retrieve_documents: {e}", exc_info=True)
+        raise RetrievalError(f"Retrieval failed: {e}") from e
+
+
+async def retrieve_documents_batch(questions, collection, top_k=2, with_distances=False):
+    """
+    Retrieve relevant documents for many questions at once (batch triage).
+
+    Steps:
+    1. Embed all questions concurrently (see get_embeddings_batch).
+    2. Query the collection once with all embeddings (or the vector mirror,
+       one lookup per question).
+    3. Extract the document texts (and distances) per question.
+
+    Args:
+        questions (list): Input queries, one per mail.
+        collection: ChromaDB collection object to search against.
+        top_k (int, optional): Number of top documents per question. Defaults to 2.
+        with_distances (bool, optional): Also return the distances.
+
+    Returns:
+        list: One list of document texts per question, in input order.
+              A question whose embedding failed gets None (not an empty
+              list, which means nothing was found).
+        With with_distances=True: (documents, distances), each a list per question.
+
+    Raises:
+        RetrievalError: The collection could not be queried.
+    """
+    documents = [None for _ in questions]
+    distances = [None for _ in questions]
+    result = (documents, distances) if with_distances else documents
+    try:
+        # ------------------------------
+        # Step 1: Generate embeddings
+        # ------------------------------
+        embeddings = await get_embeddings_batch(list(questions))
+        positions = [i for i, vector in enumerate(embeddings) if vector]
+        if len(positions) < len(questions):
+            log.warning(f"{len(questions) - len(positions)} of {len(questions)} batch embeddings failed")
+        if not positions:
+            return result
+
+        # ------------------------------
+        # Step 2: Query ChromaDB collection
+        # ------------------------------
+        mirror = await ensure_vector_mirror(collection)
+        if mirror is not None:
+            lookups = [mirror.query(embeddings[i], top_k=top_k)
+                       for i in positions]
+            per_question = [lookup["documents"][0] for lookup in lookups]
+            per_question_distances = [lookup["distances"][0] for lookup in lookups]
+        else:
+            results = collection.query(
+                query_embeddings=[embeddings[i] for i in positions],
+                n_results=top_k
+            )
+            per_question = results.get("documents") or [[] for _ in positions]
+            per_question_distances = results.get("distances") or [[] for _ in positions]
+
+        # ------------------------------
+        # Step 3: Extract document texts
+        # ------------------------------
+        for i, docs, dists in zip(positions, per_question, per_question_distances):
+            documents[i] = list(docs)
+            distances[i] = list(dists)
+        return result
+
+    except Exception as e:
+        log.error(f"Error in retrieve_documents_batch: {e}", exc_info=True)
+        raise RetrievalError(f"Retrieval failed: {e}") from e
+
+
+def extract_relevant_data(input_text):
+    """
+    Extract relevant section from input text based on patterns.
+    Used by app.py to build the prompt context from the retrieved chunks.
+
+    1. Look for text between "---" markers.
+    2. Fallback: Look for text starting with "Main Issue:".
+    """
+    pattern1 = r'---\s*(.*?)\s*---'
+    matches = re.findall(pattern1, input_text, re.DOTALL)
+
+    if not matches:
+        pattern2 = r'Main Issue:.*?---'
+        matches = re.findall(pattern2, input_text, re.DOTALL)
+
+    return matches[0].strip() if matches else None
@@ -0,0 +1,290 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from settings import OLLAMA_MODEL_NAME, SNAPSHOT_BATCH_SIZE, DEDUP_ENABLED
+from utils.chroma_utils import rehome_duplicates, remove_orphan_segments, upsert_records
+from utils.collection_lock import collection_write_lock_sync, publish_collection_id
+from utils.dedup import NearDuplicateIndex, minhash_signature
+from utils.logger import log
+from utils.vector_mirror import VectorMirror, is_mirrored, release_vector_mirror
+
+# ------------------------------
+# Collection snapshots
+# ------------------------------
+# A portable copy of one collection, so a new node can be provisioned without
+# extracting and re-embedding every document:
+#
+#   <snapshot>/
+#       manifest.json      - collection name and metadata, entry count,
+#                            embedding dimension and model, file checksums
+#       embeddings.npy     - (N, dim) float32 matrix, row i belongs to record i
+#       records.jsonl.gz   - one {"id", "document", "metadata"} object per line
+#
+# Export reads the collection page by page and writes the embeddings straight
+# into a memory-mapped .npy file. Import memory-maps the matrix and upserts
+# SNAPSHOT_BATCH_SIZE rows at a time with the stored embeddings, then rebuilds
+# the collection's dedup index and vector mirror from the same data. Nothing
+# is written before the matrix and records are checked against the manifest,
+# and a replacing import loads into "<collection>__import", which takes the
+# live collection's place only once every row is in.
+
+FORMAT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot is missing, incomplete or incompatible.
+    """
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _batch_size(client, batch_size):
+    """
+    Caps the batch size at the largest batch the Chroma client accepts.
+    """
+    try:
+        return min(batch_size, client.get_max_batch_size())
+    except Exception:
+        return batch_size
+
+
+def export_collection(collection, path, batch_size=SNAPSHOT_BATCH_SIZE):
+    """
+    Writes a snapshot of 'collection' to the directory 'path'.
+
+    Steps:
+    1. Read IDs, documents, metadata and embeddings page by page, holding
+       the collection's write lock so uploads cannot change it meanwhile.
+    2. Write embeddings into a memory-mapped embeddings.npy and records
+       into records.jsonl.gz as they are read.
+    3. Write manifest.json (last, so an interrupted export is never valid).
+
+    Returns:
+        dict: The manifest.
+    """
+    start = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    embeddings_path = os.path.join(path, "embeddings.npy")
+    records_path = os.path.join(path, "records.jsonl.gz")
+    manifest_path = os.path.join(path, "manifest.json")
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    # Entries must not change while they are read page by page
+    with collection_write_lock_sync(collection.name):
+        total = collection.count()
+        matrix = None
+        written = 0
+        with gzip.open(records_path, "wt", encoding="utf-8", compresslevel=6) as records:
+            for offset in range(0, total, batch_size):
+                page = collection.get(limit=batch_size, offset=offset,
+                                      include=["embeddings", "documents", "metadatas"])
+                if not page["ids"]:
+                    break
+                vectors = np.asarray(page["embeddings"], dtype=np.float32)
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(embeddings_path, mode="w+", dtype=np.float32,
+                                                       shape=(total, vectors.shape[1]))
+                matrix[written:written + len(vectors)] = vectors
+                metadatas = page["metadatas"] or [None] * len(page["ids"])
+                for chunk_id, document, metadata in zip(page["ids"], page["documents"], metadatas):
+                    records.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata},
+                                             ensure_ascii=False) + "\n")
+                written += len(vectors)
+
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(embeddings_path, mode="w+", dtype=np.float32, shape=(0, 0))
+        dim = int(matrix.shape[1])
+        matrix.flush()
+        del matrix
+        if written != total:
+            raise SnapshotError(f"Collection '{collection.name}' changed during export "
+                                f"({written} of {total} entries read)")
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "collection": collection.name,
+        "collection_metadata": collection.metadata,
+        "entries": written,
+        "dim": dim,
+        "dtype": "float32",
+        "embedding_model": OLLAMA_MODEL_NAME,
+        "created_at": time.time(),
+        "files": {
+            "embeddings.npy": _file_sha256(embeddings_path),
+            "records.jsonl.gz": _file_sha256(records_path),
+        },
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    log.info(f"Exported collection '{collection.name}' ({written} entries) to {path} "
+             f"in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+def read_manifest(path, verify=True):
+    """
+    Loads a snapshot's manifest, optionally verifying file checksums.
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"No snapshot at {path} (manifest.json missing)")
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    if verify:
+        for name, checksum in manifest["files"].items():
+            if _file_sha256(os.path.join(path, name)) != checksum:
+                raise SnapshotError(f"Checksum mismatch for {name} in {path}")
+    return manifest
+
+
+def _count_records(path):
+    """
+    Number of records in records.jsonl.gz; raises SnapshotError if a line is
+    not a complete record.
+    """
+    count = 0
+    try:
+        for record in _read_records(path):
+            if not isinstance(record, dict) or "id" not in record or "document" not in record:
+                raise SnapshotError(f"records.jsonl.gz line {count + 1} is not a record")
+            count += 1
+    except (OSError, EOFError, ValueError) as e:
+        raise SnapshotError(f"records.jsonl.gz is unreadable after {count} records: {e}")
+    return count
+
+
+def _read_records(path):
+    with gzip.open(os.path.join(path, "records.jsonl.gz"), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def import_snapshot(client, path, name=None, replace=False, force=False,
+                    batch_size=SNAPSHOT_BATCH_SIZE, verify=True):
+    """
+    Loads a snapshot into a collection without re-embedding.
+
+    Args:
+        client: Chroma client.
+        path (str): Snapshot directory.
+        name (str, optional): Target collection (default: the exported name).
+        replace (bool): Replace an existing collection of that name. The
+            snapshot is loaded into a temporary collection that takes its
+            place only after every row was written; otherwise entries are
+            upserted into the existing collection.
+        force (bool): Import even if the snapshot was embedded with a
+            different model than OLLAMA_MODEL_NAME.
+        batch_size (int): Rows per upsert.
+        verify (bool): Check file checksums before importing.
+
+    Returns:
+        dict: Collection name, entries imported and time taken.
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(path, verify=verify)
+    name = name or manifest["collection"]
+    if manifest["embedding_model"] != OLLAMA_MODEL_NAME and not force:
+        raise SnapshotError(f"Snapshot was embedded with '{manifest['embedding_model']}', "
+                            f"this node uses '{OLLAMA_MODEL_NAME}' (use force to import anyway)")
+
+    # Validate everything before the live collection is touched
+    matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    if len(matrix) != manifest["entries"]:
+        raise SnapshotError(f"embeddings.npy has {len(matrix)} rows, manifest says {manifest['entries']}")
+    if manifest["entries"] and matrix.shape[1] != manifest["dim"]:
+        raise SnapshotError(f"embeddings.npy has dimension {matrix.shape[1]}, manifest says {manifest['dim']}")
+    records = _count_records(path)
+    if records != manifest["entries"]:
+        raise SnapshotError(f"records.jsonl.gz has {records} records, manifest says {manifest['entries']}")
+
+    # Upload, import and compaction of one collection never overlap
+    with collection_write_lock_sync(name):
+        if replace:
+            # Loaded into a temporary collection that replaces the live one
+            # only once every row is in
+            target_name = f"{name}__import"
+            try:
+                client.delete_collection(name=target_name)  # Leftover from an interrupted run
+            except Exception:
+                pass
+            collection = client.create_collection(name=target_name, metadata=manifest["collection_metadata"])
+        else:
+            collection = client.get_or_create_collection(name=name, metadata=manifest["collection_metadata"])
+
+        batch_size = _batch_size(client, batch_size)
+        all_ids, all_documents = [], []
+        batch = []
+
+        dedup_index = NearDuplicateIndex(name) if DEDUP_ENABLED else None
+        imported_ids = set()
+        if dedup_index is not None and not replace and dedup_index.links:
+            # Merging may overwrite chunks that skipped duplicates are linked to
+            imported_ids = {record["id"] for record in _read_records(path)}
+
+        def flush(rows):
+            first = len(all_ids) - len(rows)
+            if imported_ids:
+                changed = [r["id"] for r in rows if not dedup_index.unchanged(r["id"], r["document"] or "")]
+                rehome_duplicates(collection, dedup_index, changed, keep=imported_ids)
+            upsert_records(collection, [r["id"] for r in rows],
+                           np.ascontiguousarray(matrix[first:first + len(rows)]),
+                           [r["document"] for r in rows], [r["metadata"] for r in rows])
+
+        try:
+            for record in _read_records(path):
+                all_ids.append(record["id"])
+                all_documents.append(record["document"])
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        except Exception:
+            if replace:
+                client.delete_collection(name=target_name)  # The live collection is untouched
+            raise
+
+        if replace:
+            try:
+                client.delete_collection(name=name)
+            except Exception:
+                pass  # Did not exist
+            collection.modify(name=name)
+            publish_collection_id(name, collection.id)  # Workers reopen their handles
+            remove_orphan_segments(client.get_settings().persist_directory)
+
+        # Derived per-collection data is rebuilt from the snapshot
+        if dedup_index is not None:
+            if replace:
+                dedup_index.clear()
+            for chunk_id, document in zip(all_ids, all_documents):
+                dedup_index.add(chunk_id, document or "", minhash_signature(document or ""))
+            dedup_index.save()
+        if is_mirrored(name):
+            if replace:
+                VectorMirror(name).write(all_ids, np.asarray(matrix), all_documents)
+            else:
+                VectorMirror(name).build(collection)
+            release_vector_mirror(name)
+
+    seconds = time.perf_counter() - start
+    log.info(f"Imported snapshot {path} into '{name}' ({len(all_ids)} entries) in {seconds:.2f}s")
+    return {"collection": name, "entries": len(all_ids), "dim": manifest["dim"],
+            "seconds": round(seconds, 2)}
@@ -0,0 +1,154 @@
+import json
+import re
+import threading
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from settings import LLM_STRUCTURED_OUTPUT
+from utils.logger import log, add_log_counter
+
+# ------------------------------
+# Structured LLM output
+# ------------------------------
+# Both chat backends are asked for JSON that matches a response model
+# (LLM_STRUCTURED_OUTPUT):
+#
+# - Ollama gets the model's JSON schema in "format", so generation is
+#   constrained to valid JSON with the required keys.
+# - Groq runs in JSON mode (response_format={"type": "json_object"}).
+#
+# The answer is then validated against the model. If validation fails, one
+# cheap local repair is tried (code fences, text around the object, control
+# characters, trailing commas, a truncated closing quote/brace). If that also
+# fails, the raw answer becomes the "solution" instead of failing the request,
+# so no answer ever has to be generated twice.
+#
+# Outcomes are counted per backend ("parsed", "repaired", "fallback") and
+# exposed at GET /metrics/structured-output; repaired + fallback are the
+# generations that were wasted (500 / unusable answer) before.
+
+
+class TicketTriage(BaseModel):
+    """
+    Answer of the /query (Ollama) backend.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    solution: str
+    disposition: str = Field("", alias="Disposition")
+    sub_disposition: str = Field("", alias="Sub Disposition")
+    priority: str = Field("", alias="Priority")
+
+
+class SolutionAnswer(BaseModel):
+    """
+    Answer of the /solution-chat (Groq) backend.
+    """
+    solution: str
+
+
+def json_schema(model):
+    """
+    JSON schema for Ollama's "format" field (every field required).
+    """
+    schema = model.model_json_schema(by_alias=True)
+    schema["required"] = list(schema["properties"])
+    return schema
+
+
+# Request settings for both backends (None when LLM_STRUCTURED_OUTPUT is off).
+# Groq's JSON mode requires the prompt to mention JSON.
+TICKET_TRIAGE_SCHEMA = json_schema(TicketTriage) if LLM_STRUCTURED_OUTPUT else None
+GROQ_RESPONSE_FORMAT = {"type": "json_object"} if LLM_STRUCTURED_OUTPUT else None
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_CONTROL_CHARS = re.compile(r"[\x00-\x1F\x7F]")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+_stats_lock = threading.Lock()
+structured_output_stats = {}
+
+
+def repair_json(text):
+    """
+    Single-pass cleanup of common JSON mistakes in model output.
+    Returns the parsed object; raises ValueError if it is still invalid.
+    """
+    text = _CODE_FENCE.sub("", text)
+    start = text.find("{")
+    if start != -1:
+        end = text.rfind("}")
+        text = text[start:end + 1] if end > start else text[start:]
+    text = _CONTROL_CHARS.sub("", text)
+    text = _TRAILING_COMMA.sub(r"\1", text).rstrip()
+    if not (text.startswith("{") and not text.endswith("}")):
+        return json.loads(text)
+
+    # Truncated answer: close the open string and object, or else drop the
+    # incomplete last field
+    closed = text + ('"' if text.count('"') % 2 else "") + "}"
+    try:
+        return json.loads(closed)
+    except ValueError:
+        return json.loads(text[:text.rfind('",') + 1] + "}")
+
+
+def _record(backend, outcome):
+    with _stats_lock:
+        counters = structured_output_stats.setdefault(
+            backend, {"responses": 0, "parsed": 0, "repaired": 0, "fallback": 0})
+        counters["responses"] += 1
+        counters[outcome] += 1
+    add_log_counter(f"llm_output_{outcome}")
+
+
+def parse_structured(text, model, backend):
+    """
+    Validates an LLM answer against 'model', repairing it once if needed.
+
+    Args:
+        text (str): Raw answer text.
+        model: Pydantic response model (TicketTriage or SolutionAnswer).
+        backend (str): Backend name for the outcome counters.
+
+    Returns:
+        Instance of 'model'. If the answer cannot be parsed even after the
+        repair, the raw text is used as the solution.
+    """
+    try:
+        result = model.model_validate_json(text)
+        _record(backend, "parsed")
+        return result
+    except ValidationError:
+        pass
+
+    try:
+        result = model.model_validate(repair_json(text))
+        _record(backend, "repaired")
+        return result
+    except (ValueError, ValidationError) as e:
+        log.warning(f"Unparseable {backend} answer, using raw text: {e}",
+                    extra={"event": "llm_output_fallback", "backend": backend})
+        _record(backend, "fallback")
+        return model.model_validate({"solution": _CONTROL_CHARS.sub(" ", text).strip()})
+
+
+def failed_generation(error):
+    """
+    Returns the answer Groq rejected in JSON mode ("json_validate_failed"),
+    or None for any other error.
+    """
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        if body.get("code") == "json_validate_failed":
+            return body.get("failed_generation")
+    return None
+
+
+def structured_output_metrics():
+    """
+    Parse outcome counts per backend for this worker.
+    """
+    with _stats_lock:
+        return {backend: dict(counters) for backend, counters in structured_output_stats.items()}
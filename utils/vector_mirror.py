@@ -0,0 +1,617 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import List
+
+import numpy as np
+
+from settings import (
+    VECTOR_MIRROR_DIR, VECTOR_MIRROR_COLLECTIONS, VECTOR_MIRROR_DTYPE, VECTOR_MIRROR_RESCORE_FACTOR,
+    VECTOR_MIRROR_MAX_SEGMENTS, VECTOR_MIRROR_MAX_DEAD_FRACTION
+)
+from utils.collection_lock import CollectionLockTimeout, collection_write_lock
+from utils.logger import log
+
+# ------------------------------
+# In-memory vector mirror
+# ------------------------------
+# A read-only copy of a hot Chroma collection kept as contiguous matrices:
+#
+#   <VECTOR_MIRROR_DIR>/<collection>/
+#       CURRENT                 - name of the current version file
+#       versions/v<N>-<id>.json - version manifest: dim, dtype, segment list,
+#                                 dead (replaced/deleted) row numbers
+#       segments/<id>/          - one immutable batch of rows:
+#           vectors.npy         - (n, dim) float32, float16 or int8 embeddings
+#           scales.npy          - (n,) float32 per-row scale (int8 only)
+#           rescore.npy         - (n, dim) float16 rescoring copy (int8 only)
+#           norms.npy           - (n,) float32 squared L2 norm of each row
+#           records.json        - ids and documents, row-aligned with vectors.npy
+#
+# - vectors.npy files are opened with np.load(mmap_mode="r"), so every worker
+#   on the host shares the same pages through the OS page cache.
+# - Top-k is answered with one vectorized matrix-vector product per segment.
+# - int8 rows are symmetric per-row quantized (x ~= q * scale). Because int8
+#   distances are approximate, a wider candidate set is rescored against a
+#   float16 copy kept next to the codes. The scan only touches the int8
+#   matrix; the copy is memory-mapped too, so only the pages of the few
+#   candidate rows are read per query (no round trip to Chroma).
+# - Distances are squared L2, the same metric Chroma uses by default, so
+#   results are interchangeable with collection.query().
+# - Writes never modify existing files. An upsert writes only the new rows as
+#   a new segment and marks the rows they replace as dead; a delete only marks
+#   rows dead. A new version file lists the segments and dead rows, and
+#   replacing CURRENT (os.replace) switches readers to it atomically, so a
+#   reader never pairs vectors of one version with records of another.
+# - Once there are more than VECTOR_MIRROR_MAX_SEGMENTS segments or dead rows
+#   exceed VECTOR_MIRROR_MAX_DEAD_FRACTION, the live rows are merged into one
+#   segment (copied as stored, no re-quantization).
+# - Readers check CURRENT on each query and load the new version when it
+#   changed; segments they already hold are reused. Files of all but the
+#   current and previous version are removed by the writer.
+
+# Rows processed per block when the stored dtype is not float32
+# (numpy has no BLAS path for float16/int8, so blocks are upcast before the product).
+_BLOCK_ROWS = 65536
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def _atomic_save_json(path, data):
+    """
+    Writes a JSON file next to its final location and renames it into place.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _unique_name():
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+
+def quantize_int8(matrix):
+    """
+    Symmetric per-row int8 quantization.
+
+    Returns (codes, scales) with matrix ~= codes * scales[:, None].
+    """
+    scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0)
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class _Segment:
+    """
+    One loaded (memory-mapped) segment. Segments never change on disk.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "records.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        quantized = self.vectors.dtype == np.int8
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if quantized else None
+        self.rescore = np.load(os.path.join(path, "rescore.npy"), mmap_mode="r") if quantized else None
+        self.ids = records["ids"]
+        self.documents = records["documents"]
+
+
+class _Snapshot:
+    """
+    Everything a query needs from one mirror version, swapped as a whole.
+    """
+
+    def __init__(self, key, manifest, segments):
+        self.key = key
+        self.manifest = manifest
+        self.segments = segments
+        self.offsets = np.cumsum([0] + [len(segment.ids) for segment in segments])
+        self.ids = [chunk_id for segment in segments for chunk_id in segment.ids]
+        self.documents = [document for segment in segments for document in segment.documents]
+        self.dead = np.zeros(len(self.ids), dtype=bool)
+        self.dead[manifest["dead"]] = True
+        self.live = len(self.ids) - len(manifest["dead"])
+        self._position = None
+
+    def position(self):
+        """
+        Row number of every live id (built on first use, writers only).
+        """
+        if self._position is None:
+            self._position = {chunk_id: row for row, chunk_id in enumerate(self.ids) if not self.dead[row]}
+        return self._position
+
+
+class VectorMirror:
+    """
+    Memory-mapped float32/float16/int8 copy of one Chroma collection.
+
+    Args:
+        name (str): Collection name (also the mirror's directory name).
+        directory (str): Root directory holding all mirrors.
+        dtype (str): "float32", "float16" or "int8" for newly written rows.
+    """
+
+    def __init__(self, name, directory=VECTOR_MIRROR_DIR, dtype=VECTOR_MIRROR_DTYPE):
+        self.name = name
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector mirror dtype: {dtype}")
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(directory, name)
+        self._current_path = os.path.join(self.path, "CURRENT")
+        self._versions_path = os.path.join(self.path, "versions")
+        self._segments_path = os.path.join(self.path, "segments")
+        self._snapshot = None
+        self._segment_cache = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------
+    # Writing
+    # ------------------------------
+    # Writers of one collection are serialized by the collection write lock
+    # (utils/collection_lock.py); readers only take it to build a missing
+    # mirror (ensure_vector_mirror()).
+    def exists(self):
+        """
+        True if a mirror has been written to disk.
+        """
+        return os.path.exists(self._current_path)
+
+    def _write_segment(self, ids, matrix, documents):
+        """
+        Writes rows as a new immutable segment and returns its name.
+        The directory is renamed into place only when complete.
+        """
+        name = _unique_name()
+        tmp_path = os.path.join(self._segments_path, f".{name}.tmp")
+        os.makedirs(tmp_path)
+        norms = np.einsum("ij,ij->i", matrix, matrix).astype(np.float32)
+        if self.dtype == np.int8:
+            codes, scales = quantize_int8(matrix)
+            np.save(os.path.join(tmp_path, "vectors.npy"), codes)
+            np.save(os.path.join(tmp_path, "scales.npy"), scales)
+            np.save(os.path.join(tmp_path, "rescore.npy"), matrix.astype(np.float16))
+        else:
+            np.save(os.path.join(tmp_path, "vectors.npy"), matrix.astype(self.dtype))
+        np.save(os.path.join(tmp_path, "norms.npy"), norms)
+        with open(os.path.join(tmp_path, "records.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": list(ids), "documents": list(documents)}, f)
+        os.rename(tmp_path, os.path.join(self._segments_path, name))
+        return name
+
+    def _publish(self, segments, dead, dim, previous=None):
+        """
+        Writes a version file and atomically points CURRENT at it.
+
+        'segments' is a list of {"name", "rows"}; 'dead' the row numbers
+        (over the concatenated segments) that are no longer valid.
+        """
+        version = previous["version"] + 1 if previous else 1
+        manifest = {
+            "version": version,
+            "count": sum(segment["rows"] for segment in segments) - len(dead),
+            "dim": dim,
+            "dtype": self.dtype.name,
+            "segments": segments,
+            "dead": sorted(dead),
+        }
+        os.makedirs(self._versions_path, exist_ok=True)
+        version_name = f"v{version:010d}-{uuid.uuid4().hex[:8]}.json"
+        _atomic_save_json(os.path.join(self._versions_path, version_name), manifest)
+        tmp_path = f"{self._current_path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version_name)
+        os.replace(tmp_path, self._current_path)
+        self._collect_garbage(version_name, previous)
+        log.info(f"Vector mirror '{self.name}' version {version}: {manifest['count']} rows, "
+                 f"{len(segments)} segments, {len(dead)} dead rows")
+        return manifest
+
+    def _collect_garbage(self, current_name, previous):
+        """
+        Removes version files and segments used by neither the current nor
+        the previous version (a reader may still be switching from it).
+        """
+        keep_versions = {current_name}
+        keep_segments = set()
+        for manifest in (self._read_manifest(), previous):
+            if manifest:
+                keep_versions.add(manifest.get("file"))
+                keep_segments.update(segment["name"] for segment in manifest["segments"])
+        for version_name in os.listdir(self._versions_path):
+            if version_name not in keep_versions and not version_name.startswith("."):
+                _remove(os.path.join(self._versions_path, version_name))
+        for segment_name in os.listdir(self._segments_path):
+            if segment_name not in keep_segments and not segment_name.startswith("."):
+                shutil.rmtree(os.path.join(self._segments_path, segment_name), ignore_errors=True)
+
+    def write(self, ids: List[str], embeddings, documents: List[str]):
+        """
+        Replaces the whole mirror with the given rows.
+
+        - 'embeddings' is any (N, dim) array-like.
+        - Readers switch to the new rows atomically.
+        """
+        os.makedirs(self._segments_path, exist_ok=True)
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(ids), -1)
+        previous = self._read_manifest() if self.exists() else None
+        segments = [{"name": self._write_segment(ids, matrix, documents), "rows": len(ids)}]
+        self._publish(segments, [], int(matrix.shape[1]) if len(ids) else 0, previous)
+
+    def build(self, collection):
+        """
+        Builds the mirror from the full contents of a Chroma collection.
+        """
+        results = collection.get(include=["embeddings", "documents"])
+        embeddings = results.get("embeddings")
+        if embeddings is None or len(results["ids"]) == 0:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.write(results["ids"], embeddings, results.get("documents") or [])
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str]):
+        """
+        Incrementally applies added or replaced rows to the mirror.
+
+        - Only the supplied rows are written (as a new segment); rows with
+          the same ids in older segments are marked dead.
+        - Nothing is re-read from Chroma and existing files are not rewritten.
+        """
+        if not self.exists():
+            log.warning(f"Vector mirror '{self.name}' not built yet; skipping upsert")
+            return
+        if not len(ids):
+            return
+
+        snapshot = self._ensure_loaded()
+        # Last occurrence wins if an id is supplied twice
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        rows = sorted(latest.values())
+        new_rows = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32)[rows])
+        new_ids = [ids[i] for i in rows]
+        new_documents = [documents[i] for i in rows]
+        dim = snapshot.manifest["dim"] or int(new_rows.shape[1])
+        if new_rows.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {new_rows.shape[1]} does not match mirror ({dim})")
+
+        position = snapshot.position()
+        dead = set(snapshot.manifest["dead"])
+        dead.update(position[chunk_id] for chunk_id in new_ids if chunk_id in position)
+        segments = snapshot.manifest["segments"] + [
+            {"name": self._write_segment(new_ids, new_rows, new_documents), "rows": len(new_ids)}
+        ]
+        self._apply(segments, dead, dim, snapshot.manifest)
+
+    def delete(self, ids: List[str]):
+        """
+        Removes rows by id from the mirror (marks them dead).
+        """
+        if not self.exists():
+            return
+        snapshot = self._ensure_loaded()
+        position = snapshot.position()
+        drop = {position[chunk_id] for chunk_id in ids if chunk_id in position}
+        if not drop:
+            return
+        dead = set(snapshot.manifest["dead"]) | drop
+        self._apply(list(snapshot.manifest["segments"]), dead, snapshot.manifest["dim"], snapshot.manifest)
+
+    def _apply(self, segments, dead, dim, previous):
+        """
+        Publishes a new version, merging segments first when there are too
+        many or too many dead rows.
+        """
+        total = sum(segment["rows"] for segment in segments)
+        if (len(segments) > VECTOR_MIRROR_MAX_SEGMENTS
+                or (total and len(dead) / total > VECTOR_MIRROR_MAX_DEAD_FRACTION)):
+            merged = self._merge(segments, dead)
+            segments, dead = [merged], set()
+        self._publish(segments, dead, dim, previous)
+
+    def _merge(self, segments, dead):
+        """
+        Copies the live rows of 'segments' into one new segment, as stored
+        (int8 codes and scales are kept, nothing is re-quantized).
+        """
+        loaded = [self._load_segment(segment["name"]) for segment in segments]
+        keep, offset = [], 0
+        for segment in loaded:
+            rows = np.arange(offset, offset + len(segment.ids))
+            keep.append(np.flatnonzero(~np.isin(rows, list(dead))))
+            offset += len(segment.ids)
+        live = sum(len(rows) for rows in keep)
+        dim = next((segment.vectors.shape[1] for segment in loaded if segment.vectors.ndim == 2), 0)
+        dtype = loaded[0].vectors.dtype if loaded else self.dtype
+
+        name = _unique_name()
+        tmp_path = os.path.join(self._segments_path, f".{name}.tmp")
+        os.makedirs(tmp_path)
+        vectors = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode="w+",
+                                            dtype=dtype, shape=(live, dim))
+        norms = np.empty(live, dtype=np.float32)
+        scales = np.empty(live, dtype=np.float32) if dtype == np.int8 else None
+        rescore = None
+        if dtype == np.int8:
+            rescore = np.lib.format.open_memmap(os.path.join(tmp_path, "rescore.npy"), mode="w+",
+                                                dtype=np.float16, shape=(live, dim))
+        ids, documents, written = [], [], 0
+        for segment, rows in zip(loaded, keep):
+            n = len(rows)
+            if n:
+                vectors[written:written + n] = segment.vectors[rows]
+                norms[written:written + n] = segment.norms[rows]
+                if scales is not None:
+                    scales[written:written + n] = segment.scales[rows]
+                    rescore[written:written + n] = segment.rescore[rows]
+            ids.extend(segment.ids[i] for i in rows)
+            documents.extend(segment.documents[i] for i in rows)
+            written += n
+        vectors.flush()
+        del vectors
+        if rescore is not None:
+            rescore.flush()
+            del rescore
+        np.save(os.path.join(tmp_path, "norms.npy"), norms)
+        if scales is not None:
+            np.save(os.path.join(tmp_path, "scales.npy"), scales)
+        with open(os.path.join(tmp_path, "records.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": documents}, f)
+        os.rename(tmp_path, os.path.join(self._segments_path, name))
+        log.info(f"Vector mirror '{self.name}': merged {len(segments)} segments into {live} rows")
+        return {"name": name, "rows": live}
+
+    # ------------------------------
+    # Reading
+    # ------------------------------
+    def _read_manifest(self):
+        """
+        The current version's manifest (its file name under "file").
+        """
+        with open(self._current_path, encoding="utf-8") as f:
+            version_name = f.read().strip()
+        with open(os.path.join(self._versions_path, version_name), encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["file"] = version_name
+        return manifest
+
+    def _load_segment(self, name):
+        segment = self._segment_cache.get(name)
+        if segment is None:
+            segment = _Segment(os.path.join(self._segments_path, name))
+        return segment
+
+    def _ensure_loaded(self):
+        """
+        Returns the snapshot of the current version, loading it if CURRENT
+        changed on disk. Segments already loaded are reused.
+        """
+        for attempt in range(3):
+            stat = os.stat(self._current_path)
+            key = (stat.st_ino, stat.st_mtime_ns)
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.key == key:
+                return snapshot
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is not None and snapshot.key == key:
+                    return snapshot
+                try:
+                    manifest = self._read_manifest()
+                    segments = {segment["name"]: self._load_segment(segment["name"])
+                                for segment in manifest["segments"]}
+                except FileNotFoundError:
+                    if attempt == 2:
+                        raise
+                    continue  # A writer switched versions and removed the old files meanwhile
+                self._segment_cache = segments
+                snapshot = _Snapshot(key, manifest, [segments[s["name"]] for s in manifest["segments"]])
+                self._snapshot = snapshot
+                log.info(f"Vector mirror '{self.name}' loaded version {manifest['version']} "
+                         f"({snapshot.live} rows)")
+                return snapshot
+
+    def ids(self):
+        """
+        Ids of the live rows.
+        """
+        snapshot = self._ensure_loaded()
+        return [chunk_id for chunk_id, dead in zip(snapshot.ids, snapshot.dead) if not dead]
+
+    def dequantized(self):
+        """
+        Returns the live rows as a float32 (N, dim) array.
+        """
+        snapshot = self._ensure_loaded()
+        parts = []
+        for segment in snapshot.segments:
+            matrix = np.asarray(segment.vectors, dtype=np.float32)
+            if segment.scales is not None:
+                matrix = matrix * np.asarray(segment.scales)[:, None]
+            parts.append(matrix.reshape(len(segment.ids), -1))
+        if not parts:
+            return np.zeros((0, snapshot.manifest["dim"]), dtype=np.float32)
+        return np.concatenate(parts)[~snapshot.dead]
+
+    def nbytes(self):
+        """
+        Bytes scanned per query: the vector matrices (plus scales for int8).
+        The int8 rescoring copy is not included, see rescore_nbytes().
+        """
+        snapshot = self._ensure_loaded()
+        size = 0
+        for segment in snapshot.segments:
+            size += segment.vectors.nbytes + segment.norms.nbytes
+            if segment.scales is not None:
+                size += segment.scales.nbytes
+        return size
+
+    def rescore_nbytes(self):
+        """
+        Bytes of the float16 rescoring copy (int8 only). It stays on disk
+        except for the candidate rows read by each query.
+        """
+        snapshot = self._ensure_loaded()
+        return sum(segment.rescore.nbytes for segment in snapshot.segments if segment.rescore is not None)
+
+    @staticmethod
+    def _segment_distances(segment, query):
+        """
+        Squared L2 distance from 'query' to every row: |x|^2 + |q|^2 - 2 x.q
+        """
+        vectors = segment.vectors
+        if not len(vectors):
+            return np.zeros(0, dtype=np.float32)
+        if vectors.dtype == np.float32:
+            dots = vectors @ query
+        else:
+            dots = np.empty(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), _BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + _BLOCK_ROWS], dtype=np.float32)
+                dots[start:start + len(block)] = block @ query
+            if segment.scales is not None:
+                dots *= segment.scales
+        return segment.norms + np.float32(query @ query) - 2.0 * dots
+
+    def _distances(self, snapshot, query):
+        """
+        Distances to every row of the snapshot; dead rows are +inf.
+        """
+        parts = [self._segment_distances(segment, query) for segment in snapshot.segments]
+        distances = np.concatenate(parts).astype(np.float32) if parts else np.zeros(0, dtype=np.float32)
+        distances[snapshot.dead] = np.inf
+        return distances
+
+    @staticmethod
+    def _rescore(snapshot, query, candidates):
+        """
+        Recomputes distances for candidate rows from the float16 rescoring
+        copy. Returns the distances in candidate order.
+        """
+        segment_of = np.searchsorted(snapshot.offsets, candidates, side="right") - 1
+        exact = np.empty(len(candidates), dtype=np.float32)
+        for i, (row, s) in enumerate(zip(candidates, segment_of)):
+            segment = snapshot.segments[s]
+            local = row - snapshot.offsets[s]
+            if segment.rescore is not None:
+                vector = np.asarray(segment.rescore[local], dtype=np.float32)
+            else:
+                vector = np.asarray(segment.vectors[local], dtype=np.float32)
+            diff = vector - query
+            exact[i] = diff @ diff
+        return exact
+
+    def query(self, query_embedding, top_k=2, rescore=True):
+        """
+        Returns the top_k nearest rows in the same shape as collection.query():
+        {"ids": [[...]], "documents": [[...]], "distances": [[...]]}
+
+        - For int8 mirrors, top_k * VECTOR_MIRROR_RESCORE_FACTOR candidates
+          are rescored with the float16 copy unless 'rescore' is False.
+        """
+        snapshot = self._ensure_loaded()
+        if not snapshot.live:
+            return {"ids": [[]], "documents": [[]], "distances": [[]]}
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = self._distances(snapshot, query)
+
+        rescore = rescore and any(segment.rescore is not None for segment in snapshot.segments)
+        n_candidates = top_k * VECTOR_MIRROR_RESCORE_FACTOR if rescore else top_k
+        k = min(n_candidates, snapshot.live)
+        top = np.argpartition(distances, k - 1)[:k]
+
+        if rescore:
+            top = top[np.isfinite(distances[top])]
+            exact = self._rescore(snapshot, query, top)
+            distances = np.full(len(snapshot.ids), np.inf, dtype=np.float32)
+            distances[top] = exact
+
+        top = top[np.argsort(distances[top])][:top_k]
+        top = top[np.isfinite(distances[top])]
+
+        return {
+            "ids": [[snapshot.ids[i] for i in top]],
+            "documents": [[snapshot.documents[i] for i in top]],
+            "distances": [[float(distances[i]) for i in top]],
+        }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ------------------------------
+# Registry helpers
+# ------------------------------
+def is_mirrored(collection_name):
+    """
+    True if the collection is configured to be served from a vector mirror.
+    """
+    return collection_name in VECTOR_MIRROR_COLLECTIONS
+
+
+def get_vector_mirror(collection):
+    """
+    Returns the worker's VectorMirror for a mirrored collection, whether or not
+    it has been built yet (see ensure_vector_mirror()).
+    Returns None if the collection is not configured for mirroring.
+    """
+    if not is_mirrored(collection.name):
+        return None
+    with _mirrors_lock:
+        mirror = _mirrors.get(collection.name)
+        if mirror is None:
+            mirror = VectorMirror(collection.name)
+            _mirrors[collection.name] = mirror
+    return mirror
+
+
+async def ensure_vector_mirror(collection):
+    """
+    Read-path variant of get_vector_mirror(): builds the mirror from Chroma the
+    first time if nothing is on disk yet, and returns it.
+
+    - The build runs under the collection write lock, and existence is checked
+      again once the lock is held, so it never races an upload, import or
+      another worker building the same mirror.
+    - Returns None (the caller queries Chroma) if the collection is not
+      mirrored, or if a writer holds the lock for longer than
+      COLLECTION_LOCK_TIMEOUT.
+    - Must not be called while holding the collection write lock; writers use
+      get_vector_mirror() and build it themselves.
+    """
+    mirror = get_vector_mirror(collection)
+    if mirror is None or mirror.exists():
+        return mirror
+    try:
+        async with collection_write_lock(collection.name):
+            if not mirror.exists():
+                await asyncio.to_thread(mirror.build, collection)
+    except CollectionLockTimeout as e:
+        log.warning(f"Vector mirror of '{collection.name}' not built yet: {e}")
+        return None
+    return mirror
+
+
+def release_vector_mirror(collection_name):
+    """
+    Forgets the worker's mirror for a collection so its memory map can be
+    closed (used when the collection is evicted from the collection cache).
+    """
+    with _mirrors_lock:
+        _mirrors.pop(collection_name, None)